@@ -0,0 +1 @@
+"""Benchmarks for the demo scripts. Run them from the repository root with `python -m benchmarks.<name>`."""
@@ -0,0 +1,78 @@
+"""
+Compare the time to split the PDFs of the RAG ingestion scripts into chunks with LangChain's
+RecursiveCharacterTextSplitter (built for every file, as the ingestion script used to do)
+against the token-offset chunker from demo_utils.chunking, for the data/ and spanish/data/ corpora.
+
+The PDFs are converted to markdown once, before timing, and the report also counts how many
+chunks of the token-offset chunker are identical to LangChain's. Both need the tiktoken encoding
+of the model, which is downloaded the first time.
+
+    python -m benchmarks.chunking
+    python -m benchmarks.chunking --repeat 5
+"""
+
+import argparse
+import pathlib
+import statistics
+import time
+
+from demo_utils.chunking import TokenChunker, get_encoding
+from demo_utils.pdf_extraction import CHUNK_OVERLAP, CHUNK_SIZE, SPLITTER_MODEL, extract_texts
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent
+CORPORA = {"data": ROOT_DIR / "data", "spanish/data": ROOT_DIR / "spanish" / "data"}
+
+
+def split_with_langchain(texts):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    chunks = []
+    for text in texts:
+        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            model_name=SPLITTER_MODEL, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+        )
+        chunks.append([document.page_content for document in text_splitter.create_documents([text])])
+    return chunks
+
+
+def split_with_token_offsets(texts):
+    chunker = TokenChunker(get_encoding(SPLITTER_MODEL), chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return [chunker.split_text(text) for text in texts]
+
+
+def time_split(function, texts, repeats):
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        chunks = function(texts)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations), chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per splitter, the median is reported")
+    args = parser.parse_args()
+
+    # Load the encoding and the splitter module before timing, since both are cached for the process
+    get_encoding(SPLITTER_MODEL)
+    split_with_langchain(["warm up"])
+    print(f"{CHUNK_SIZE}-token chunks with {CHUNK_OVERLAP} tokens of overlap, median of {args.repeat} runs")
+    for corpus, data_dir in CORPORA.items():
+        pdf_paths = sorted(data_dir.glob("*.pdf"))
+        texts = extract_texts(pdf_paths)
+        characters = sum(len(text) for text in texts)
+        print(f"\n{corpus}: {len(pdf_paths)} PDFs, {characters / 1000:.0f}k characters of markdown")
+        langchain_time, langchain_chunks = time_split(split_with_langchain, texts, args.repeat)
+        offsets_time, offsets_chunks = time_split(split_with_token_offsets, texts, args.repeat)
+        identical = sum(len(set(ours) & set(theirs)) for ours, theirs in zip(offsets_chunks, langchain_chunks))
+        total = sum(len(chunks) for chunks in offsets_chunks)
+        print(f"{'langchain':>14}: {langchain_time * 1000:8.1f} ms | {sum(map(len, langchain_chunks))} chunks")
+        print(
+            f"{'token offsets':>14}: {offsets_time * 1000:8.1f} ms | {total} chunks, {identical} identical | "
+            f"speedup {langchain_time / offsets_time:5.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
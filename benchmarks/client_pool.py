@@ -0,0 +1,82 @@
+"""
+Compare request latency with a new connection per request ("cold") against
+the shared connection pool from demo_utils.clients ("pooled").
+
+By default the requests go to a local stand-in server that adds --connect-latency
+seconds to every new connection, approximating the TCP + TLS handshake to a remote API.
+
+    python -m benchmarks.client_pool --requests 50 --connect-latency 0.05
+"""
+
+import argparse
+import statistics
+import time
+
+import httpx
+import openai
+
+from demo_utils.clients import get_http_client
+from demo_utils.local_server import LocalOpenAIServer
+
+MESSAGES = [{"role": "user", "content": "Write a haiku about a hungry cat who wants tuna"}]
+
+
+def time_request(client, model):
+    start = time.perf_counter()
+    client.chat.completions.create(model=model, messages=MESSAGES, max_tokens=20)
+    return time.perf_counter() - start
+
+
+def run_cold(base_url, api_key, model, num_requests):
+    latencies = []
+    for _ in range(num_requests):
+        with httpx.Client() as http_client:
+            client = openai.OpenAI(base_url=base_url, api_key=api_key, http_client=http_client)
+            latencies.append(time_request(client, model))
+    return latencies
+
+
+def run_pooled(base_url, api_key, model, num_requests):
+    client = openai.OpenAI(base_url=base_url, api_key=api_key, http_client=get_http_client())
+    return [time_request(client, model) for _ in range(num_requests)]
+
+
+def summarize(name, latencies):
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    p95 = latencies_ms[max(0, round(0.95 * len(latencies_ms)) - 1)]
+    print(
+        f"{name:>7}: mean {statistics.mean(latencies_ms):8.2f} ms | "
+        f"p50 {statistics.median(latencies_ms):8.2f} ms | p95 {p95:8.2f} ms | total {sum(latencies_ms):9.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50, help="Requests per mode")
+    parser.add_argument(
+        "--connect-latency", type=float, default=0.05, help="Seconds added to every new local connection"
+    )
+    parser.add_argument("--base-url", help="Benchmark a real endpoint instead of the local server")
+    parser.add_argument("--api-key", default="nokeyneeded")
+    parser.add_argument("--model", default="gpt-4o")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = LocalOpenAIServer(port=0, connect_latency=args.connect_latency).start()
+        base_url = server.base_url
+    try:
+        print(f"Sending {args.requests} requests per mode to {base_url}")
+        # Warm up both code paths so that imports and first-call overhead are not measured
+        run_cold(base_url, args.api_key, args.model, 1)
+        run_pooled(base_url, args.api_key, args.model, 1)
+        summarize("cold", run_cold(base_url, args.api_key, args.model, args.requests))
+        summarize("pooled", run_pooled(base_url, args.api_key, args.model, args.requests))
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
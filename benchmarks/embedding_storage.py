@@ -0,0 +1,100 @@
+"""
+Compare ways to store the chunk embeddings for vector search: the full float32 embeddings, embeddings
+shortened to fewer dimensions (what the `dimensions` parameter of text-embedding-3-small returns: their
+first components, normalized again), and either of them quantized to int8 with a scale per vector,
+as the ingestion scripts store them with EMBEDDING_DIMENSIONS and EMBEDDING_STORAGE=int8.
+
+For every setting, the report shows the recall@k of its top k chunks against a search over the full
+float32 embeddings, the size of the stored matrix (with the scales), and the median latency of a query.
+The queries are embeddings of chunks of the corpus, each one left out of its own results, so no API
+calls are needed. The default corpus is the one ingested by spanish/rag_documents_ingestion.py. Use
+--rows to add synthetic chunks (blends of the real ones with some noise) and see how the latency grows;
+their recall is lower than on real chunks, since the blends are much closer to each other.
+
+    python -m benchmarks.embedding_storage
+    python -m benchmarks.embedding_storage --dimensions 1536 512 256 --k 10 --rows 100000
+"""
+
+import argparse
+import pathlib
+import statistics
+import time
+
+import numpy as np
+
+from demo_utils.chunk_store import dequantize, dot_products, load_embeddings, load_scales, quantize
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent
+DEFAULT_CHUNKS_PATH = ROOT_DIR / "spanish" / "rag_ingested_chunks.json"
+
+
+def normalize(matrix):
+    return matrix / np.linalg.norm(matrix, axis=-1, keepdims=True)
+
+
+def load_full_embeddings(chunks_path):
+    embeddings = load_embeddings(chunks_path, mmap=False)
+    if (scales := load_scales(chunks_path, mmap=False)) is not None:
+        embeddings = dequantize(embeddings, scales)
+    return normalize(embeddings.astype(np.float32))
+
+
+def add_synthetic_rows(embeddings, rows: int, rng):
+    """Grow the matrix to the number of rows with blends of two real embeddings and some noise."""
+    count = rows - len(embeddings)
+    if count <= 0:
+        return embeddings
+    first = embeddings[rng.integers(len(embeddings), size=count)]
+    second = embeddings[rng.integers(len(embeddings), size=count)]
+    noise = rng.normal(scale=0.5 / np.sqrt(embeddings.shape[1]), size=first.shape).astype(np.float32)
+    return np.concatenate([embeddings, normalize(first + 0.5 * second + noise)])
+
+
+def search(matrix, scales, query, k: int, exclude: int):
+    """Return the indexes of the k rows with the highest dot product with the query, leaving out one row."""
+    scores = dot_products(matrix, query, scales)
+    scores[exclude] = -np.inf
+    top = np.argpartition(-scores, k)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=pathlib.Path, default=DEFAULT_CHUNKS_PATH, help="Chunks file of the corpus")
+    parser.add_argument(
+        "--dimensions", type=int, nargs="+", default=[1536, 1024, 512, 256], help="Embedding sizes to compare"
+    )
+    parser.add_argument("--k", type=int, default=5, help="Results per query, for the recall@k")
+    parser.add_argument("--queries", type=int, default=200, help="Chunks used as queries")
+    parser.add_argument("--rows", type=int, default=0, help="Grow the corpus to this many chunks with synthetic ones")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    full = add_synthetic_rows(load_full_embeddings(args.chunks), args.rows, rng)
+    query_rows = rng.choice(len(full), size=min(args.queries, len(full)), replace=False)
+    expected = {row: set(search(full, None, full[row], args.k, exclude=row)) for row in query_rows}
+    print(f"{len(full)} chunks of {full.shape[1]} dimensions, {len(query_rows)} queries, top {args.k} results")
+    print(f"{'setting':>14} | {'recall@' + str(args.k):>9} | {'size':>9} | {'latency':>9}")
+
+    for dimensions in args.dimensions:
+        if dimensions > full.shape[1]:
+            continue
+        shortened = normalize(full[:, :dimensions]) if dimensions < full.shape[1] else full
+        for dtype in ("float32", "int8"):
+            matrix, scales = (shortened, None) if dtype == "float32" else quantize(shortened)
+            size = matrix.nbytes + (scales.nbytes if scales is not None else 0)
+            hits = 0
+            durations = []
+            for row in query_rows:
+                query = shortened[row]
+                start = time.perf_counter()
+                results = search(matrix, scales, query, args.k, exclude=row)
+                durations.append(time.perf_counter() - start)
+                hits += len(expected[row].intersection(results))
+            recall = hits / (len(query_rows) * args.k)
+            latency = statistics.median(durations) * 1000
+            print(f"{f'{dimensions} {dtype}':>14} | {recall:9.3f} | {size / 1024 / 1024:6.2f} MB | {latency:6.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
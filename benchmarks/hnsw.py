@@ -0,0 +1,94 @@
+"""
+Compare the approximate HNSW index of demo_utils.vector_search (VECTOR_INDEX=hnsw) against exact search:
+for each query breadth `ef`, the recall@k of the HNSW results against the exact top k, and the p50 and p99
+latency of a query, after the time to build the graph with the given M and ef_construction.
+
+By default the corpus is synthetic: embeddings spread in clusters around random topics, like the chunks of
+a corpus, and the queries are new points near them. Use --chunks to index the embeddings saved by the
+ingestion scripts instead, with some of their rows plus noise as the queries. Needs `pip install hnswlib`.
+
+    python -m benchmarks.hnsw
+    python -m benchmarks.hnsw --rows 500000 --m 32 --ef-construction 400 --ef 32 64 128 256 512
+    python -m benchmarks.hnsw --chunks spanish/rag_ingested_chunks.json --k 5
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from demo_utils.chunk_store import load_embeddings
+from demo_utils.vector_search import HNSWIndex, VectorIndex
+
+
+def clustered_embeddings(rows: int, dimensions: int, rng, clusters: int = 1000):
+    """Return unit vectors around `clusters` random topics, spread around them further than the topics are apart."""
+    centers = rng.standard_normal((clusters, dimensions), dtype=np.float32)
+    embeddings = centers[rng.integers(clusters, size=rows)]
+    embeddings += 1.5 * rng.standard_normal((rows, dimensions), dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings
+
+
+def time_queries(index, queries, k: int) -> tuple[list[list[int]], np.ndarray]:
+    results = []
+    durations = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(index.search(query, k))
+        durations.append(time.perf_counter() - start)
+    return results, np.array(durations) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", help="Chunks file whose embeddings to index, instead of synthetic ones")
+    parser.add_argument("--rows", type=int, default=100000, help="Synthetic embeddings to index")
+    parser.add_argument("--dimensions", type=int, default=256, help="Dimensions of the synthetic embeddings")
+    parser.add_argument("--m", type=int, default=16, help="Links per node of the graph (HNSW_M)")
+    parser.add_argument("--ef-construction", type=int, default=200, help="Search breadth while building")
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128, 256], help="Search breadths (HNSW_EF)")
+    parser.add_argument("--k", type=int, default=10, help="Results per query, for the recall@k")
+    parser.add_argument("--queries", type=int, default=500, help="Queries to run")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.chunks:
+        embeddings = load_embeddings(args.chunks)
+        rows = embeddings[rng.integers(len(embeddings), size=args.queries)].astype(np.float32)
+        queries = rows / np.linalg.norm(rows, axis=1, keepdims=True)
+        queries += rng.normal(scale=0.5 / np.sqrt(embeddings.shape[1]), size=queries.shape).astype(np.float32)
+    else:
+        embeddings = clustered_embeddings(args.rows, args.dimensions, rng)
+        # The same seed gives the same topics, so the queries are about the topics of the corpus
+        queries = clustered_embeddings(args.queries, args.dimensions, np.random.default_rng(0))
+
+    exact = VectorIndex(embeddings)
+    expected, exact_durations = time_queries(exact, queries, args.k)
+    start = time.perf_counter()
+    hnsw = HNSWIndex.build(embeddings, m=args.m, ef_construction=args.ef_construction)
+    build_time = time.perf_counter() - start
+
+    print(
+        f"{len(embeddings)} embeddings of {embeddings.shape[1]} dimensions ({embeddings.dtype}), "
+        f"{len(queries)} queries, HNSW with M={args.m} and ef_construction={args.ef_construction} "
+        f"built in {build_time:.1f} s"
+    )
+    print(f"{'search':>12} | {'recall@' + str(args.k):>9} | {'p50':>9} | {'p99':>9}")
+    print(
+        f"{'exact':>12} | {1:9.3f} | {np.percentile(exact_durations, 50):6.3f} ms | "
+        f"{np.percentile(exact_durations, 99):6.3f} ms"
+    )
+    for ef in args.ef:
+        hnsw.ef = ef
+        results, durations = time_queries(hnsw, queries, args.k)
+        hits = sum(len(set(ours) & set(theirs)) for ours, theirs in zip(results, expected))
+        recall = hits / sum(len(theirs) for theirs in expected)
+        print(
+            f"{f'hnsw ef={ef}':>12} | {recall:9.3f} | {np.percentile(durations, 50):6.3f} ms | "
+            f"{np.percentile(durations, 99):6.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Measure the cold-start import cost of every demo script with `python -X importtime`.
+
+Only the imports at the top level of each script are executed (not the script itself),
+so the numbers reflect what every run pays before doing any useful work.
+Heavy dependencies that a script loads lazily, inside the function that needs them,
+do not show up here.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --output before.json
+    python -m benchmarks.import_time --compare before.json
+"""
+
+import argparse
+import ast
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent
+
+
+def find_scripts():
+    return sorted(ROOT_DIR.glob("*.py")) + sorted((ROOT_DIR / "spanish").glob("*.py"))
+
+
+def top_level_imports(script_path):
+    """Return the source of the import statements at the top level of a script."""
+    tree = ast.parse(script_path.read_text(encoding="utf-8"))
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, ast.Import | ast.ImportFrom))
+
+
+def parse_importtime(stderr):
+    """Return {top-level module: cumulative microseconds} from `-X importtime` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # Nested imports are indented, so the top-level ones start right after the separator
+        if not name.startswith("  "):
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def measure_script(script_path, repeats):
+    code = top_level_imports(script_path)
+    runs = []
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=ROOT_DIR,
+            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "unknown error"
+            return {"error": error}
+        runs.append(parse_importtime(result.stderr))
+    # The first run also pays for a cold OS file cache, so we report the median run
+    totals = [sum(modules.values()) for modules in runs]
+    median_run = runs[totals.index(sorted(totals)[len(totals) // 2])]
+    return {
+        "total_us": int(statistics.median(totals)),
+        "modules_us": dict(sorted(median_run.items(), key=lambda item: item[1], reverse=True)),
+    }
+
+
+def print_report(results, baseline=None, top=3):
+    for script, result in results.items():
+        if "error" in result:
+            print(f"{script:<45} ERROR: {result['error']}")
+            continue
+        line = f"{script:<45} {result['total_us'] / 1000:9.1f} ms"
+        if baseline and "total_us" in baseline.get(script, {}):
+            delta = (result["total_us"] - baseline[script]["total_us"]) / 1000
+            line += f" ({delta:+9.1f} ms)"
+        heaviest = list(result["modules_us"].items())[:top]
+        line += "  | " + ", ".join(f"{name} {us / 1000:.0f} ms" for name, us in heaviest)
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scripts", nargs="*", help="Scripts to measure (default: all demo scripts)")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per script, the median is reported")
+    parser.add_argument("--output", help="Write the full per-module breakdown to this JSON file")
+    parser.add_argument("--compare", help="Print the difference against a JSON file from a previous --output")
+    args = parser.parse_args()
+
+    scripts = [pathlib.Path(script).resolve() for script in args.scripts] or find_scripts()
+    results = {}
+    for script_path in scripts:
+        results[str(script_path.relative_to(ROOT_DIR))] = measure_script(script_path, args.repeats)
+
+    baseline = json.loads(pathlib.Path(args.compare).read_text()) if args.compare else None
+    print_report(results, baseline)
+    if args.output:
+        pathlib.Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Compare the time to extract (and split) the PDFs of the RAG ingestion scripts serially,
+in one process, against a pool of worker processes, for the data/ and spanish/data/ corpora.
+Both go through iter_extract_and_split, the streaming pipeline of the ingestion, consumed to the end.
+
+Every run is checked to return the same text as the serial run, in the same order.
+Splitting needs the tiktoken encoding, so use --extract-only when it can't be downloaded.
+
+    python -m benchmarks.pdf_extraction
+    python -m benchmarks.pdf_extraction --workers 1 2 4 --pages-per-task 8
+"""
+
+import argparse
+import os
+import pathlib
+import statistics
+import time
+
+from demo_utils.pdf_extraction import extract_texts, iter_extract_and_split
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent
+CORPORA = {"data": ROOT_DIR / "data", "spanish/data": ROOT_DIR / "spanish" / "data"}
+
+
+def extract_and_split(pdf_paths, workers, pages_per_task) -> list[list[str]]:
+    return [chunks for _, chunks in iter_extract_and_split(pdf_paths, workers=workers, pages_per_task=pages_per_task)]
+
+
+def time_run(function, pdf_paths, workers, pages_per_task, repeats):
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(pdf_paths, workers=workers, pages_per_task=pages_per_task)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", help="Worker counts to compare with the serial run (default: the CPU count)"
+    )
+    parser.add_argument(
+        "--pages-per-task", type=int, default=0, help="Split PDFs into tasks of this many pages (default: whole PDFs)"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per configuration, the median is reported")
+    parser.add_argument("--extract-only", action="store_true", help="Only extract the markdown, without splitting it")
+    args = parser.parse_args()
+
+    function = extract_texts if args.extract_only else extract_and_split
+    worker_counts = args.workers or [os.cpu_count() or 1]
+    print(f"{os.cpu_count()} CPUs, {args.repeat} runs per configuration, median times")
+    for corpus, data_dir in CORPORA.items():
+        pdf_paths = sorted(data_dir.glob("*.pdf"))
+        megabytes = sum(path.stat().st_size for path in pdf_paths) / 1e6
+        print(f"\n{corpus}: {len(pdf_paths)} PDFs, {megabytes:.1f} MB")
+        serial_time, serial_result = time_run(function, pdf_paths, 1, 0, args.repeat)
+        print(f"{'serial':>22}: {serial_time:7.2f} s")
+        for workers in worker_counts:
+            pool_time, pool_result = time_run(function, pdf_paths, workers, args.pages_per_task, args.repeat)
+            # Page-range tasks can detect slightly different heading levels, see demo_utils.pdf_extraction
+            same = "identical" if pool_result == serial_result else "differs from serial"
+            label = f"{workers} workers" + (f", {args.pages_per_task} pages" if args.pages_per_task else "")
+            print(f"{label:>22}: {pool_time:7.2f} s | speedup {serial_time / pool_time:5.2f}x | {same}")
+
+
+if __name__ == "__main__":
+    main()
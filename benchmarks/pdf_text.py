@@ -0,0 +1,109 @@
+"""
+Compare the PDF extraction backends of the RAG ingestion scripts (PDF_EXTRACTOR): "markdown", the
+pymupdf4llm conversion with headings and tables, against "text", the raw text of PyMuPDF, for the
+data/ and spanish/data/ corpora, to pick one per corpus.
+
+For each backend, the report shows the extraction throughput in pages per second (in a single process,
+median of --repeat runs), and the retrieval recall of its chunks: the share of a few questions about the
+PDFs whose answer is in one of the top k chunks of the lunr keyword search of rag_documents_flow.py.
+The answers are matched without markdown formatting, so both backends are judged on the same text.
+Splitting needs the tiktoken encoding of the model, which is downloaded the first time.
+
+    python -m benchmarks.pdf_text
+    python -m benchmarks.pdf_text --repeat 5 --k 5
+"""
+
+import argparse
+import pathlib
+import re
+import statistics
+import time
+
+from lunr import lunr
+
+from demo_utils.pdf_extraction import EXTRACTORS, extract_texts, page_count, split_text
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent
+CORPORA = {"data": ROOT_DIR / "data", "spanish/data": ROOT_DIR / "spanish" / "data"}
+
+# Questions about each corpus, with a passage of the PDFs that answers them
+QUESTIONS = {
+    "data": [
+        ("How long are aphideater flies?", "6–14 mm"),
+        ("What do Eupeodes larvae feed on?", "larvae feed on a wide variety of aphids"),
+        ("How long are California carpenter bees?", "13–30 mm long"),
+        ("Which plant does the California carpenter bee rob nectar from?", "rob nectar from ocotillo"),
+        ("How deep does a Centris pallida female dig her nest?", "12 inches (30 cm)"),
+        ("Where do digger bees live?", "Arizona, Nevada, southern California"),
+        ("Which continents does the western honey bee live on?", "every continent except Antarctica"),
+        ("What threatens western honey bees?", "mite and colony collapse disorder"),
+        ("Is the stinger of honey bee workers barbed?", "stinger of worker western honey bees is barbed"),
+        ("How many subspecies of the western honey bee are recognized?", "31 recognized subspecies"),
+        ("How do honey bees communicate?", "pheromones and the waggle dance"),
+    ],
+    "spanish/data": [
+        ("¿Cuántos días tarda en desarrollarse la abeja reina?", "dieciséis días para la abeja reina"),
+        ("¿Qué come la larva de una abeja reina?", "jalea real"),
+        ("¿Cuándo están activas las abejas Centris pallida?", "activas durante la noche"),
+        ("¿Quién descubrió Centris pallida?", "William J. Fox en 1899"),
+        ("¿Cómo se distingue un sírfido de una abeja?", "vena espuria"),
+        ("¿Cómo respiran las larvas de sírfidos en el agua?", "gusanos cola de rata"),
+        ("¿Dónde vive el abejorro negro?", "California, Nevada, Oregon, Utah"),
+        ("¿Qué plantas poliniza Xylocopa californica?", "orquídeas"),
+    ],
+}
+
+
+def plain(text: str) -> str:
+    """Return the text without markdown formatting or HTML tags, in lowercase with single spaces."""
+    text = re.sub(r"<[^>]+>|[*_~#|`]", " ", text)
+    return " ".join(text.split()).lower()
+
+
+def time_extraction(pdf_paths, extractor: str, repeats: int):
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        texts = extract_texts(pdf_paths, workers=1, extractor=extractor)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations), texts
+
+
+def retrieval_recall(chunks: list[str], questions: list[tuple[str, str]], k: int) -> float:
+    """Return the share of the questions whose answer is in one of the top k chunks of a lunr search."""
+    documents = [{"id": str(index), "text": chunk} for index, chunk in enumerate(chunks)]
+    index = lunr(ref="id", fields=["text"], documents=documents)
+    found = 0
+    for question, answer in questions:
+        # Punctuation is removed, since lunr reads some characters (like "-" or ":") as query operators
+        results = index.search(re.sub(r"[^\w\s]", " ", question))[:k]
+        found += any(plain(answer) in plain(chunks[int(result["ref"])]) for result in results)
+    return found / len(questions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Extraction runs per backend, the median is reported")
+    parser.add_argument("--k", type=int, default=5, help="Chunks retrieved per question, for the recall@k")
+    args = parser.parse_args()
+
+    # Load pymupdf4llm and the encoding before timing, since both are cached for the process
+    split_text("warm up")
+    extract_texts([sorted(CORPORA["data"].glob("*.pdf"))[0]], workers=1, extractor="markdown")
+    for corpus, data_dir in CORPORA.items():
+        pdf_paths = sorted(data_dir.glob("*.pdf"))
+        pages = sum(page_count(pdf_path) for pdf_path in pdf_paths)
+        questions = QUESTIONS[corpus]
+        print(f"\n{corpus}: {len(pdf_paths)} PDFs, {pages} pages, {len(questions)} questions")
+        for extractor in EXTRACTORS:
+            duration, texts = time_extraction(pdf_paths, extractor, args.repeat)
+            chunks = [chunk for text in texts for chunk in split_text(text)]
+            recall = retrieval_recall(chunks, questions, args.k)
+            print(
+                f"{extractor:>9}: {pages / duration:7.1f} pages/sec | {sum(map(len, texts)) / 1000:5.0f}k characters, "
+                f"{len(chunks):4} chunks | recall@{args.k} {recall:.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
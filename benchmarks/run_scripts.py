@@ -0,0 +1,204 @@
+"""
+Run the demo scripts end to end against a backend and record their performance.
+
+For every script we record the wall time, the number of API requests, their latency and
+time to first token (for streamed responses), the prompt and completion tokens, and the
+peak memory of the process. Interactive scripts get scripted answers to their input() calls.
+
+By default the scripts run against the local stand-in server from demo_utils.local_server,
+started in the background with the given latency and throughput:
+
+    python -m benchmarks.run_scripts --output report.json --csv report.csv
+    python -m benchmarks.run_scripts chat.py rag_csv.py --ttft 0.2 --tokens-per-second 80
+    python -m benchmarks.run_scripts --api-host github --repeat 3
+"""
+
+import argparse
+import csv
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from demo_utils.local_server import LocalOpenAIServer
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent
+
+# Answers for the input() calls of the interactive scripts
+SCRIPTED_INPUTS = {
+    "english": ["What is the fastest hybrid car?", "Which one has the best fuel economy?"],
+    "spanish": ["¿Cuál es el auto híbrido más rápido?", "¿Cuál tiene el mejor rendimiento de combustible?"],
+}
+
+CSV_FIELDS = [
+    "script",
+    "run",
+    "status",
+    "wall_time_s",
+    "requests",
+    "latency_mean_s",
+    "latency_p50_s",
+    "latency_p95_s",
+    "ttft_mean_s",
+    "prompt_tokens",
+    "completion_tokens",
+    "peak_rss_mb",
+    "error",
+]
+
+
+def find_scripts(include_spanish):
+    directories = [ROOT_DIR] + ([ROOT_DIR / "spanish"] if include_spanish else [])
+    scripts = []
+    for directory in directories:
+        found = sorted(directory.glob("*.py"))
+        # The document RAG scripts read the chunks written by the ingestion script, so it runs first
+        found.sort(key=lambda path: 0 if path.name == "rag_documents_ingestion.py" else 1)
+        scripts.extend(found)
+    return scripts
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, round(fraction * len(values)) - 1)] if values else None
+
+
+def sum_known(values):
+    known = [value for value in values if value is not None]
+    return sum(known) if known else None
+
+
+def summarize(records):
+    requests = [record for record in records if record["type"] == "request"]
+    latencies = [record["latency_s"] for record in requests if record["latency_s"] is not None]
+    ttfts = [record["ttft_s"] for record in requests if record["ttft_s"] is not None]
+    process = next((record for record in records if record["type"] == "process"), {})
+    return {
+        "requests": len(requests),
+        "latency_mean_s": statistics.mean(latencies) if latencies else None,
+        "latency_p50_s": statistics.median(latencies) if latencies else None,
+        "latency_p95_s": percentile(latencies, 0.95),
+        "ttft_mean_s": statistics.mean(ttfts) if ttfts else None,
+        # Streamed responses only report usage when the request sets stream_options={"include_usage": True}
+        "prompt_tokens": sum_known(record["prompt_tokens"] for record in requests),
+        "completion_tokens": sum_known(record["completion_tokens"] for record in requests),
+        "peak_rss_mb": process.get("peak_rss_mb"),
+        "request_details": requests,
+    }
+
+
+def run_script(script_path, env_overrides, timeout):
+    language = "spanish" if script_path.parent.name == "spanish" else "english"
+    command = [sys.executable, "-m", "benchmarks.script_runner", str(script_path)]
+    if "input(" in script_path.read_text(encoding="utf-8"):
+        for answer in SCRIPTED_INPUTS[language]:
+            command += ["--input", answer]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        metrics_path = pathlib.Path(temp_dir) / "metrics.jsonl"
+        env = {
+            **os.environ,
+            "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT_DIR), os.getenv("PYTHONPATH")])),
+            "DEMO_METRICS_FILE": str(metrics_path),
+            "BENCHMARK_ENV_OVERRIDES": json.dumps(env_overrides),
+        }
+        start = time.perf_counter()
+        try:
+            result = subprocess.run(
+                command, cwd=script_path.parent, env=env, capture_output=True, text=True, timeout=timeout
+            )
+            status = "ok" if result.returncode == 0 else "error"
+            stderr = result.stderr
+        except subprocess.TimeoutExpired as error:
+            status = "timeout"
+            stderr = error.stderr.decode() if isinstance(error.stderr, bytes) else (error.stderr or "")
+        wall_time = time.perf_counter() - start
+        records = []
+        if metrics_path.exists():
+            records = [json.loads(line) for line in metrics_path.read_text().splitlines() if line]
+
+    error_lines = stderr.strip().splitlines()
+    return {
+        "status": status,
+        "wall_time_s": wall_time,
+        **summarize(records),
+        "error": error_lines[-1] if status != "ok" and error_lines else None,
+    }
+
+
+def format_value(value, digits=3):
+    if value is None:
+        return "-"
+    return f"{value:.{digits}f}" if isinstance(value, float) else str(value)
+
+
+def print_report(rows):
+    print(
+        f"{'script':<42} {'status':<7} {'wall s':>8} {'reqs':>5} {'p50 s':>7} {'p95 s':>7} "
+        f"{'ttft s':>7} {'tok in':>7} {'tok out':>7} {'rss MB':>7}"
+    )
+    for row in rows:
+        print(
+            f"{row['script']:<42} {row['status']:<7} {format_value(row['wall_time_s'], 2):>8} "
+            f"{row['requests']:>5} {format_value(row['latency_p50_s']):>7} {format_value(row['latency_p95_s']):>7} "
+            f"{format_value(row['ttft_mean_s']):>7} {format_value(row['prompt_tokens']):>7} "
+            f"{format_value(row['completion_tokens']):>7} "
+            f"{format_value(row['peak_rss_mb'], 0):>7}"
+        )
+        if row["error"]:
+            print(f"    {row['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scripts", nargs="*", help="Scripts to run, relative to the repository root (default: all)")
+    parser.add_argument("--spanish", action="store_true", help="Also run the scripts in the spanish folder")
+    parser.add_argument(
+        "--api-host", default="local", help="API_HOST to run against (default: a local stand-in server)"
+    )
+    parser.add_argument("--ttft", type=float, default=0.2, help="Local server: seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=100, help="Local server: generation speed")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of runs per script")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds before a script run is stopped")
+    parser.add_argument("--output", help="Write the full report, including every request, to this JSON file")
+    parser.add_argument("--csv", help="Write one summary row per script run to this CSV file")
+    args = parser.parse_args()
+
+    if args.scripts:
+        scripts = [(ROOT_DIR / script).resolve() for script in args.scripts]
+    else:
+        scripts = find_scripts(args.spanish)
+
+    server = None
+    env_overrides = {"API_HOST": args.api_host}
+    if args.api_host == "local":
+        server = LocalOpenAIServer(port=0, ttft=args.ttft, tokens_per_second=args.tokens_per_second).start()
+        env_overrides["LOCAL_ENDPOINT"] = server.base_url
+
+    rows = []
+    try:
+        for script_path in scripts:
+            for run in range(1, args.repeat + 1):
+                result = run_script(script_path, env_overrides, args.timeout)
+                rows.append({"script": str(script_path.relative_to(ROOT_DIR)), "run": run, **result})
+    finally:
+        if server is not None:
+            server.stop()
+
+    print_report(rows)
+    if args.output:
+        report = {"api_host": args.api_host, "python": sys.version.split()[0], "runs": rows}
+        pathlib.Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.csv:
+        with open(args.csv, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=CSV_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
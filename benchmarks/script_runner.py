@@ -0,0 +1,81 @@
+"""
+Run a single demo script non-interactively, for the benchmark harness in benchmarks/run_scripts.py.
+
+Every call to input() is answered with the next --input value, and the script ends cleanly
+once they run out. Environment variables in BENCHMARK_ENV_OVERRIDES (a JSON object) are
+re-applied after the script loads its .env file, so the harness decides which backend is used.
+When DEMO_METRICS_FILE is set, the peak memory of the process is appended to it on exit.
+
+    python -m benchmarks.script_runner chat_history.py --input "Hi" --input "Tell me more"
+"""
+
+import argparse
+import builtins
+import json
+import os
+import pathlib
+import runpy
+import sys
+
+import dotenv
+
+
+class ScriptedInput:
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.exhausted = False
+
+    def __call__(self, prompt=""):
+        if not self.answers:
+            self.exhausted = True
+            raise EOFError("No more scripted input")
+        answer = self.answers.pop(0)
+        print(f"{prompt}{answer}")
+        return answer
+
+
+def peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("script", help="Path to the demo script")
+    parser.add_argument("--input", action="append", default=[], help="Answer for the next input() call")
+    args = parser.parse_args()
+
+    overrides = json.loads(os.getenv("BENCHMARK_ENV_OVERRIDES", "{}"))
+    original_load_dotenv = dotenv.load_dotenv
+
+    def load_dotenv(*load_args, **load_kwargs):
+        result = original_load_dotenv(*load_args, **load_kwargs)
+        os.environ.update(overrides)
+        return result
+
+    dotenv.load_dotenv = load_dotenv
+    os.environ.update(overrides)
+    scripted_input = ScriptedInput(args.input)
+    builtins.input = scripted_input
+
+    script_path = pathlib.Path(args.script).resolve()
+    sys.argv = [str(script_path)]
+    sys.path.insert(0, str(script_path.parent))
+    try:
+        runpy.run_path(str(script_path), run_name="__main__")
+    except EOFError:
+        if not scripted_input.exhausted:
+            raise
+    finally:
+        if metrics_path := os.getenv("DEMO_METRICS_FILE"):
+            with open(metrics_path, "a") as file:
+                file.write(json.dumps({"type": "process", "peak_rss_mb": peak_rss_mb()}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
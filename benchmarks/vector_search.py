@@ -0,0 +1,84 @@
+"""
+Compare the vector search of rag_documents_hybrid.py as it used to be, a Python loop computing the cosine
+similarity of the query with every embedding (and their norms) before sorting the whole list, against
+demo_utils.vector_search, which scores a query with one matrix-vector product on the normalized rows
+and picks the top results with argpartition.
+
+The embeddings are random unit vectors, normalized like the ingestion stores them, and every run checks
+that both searches return the same chunks. The loop is slow on large corpora, so it only runs --loop-queries
+queries. The default of 256 dimensions keeps the 1M-row matrix within 1 GB; text-embedding-3-small returns
+1536 by default.
+
+    python -m benchmarks.vector_search
+    python -m benchmarks.vector_search --rows 1000 100000 --dimensions 1536 --dtype int8
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from demo_utils.chunk_store import quantize
+from demo_utils.vector_search import VectorIndex
+
+
+def loop_search(embeddings, query, limit: int) -> list[int]:
+    """The search of rag_documents_hybrid.py before the vector index, returning rows instead of documents."""
+
+    def cosine_similarity(a, b):
+        return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+    similarities = []
+    for row, embedding in enumerate(embeddings):
+        similarities.append((row, cosine_similarity(query, embedding)))
+    similarities.sort(key=lambda x: x[1], reverse=True)
+    return [row for row, _ in similarities[:limit]]
+
+
+def time_queries(function, queries) -> tuple[float, list]:
+    durations = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(function(query))
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 100000, 1000000], help="Corpus sizes")
+    parser.add_argument("--dimensions", type=int, default=256, help="Dimensions of the embeddings")
+    parser.add_argument("--dtype", choices=["float32", "int8"], default="float32", help="Storage of the embeddings")
+    parser.add_argument("--limit", type=int, default=10, help="Results per query")
+    parser.add_argument("--queries", type=int, default=20, help="Queries for the vector index")
+    parser.add_argument("--loop-queries", type=int, default=3, help="Queries for the Python loop")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{args.dimensions} dimensions, {args.dtype}, top {args.limit}, median latency per query")
+    print(f"{'rows':>9} | {'loop':>10} | {'index':>9} | {'speedup':>8} | {'build':>8} | same results")
+    for rows in args.rows:
+        embeddings = rng.standard_normal((rows, args.dimensions), dtype=np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        if args.dtype == "int8":
+            embeddings, _ = quantize(embeddings)
+        queries = rng.standard_normal((args.queries, args.dimensions), dtype=np.float32)
+
+        start = time.perf_counter()
+        index = VectorIndex(embeddings)
+        build_time = time.perf_counter() - start
+        index_time, index_results = time_queries(lambda query: index.search(query, args.limit), queries)
+        loop_time, loop_results = time_queries(
+            lambda query: loop_search(embeddings, query, args.limit), queries[: args.loop_queries]
+        )
+        same = all(ours == theirs for ours, theirs in zip(index_results, loop_results))
+        print(
+            f"{rows:>9} | {loop_time * 1000:7.1f} ms | {index_time * 1000:6.2f} ms | {loop_time / index_time:7.0f}x | "
+            f"{build_time * 1000:5.0f} ms | {same}"
+        )
+
+
+if __name__ == "__main__":
+    main()
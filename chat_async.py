@@ -1,34 +1,16 @@
 import asyncio
 import os
 
-import azure.identity.aio
-import openai
 from dotenv import load_dotenv
 
+from demo_utils.clients import close_async_credentials, create_async_client, get_model_name
+
 # Setup the OpenAI client to use either Azure, OpenAI.com, or Ollama API
 load_dotenv(override=True)
 API_HOST = os.getenv("API_HOST", "github")
 
-azure_credential = None  # Will hold the Azure credential so we can close it properly.
-if API_HOST == "azure":
-    azure_credential = azure.identity.aio.DefaultAzureCredential()
-    token_provider = azure.identity.aio.get_bearer_token_provider(
-        azure_credential, "https://cognitiveservices.azure.com/.default"
-    )
-    client = openai.AsyncOpenAI(
-        base_url=os.environ["AZURE_OPENAI_ENDPOINT"],
-        api_key=token_provider,
-    )
-    MODEL_NAME = os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"]
-elif API_HOST == "ollama":
-    client = openai.AsyncOpenAI(base_url=os.environ["OLLAMA_ENDPOINT"], api_key="nokeyneeded")
-    MODEL_NAME = os.environ["OLLAMA_MODEL"]
-elif API_HOST == "github":
-    client = openai.AsyncOpenAI(base_url="https://models.github.ai/inference", api_key=os.environ["GITHUB_TOKEN"])
-    MODEL_NAME = os.getenv("GITHUB_MODEL", "openai/gpt-4o")
-else:
-    client = openai.AsyncOpenAI(api_key=os.environ["OPENAI_KEY"])
-    MODEL_NAME = os.environ["OPENAI_MODEL"]
+client = create_async_client(API_HOST)
+MODEL_NAME = get_model_name(API_HOST)
 
 
 async def generate_response(location):
@@ -72,8 +54,7 @@ async def multiple() -> None:
 async def close_clients() -> None:
     """Close the OpenAI async client and (if applicable) the Azure credential."""
     await client.close()
-    if azure_credential is not None:
-        await azure_credential.close()
+    await close_async_credentials()
 
 
 async def main():
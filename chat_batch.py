@@ -0,0 +1,66 @@
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from demo_utils import batch
+from demo_utils.clients import create_client, get_model_name
+
+# Setup the OpenAI client to use either Azure, OpenAI.com, or the local stand-in server
+load_dotenv(override=True)
+API_HOST = os.getenv("API_HOST", "github")
+
+if API_HOST not in ("azure", "openai", "local"):
+    print(f"The Batch API is not available on {API_HOST}, use azure, openai or local instead.")
+    sys.exit(1)
+
+client = create_client(API_HOST)
+MODEL_NAME = get_model_name(API_HOST)
+
+# The same question as chat_async.py, but for many locations at once, answered at batch pricing
+LOCATIONS = ["Tokyo", "Berkeley", "Singapore", "Lisbon", "Nairobi", "Montreal", "Buenos Aires", "Reykjavik"]
+BATCH_FILE = "batch_requests.jsonl"
+ENDPOINT = batch.batch_endpoint(API_HOST)
+
+# Each request gets a custom_id, which is how we find its result in the output file
+requests = {
+    f"location-{index}": {
+        "model": MODEL_NAME,
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {
+                "role": "user",
+                "content": f"Name a single place I should visit on my trip to {location} and describe in one sentence",
+            },
+        ],
+        "temperature": 1,
+        "max_tokens": 400,
+    }
+    for index, location in enumerate(LOCATIONS)
+}
+batch.write_batch_file(BATCH_FILE, requests, ENDPOINT)
+
+job = batch.submit_batch(client, BATCH_FILE, ENDPOINT)
+print(f"Submitted batch {job.id} with {len(requests)} requests, waiting for it to finish...")
+
+
+def print_progress(job):
+    counts = job.request_counts
+    print(f"Batch is {job.status}: {counts.completed} completed, {counts.failed} failed of {counts.total}")
+
+
+job = batch.wait_for_batch(client, job.id, on_update=print_progress)
+if job.status != "completed":
+    errors = job.errors.data if job.errors and job.errors.data else []
+    print(f"Batch {job.status}:", "; ".join(f"line {error.line}: {error.message}" for error in errors))
+    sys.exit(1)
+
+results = batch.download_results(client, job)
+for index, location in enumerate(LOCATIONS):
+    result = results.get(f"location-{index}")
+    if result is None:
+        print(f"{location}: no result")
+    elif result["status_code"] != 200:
+        print(f"{location}: error {result['status_code']}: {result['body'] or result['error']}")
+    else:
+        print(f"{location}: {result['body']['choices'][0]['message']['content']}\n")
@@ -0,0 +1 @@
+"""Helpers shared by the demo scripts in this repository."""
@@ -0,0 +1,165 @@
+"""
+Azure bearer token providers backed by a persistent, expiry-aware token cache.
+
+Acquiring a token with DefaultAzureCredential walks the whole credential chain, which
+can take several seconds. Tokens are valid for about an hour, so we store them on disk
+and share them between every script (sync or async) and the http/auth.py helper.
+A token is refreshed once it is within AZURE_TOKEN_REFRESH_MARGIN seconds (default 300)
+of expiring, and a lock file makes sure that concurrent processes only refresh it once.
+
+The cache file location can be changed with AZURE_TOKEN_CACHE_PATH,
+or set it to an empty string to only cache tokens in memory.
+"""
+
+import asyncio
+import json
+import os
+import pathlib
+import threading
+import time
+
+from demo_utils.file_lock import FileLock
+
+AZURE_COGNITIVE_SERVICES_SCOPE = "https://cognitiveservices.azure.com/.default"
+DEFAULT_CACHE_PATH = pathlib.Path.home() / ".cache" / "python-openai-demos" / "azure_tokens.json"
+
+# Tokens already read or fetched by this process, keyed like the cache file
+_memory_cache = {}
+
+
+def _cache_path() -> pathlib.Path | None:
+    path = os.getenv("AZURE_TOKEN_CACHE_PATH", str(DEFAULT_CACHE_PATH))
+    return pathlib.Path(path) if path else None
+
+
+def _refresh_margin() -> float:
+    return float(os.getenv("AZURE_TOKEN_REFRESH_MARGIN", "300"))
+
+
+def _cache_key(scope: str) -> str:
+    # The tenant decides which identity DefaultAzureCredential picks, so it's part of the key
+    return f"{os.getenv('AZURE_TENANT_ID', '')}|{scope}"
+
+
+def _is_fresh(entry: dict | None) -> bool:
+    return entry is not None and entry["expires_on"] - _refresh_margin() > time.time()
+
+
+def _read_cache_file(path: pathlib.Path) -> dict:
+    try:
+        return json.loads(path.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_cache_entry(path: pathlib.Path, key: str, entry: dict) -> None:
+    entries = _read_cache_file(path)
+    entries[key] = entry
+    # Drop tokens that have already expired, so the file doesn't grow forever
+    entries = {key: entry for key, entry in entries.items() if entry["expires_on"] > time.time()}
+    tmp_path = path.with_suffix(".tmp")
+    # The file holds bearer tokens, so only the current user may read it
+    fd = os.open(tmp_path, os.O_CREAT | os.O_TRUNC | os.O_WRONLY, 0o600)
+    with os.fdopen(fd, "w") as file:
+        json.dump(entries, file)
+    os.replace(tmp_path, path)
+
+
+def _lookup(key: str) -> dict | None:
+    entry = _memory_cache.get(key)
+    if not _is_fresh(entry) and (path := _cache_path()):
+        entry = _read_cache_file(path).get(key)
+    if _is_fresh(entry):
+        _memory_cache[key] = entry
+        return entry
+    return None
+
+
+def _store(key: str, access_token) -> dict:
+    entry = {"token": access_token.token, "expires_on": access_token.expires_on}
+    _memory_cache[key] = entry
+    if path := _cache_path():
+        _write_cache_entry(path, key, entry)
+    return entry
+
+
+def _lock_for(path: pathlib.Path) -> FileLock:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return FileLock(path.with_suffix(".lock"))
+
+
+def get_bearer_token_provider(scope: str = AZURE_COGNITIVE_SERVICES_SCOPE):
+    """
+    Return a function that returns a bearer token for the scope, like
+    azure.identity.get_bearer_token_provider, but backed by the persistent token cache.
+    The DefaultAzureCredential is only created if a token actually needs to be fetched.
+    """
+    key = _cache_key(scope)
+    credential = None
+    refresh_lock = threading.Lock()
+
+    def refresh() -> dict:
+        nonlocal credential
+        if credential is None:
+            import azure.identity
+
+            credential = azure.identity.DefaultAzureCredential()
+        return _store(key, credential.get_token(scope))
+
+    def token_provider() -> str:
+        if entry := _lookup(key):
+            return entry["token"]
+        with refresh_lock:
+            if path := _cache_path():
+                with _lock_for(path):
+                    # Another process may have refreshed the token while we waited for the lock
+                    entry = _lookup(key) or refresh()
+            else:
+                entry = _lookup(key) or refresh()
+        return entry["token"]
+
+    return token_provider
+
+
+def get_async_bearer_token_provider(scope: str = AZURE_COGNITIVE_SERVICES_SCOPE, credentials: list | None = None):
+    """
+    Return an async function that returns a bearer token for the scope, like
+    azure.identity.aio.get_bearer_token_provider, but backed by the persistent token cache.
+    The async DefaultAzureCredential is only created if a token actually needs to be fetched,
+    and is then appended to `credentials` so the caller can close it.
+    """
+    key = _cache_key(scope)
+    credential = None
+    refresh_lock = asyncio.Lock()
+
+    async def refresh() -> dict:
+        nonlocal credential
+        if credential is None:
+            import azure.identity.aio
+
+            credential = azure.identity.aio.DefaultAzureCredential()
+            if credentials is not None:
+                credentials.append(credential)
+        return _store(key, await credential.get_token(scope))
+
+    async def token_provider() -> str:
+        if entry := _lookup(key):
+            return entry["token"]
+        async with refresh_lock:
+            if path := _cache_path():
+                lock = _lock_for(path)
+                await asyncio.to_thread(lock.acquire)
+                try:
+                    entry = _lookup(key) or await refresh()
+                finally:
+                    lock.release()
+            else:
+                entry = _lookup(key) or await refresh()
+        return entry["token"]
+
+    return token_provider
+
+
+def get_azure_token(scope: str = AZURE_COGNITIVE_SERVICES_SCOPE) -> str:
+    """Return a bearer token for the scope, from the cache when it's still fresh."""
+    return get_bearer_token_provider(scope)()
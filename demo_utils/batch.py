@@ -0,0 +1,88 @@
+"""
+Helpers for the Batch API, which runs a large number of requests offline at a lower price,
+with the results ready within the completion window (24 hours) instead of right away.
+
+A batch goes through these steps, see chat_batch.py for an example:
+
+1. write_batch_file: write one JSON line per request, each with a unique custom_id
+2. submit_batch: upload the file and create the batch job
+3. wait_for_batch: poll the job until it's done
+4. download_results: download the output and error files, and join them back by custom_id
+"""
+
+import json
+import pathlib
+import time
+
+import openai
+
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def batch_endpoint(api_host: str, path: str = "/chat/completions") -> str:
+    """Return the endpoint for batch request lines: Azure's v1 API expects the path without the /v1 prefix."""
+    return path if api_host == "azure" else f"/v1{path}"
+
+
+def write_batch_file(path, requests: dict[str, dict], endpoint: str) -> None:
+    """Write the request bodies, keyed by their custom_id, as Batch API JSON lines."""
+    with open(path, "w", encoding="utf-8") as file:
+        for custom_id, body in requests.items():
+            line = {"custom_id": custom_id, "method": "POST", "url": endpoint, "body": body}
+            file.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+
+def submit_batch(client: openai.OpenAI, path, endpoint: str, metadata: dict | None = None):
+    """Upload the batch file and create a batch job for it."""
+    with open(path, "rb") as file:
+        input_file = client.files.create(file=(pathlib.Path(path).name, file), purpose="batch")
+    return client.batches.create(
+        input_file_id=input_file.id, endpoint=endpoint, completion_window="24h", metadata=metadata
+    )
+
+
+def wait_for_batch(
+    client: openai.OpenAI, batch_id: str, poll_interval: float = 5.0, max_interval: float = 60.0, on_update=None
+):
+    """
+    Poll the batch job until it's completed, failed, expired or cancelled, and return it.
+    The interval between polls doubles up to max_interval, since a batch can take hours.
+    `on_update` is called with the job whenever its status or request counts change.
+    """
+    last_progress = None
+    interval = poll_interval
+    while True:
+        job = client.batches.retrieve(batch_id)
+        counts = job.request_counts
+        progress = (job.status, counts.completed if counts else None, counts.failed if counts else None)
+        if progress != last_progress:
+            last_progress = progress
+            interval = poll_interval
+            if on_update is not None:
+                on_update(job)
+        if job.status in TERMINAL_STATUSES:
+            return job
+        time.sleep(interval)
+        interval = min(max_interval, interval * 2)
+
+
+def download_results(client: openai.OpenAI, job) -> dict[str, dict]:
+    """
+    Return the results of a finished batch job keyed by custom_id, each with the `status_code`
+    and `body` of the response, or an `error` for requests that couldn't be processed.
+    """
+    results = {}
+    for file_id in (job.output_file_id, job.error_file_id):
+        if not file_id:
+            continue
+        for line in client.files.content(file_id).text.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get("response") or {}
+            results[result["custom_id"]] = {
+                "status_code": response.get("status_code"),
+                "body": response.get("body"),
+                "error": result.get("error"),
+            }
+    return results
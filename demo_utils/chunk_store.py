@@ -0,0 +1,338 @@
+"""
+Storage of the ingested chunks for the RAG demos, as two files that share a name:
+
+* rag_ingested_chunks.json: the id and text of every chunk, as compact JSON
+* rag_ingested_chunks.npy: the embeddings as a float32 matrix, one row per chunk in the same order
+
+The query scripts memory-map the matrix, so loading it takes the same time whatever the size of
+the corpus, and the rows are read from the page cache instead of being copied into Python floats.
+The rows are normalized to unit length as they're written, so the cosine similarity of a row with
+a normalized query is their dot product, computed on the memory map as it is.
+
+With EMBEDDING_STORAGE=int8, the matrix holds int8 values instead, a quarter of the size: every
+row is scaled so that its largest component is 127, and the scales are kept as a float32 vector in
+rag_ingested_chunks.scales.npy. A row times its scale gives back the embedding, within half a step.
+The cosine similarity doesn't depend on the scale, so the rows can also be compared as they are.
+
+Chunks files from before the split, with an "embedding" in every chunk, can be converted with:
+
+    python -m demo_utils.chunk_store rag_ingested_chunks.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import struct
+
+# Size of the header of the .npy files, with room for any row count
+NPY_HEADER_SIZE = 128
+# The types the embeddings can be stored as, and the .npy description and size of their values
+EMBEDDING_DTYPES = {"float32": ("<f4", 4), "int8": ("|i1", 1)}
+# How far from 1 the norm of a stored row may be, which float32 rounding of a normalized row stays well within
+NORM_TOLERANCE = 1e-5
+
+
+def get_embedding_dtype() -> str:
+    dtype = os.getenv("EMBEDDING_STORAGE", "float32")
+    if dtype not in EMBEDDING_DTYPES:
+        raise ValueError(f"EMBEDDING_STORAGE must be one of {', '.join(EMBEDDING_DTYPES)}, not {dtype!r}")
+    return dtype
+
+
+def embeddings_path_for(chunks_path) -> pathlib.Path:
+    return pathlib.Path(chunks_path).with_suffix(".npy")
+
+
+def scales_path_for(chunks_path) -> pathlib.Path:
+    chunks_path = pathlib.Path(chunks_path)
+    return chunks_path.with_name(f"{chunks_path.stem}.scales.npy")
+
+
+def partial_paths_for(chunks_path) -> tuple[pathlib.Path, pathlib.Path, pathlib.Path]:
+    """Return the paths of the chunks file, the embeddings matrix and the scales while a ChunkWriter writes them."""
+    paths = (pathlib.Path(chunks_path), embeddings_path_for(chunks_path), scales_path_for(chunks_path))
+    return tuple(path.with_name(f"{path.name}.tmp") for path in paths)
+
+
+def partial_sizes(position: dict, dtype: str) -> tuple[int, int, int]:
+    """Return the sizes of the partial files at a position of a ChunkWriter (the scales are empty for float32)."""
+    rows, dimensions = position["rows"], position["dimensions"] or 0
+    scales_size = NPY_HEADER_SIZE + rows * 4 if dtype == "int8" else 0
+    return position["chunks_bytes"], NPY_HEADER_SIZE + rows * dimensions * EMBEDDING_DTYPES[dtype][1], scales_size
+
+
+def quantize(matrix):
+    """Return the int8 rows of a float32 matrix, scaled so their largest component is 127, and the scales."""
+    import numpy as np
+
+    scales = np.abs(matrix).max(axis=1) / 127
+    scales[scales == 0] = 1
+    return np.round(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def dequantize(rows, scales):
+    """Return the float32 embeddings of int8 rows (a row or a matrix) and their scales."""
+    import numpy as np
+
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows * (np.asarray(scales)[:, None] if rows.ndim == 2 else scales)
+
+
+def write_json(path, data, indent: int | None = None) -> None:
+    """Write the JSON to a temporary file that then replaces the file, so a run that stops can't leave half a file."""
+    path = pathlib.Path(path)
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        separators = None if indent else (",", ":")
+        json.dump(data, file, indent=indent, separators=separators, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _npy_header(shape: tuple, descr: str = "<f4") -> bytes:
+    """
+    Return a .npy (version 1.0) header for an array, always NPY_HEADER_SIZE bytes long
+    so that it can be written first and overwritten with the final row count once it's known.
+    """
+    header = repr({"descr": descr, "fortran_order": False, "shape": shape})
+    prefix = b"\x93NUMPY\x01\x00" + struct.pack("<H", NPY_HEADER_SIZE - 10)
+    return prefix + header.encode("latin1").ljust(NPY_HEADER_SIZE - len(prefix) - 1) + b"\n"
+
+
+class ChunkWriter:
+    """
+    Append chunks and their embeddings to the chunks file and the embeddings matrix as they come,
+    without keeping them in memory. Both files are written next to their final path and only replace
+    the previous ones once the writer is closed, so the readers never see a partial corpus:
+
+        with ChunkWriter("rag_ingested_chunks.json") as writer:
+            writer.write(chunks, embeddings)
+
+    The partial files can be picked up again after a crash, from a `position()` recorded while writing them:
+
+        writer = ChunkWriter("rag_ingested_chunks.json", resume=position)
+
+    With dtype="int8", the embeddings are quantized as they're written, and their scales go to a third file.
+    """
+
+    def __init__(self, chunks_path, resume: dict | None = None, dtype: str = "float32"):
+        if dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unknown embedding storage {dtype!r}")
+        self.dtype = dtype
+        self.chunks_path = pathlib.Path(chunks_path)
+        self.embeddings_path = embeddings_path_for(chunks_path)
+        self.scales_path = scales_path_for(chunks_path)
+        self.chunks_tmp_path, self.embeddings_tmp_path, self.scales_tmp_path = partial_paths_for(chunks_path)
+        paths = [self.chunks_tmp_path, self.embeddings_tmp_path] + ([self.scales_tmp_path] if dtype == "int8" else [])
+        if resume is None:
+            self.rows = 0
+            self.dimensions = None
+            for path in paths[1:]:
+                with open(path, "wb") as file:
+                    file.write(_npy_header((0,)))
+            with open(self.chunks_tmp_path, "w", encoding="utf-8"):
+                pass
+        else:
+            # Cut the files back to the position, dropping whatever was written after it, and append from there
+            self.rows = resume["rows"]
+            self.dimensions = resume["dimensions"]
+            for path, size in zip(paths, partial_sizes(resume, dtype)):
+                with open(path, "r+b") as file:
+                    file.truncate(size)
+        self.chunks_file = open(self.chunks_tmp_path, "a", encoding="utf-8")
+        self.embeddings_file = open(self.embeddings_tmp_path, "r+b")
+        self.embeddings_file.seek(0, os.SEEK_END)
+        self.scales_file = None
+        if dtype == "int8":
+            self.scales_file = open(self.scales_tmp_path, "r+b")
+            self.scales_file.seek(0, os.SEEK_END)
+
+    @property
+    def files(self) -> list:
+        return [file for file in (self.chunks_file, self.embeddings_file, self.scales_file) if file is not None]
+
+    def position(self) -> dict:
+        """Flush the files and return where they end, which `resume` accepts to pick them up from there."""
+        for file in self.files:
+            file.flush()
+        return {"rows": self.rows, "chunks_bytes": self.chunks_file.tell(), "dimensions": self.dimensions}
+
+    def sync(self) -> None:
+        """Flush the files to the disk, so that a position recorded before survives a crash of the machine."""
+        for file in self.files:
+            file.flush()
+            os.fsync(file.fileno())
+
+    def write(self, chunks: list[dict], embeddings) -> None:
+        """Append the id and text of the chunks, and their normalized embeddings (a list of vectors or a matrix)."""
+        import numpy as np
+
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if len(matrix) != len(chunks):
+            raise ValueError(f"Got {len(matrix)} embeddings for {len(chunks)} chunks")
+        if not chunks:
+            return
+        if self.dimensions is None:
+            self.dimensions = matrix.shape[1]
+        elif matrix.shape[1] != self.dimensions:
+            raise ValueError(f"Got embeddings with {matrix.shape[1]} dimensions instead of {self.dimensions}")
+        # Rows that are normalized already, like the API's or the ones of a previous run, are written unchanged
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[(norms == 0) | (np.abs(norms - 1) < NORM_TOLERANCE)] = 1
+        matrix = matrix / norms
+        for chunk in chunks:
+            # The chunks file is one JSON list, written item by item
+            self.chunks_file.write("," if self.rows else "[")
+            json.dump(
+                {"id": chunk["id"], "text": chunk["text"]}, self.chunks_file, separators=(",", ":"), ensure_ascii=False
+            )
+            self.rows += 1
+        if self.scales_file is not None:
+            matrix, scales = quantize(matrix)
+            self.scales_file.write(scales.tobytes())
+        self.embeddings_file.write(matrix.tobytes())
+
+    def close(self) -> None:
+        """Finish the files and put them in place of the previous ones."""
+        self.chunks_file.write("]" if self.rows else "[]")
+        self.chunks_file.close()
+        self.embeddings_file.seek(0)
+        self.embeddings_file.write(_npy_header((self.rows, self.dimensions or 0), EMBEDDING_DTYPES[self.dtype][0]))
+        self.embeddings_file.close()
+        if self.scales_file is not None:
+            self.scales_file.seek(0)
+            self.scales_file.write(_npy_header((self.rows,)))
+            self.scales_file.close()
+            os.replace(self.scales_tmp_path, self.scales_path)
+        else:
+            # Scales left by an int8 run would otherwise apply to the float32 rows
+            self.scales_path.unlink(missing_ok=True)
+        os.replace(self.embeddings_tmp_path, self.embeddings_path)
+        os.replace(self.chunks_tmp_path, self.chunks_path)
+
+    def abort(self, keep: bool = False) -> None:
+        """Delete the partial files, unless they're kept to resume from, leaving the previous ones untouched."""
+        for file in self.files:
+            file.close()
+        if not keep:
+            for path in (self.chunks_tmp_path, self.embeddings_tmp_path, self.scales_tmp_path):
+                path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def save_chunks(chunks_path, chunks: list[dict], embeddings, dtype: str = "float32") -> None:
+    """Save the id and text of the chunks, and their embeddings (a list of vectors or a matrix) in the same order."""
+    with ChunkWriter(chunks_path, dtype=dtype) as writer:
+        writer.write(chunks, embeddings)
+
+
+def load_chunks(chunks_path) -> list[dict]:
+    """Return the id and text of the chunks, without their embeddings."""
+    with open(chunks_path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def load_embeddings(chunks_path, mmap: bool = True):
+    """
+    Return the embeddings matrix of the chunks as stored (float32, or int8 rows to multiply by load_scales),
+    memory-mapped read-only unless mmap is False.
+    """
+    import numpy as np
+
+    return np.load(embeddings_path_for(chunks_path), mmap_mode="r" if mmap else None)
+
+
+def load_scales(chunks_path, mmap: bool = True):
+    """Return the scales of the int8 rows of the embeddings matrix, or None if it's stored as float32."""
+    import numpy as np
+
+    path = scales_path_for(chunks_path)
+    if not path.exists():
+        return None
+    return np.load(path, mmap_mode="r" if mmap else None)
+
+
+def dot_products(embeddings, query, scales=None, block_rows: int = 128):
+    """
+    Return the dot product of every row of the embeddings matrix with the query (times their scale for int8 rows).
+    The int8 rows are converted to float32 a block at a time, in a buffer that stays in the CPU cache, which is
+    as fast as a float32 matrix instead of several times slower when the whole matrix is converted at once.
+    """
+    import numpy as np
+
+    query = np.asarray(query, dtype=np.float32)
+    if embeddings.dtype == np.float32:
+        return embeddings @ query
+    scores = np.empty(len(embeddings), dtype=np.float32)
+    block = np.empty((block_rows, embeddings.shape[1]), dtype=np.float32)
+    for start in range(0, len(embeddings), block_rows):
+        rows = embeddings[start : start + block_rows]
+        np.copyto(block[: len(rows)], rows, casting="unsafe")
+        np.matmul(block[: len(rows)], query, out=scores[start : start + len(rows)])
+    if scales is not None:
+        scores *= scales
+    return scores
+
+
+def load_partial_embeddings(chunks_path, start: int, end: int, dimensions: int, dtype: str = "float32"):
+    """Return the float32 embeddings of the rows from start to end that a ChunkWriter left before finishing."""
+    import numpy as np
+
+    _, embeddings_tmp_path, scales_tmp_path = partial_paths_for(chunks_path)
+    descr, size = EMBEDDING_DTYPES[dtype]
+    matrix = np.fromfile(
+        embeddings_tmp_path,
+        dtype=descr,
+        count=(end - start) * dimensions,
+        offset=NPY_HEADER_SIZE + start * dimensions * size,
+    ).reshape(end - start, dimensions)
+    if dtype == "int8":
+        scales = np.fromfile(scales_tmp_path, dtype="<f4", count=end - start, offset=NPY_HEADER_SIZE + start * 4)
+        return dequantize(matrix, scales)
+    return matrix
+
+
+def load_partial_chunks(chunks_path, chunks_bytes: int) -> list[dict]:
+    """Return the chunks in the first chunks_bytes of the chunks file that a ChunkWriter left before finishing."""
+    chunks_tmp_path, _, _ = partial_paths_for(chunks_path)
+    with open(chunks_tmp_path, "rb") as file:
+        data = file.read(chunks_bytes).decode()
+    # The list is only closed when the writer finishes
+    return json.loads(f"{data}]") if data else []
+
+
+def convert(chunks_path) -> int:
+    """Move the embeddings out of a chunks file from before the split into its .npy file, and return the count."""
+    chunks = load_chunks(chunks_path)
+    save_chunks(chunks_path, chunks, [chunk["embedding"] for chunk in chunks])
+    return len(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert chunks files with embeddings in the JSON to a .npy matrix.")
+    parser.add_argument("paths", nargs="+", help="Chunks files to convert in place")
+    args = parser.parse_args()
+    for path in args.paths:
+        count = convert(path)
+        print(f"Converted {count} chunks: {path} and {embeddings_path_for(path)}")
+
+
+if __name__ == "__main__":
+    main()
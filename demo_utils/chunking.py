@@ -0,0 +1,137 @@
+"""
+A recursive text splitter that measures chunks in tokens, like LangChain's
+`RecursiveCharacterTextSplitter.from_tiktoken_encoder`, but without encoding the text over and over.
+
+LangChain encodes every piece of text each time it measures it: the paragraphs, then the lines
+and words of the paragraphs that are too long, and again when the pieces are merged into
+overlapping chunks. TokenChunker encodes each document once, keeps the byte offset where each
+token starts, and measures any piece of the text by counting the token offsets inside it.
+The separators are tried in the same order ("\n\n", "\n", " ", then single characters), each
+separator stays at the start of the piece that follows it, and the pieces are merged into
+overlapping chunks the same way, so the chunks only differ from LangChain's where a token
+straddles the edge of a piece. That mostly happens when a long run of text without spaces has to
+be cut into characters: LangChain counts at least one token per character, while the token offsets
+count the tokens actually in the run.
+"""
+
+import bisect
+import collections
+import functools
+import itertools
+
+SEPARATORS = ("\n\n", "\n", " ", "")
+
+
+@functools.cache
+def get_encoding(model_name: str):
+    """Return the tiktoken encoding of the model, loaded once per process and shared by every document."""
+    import tiktoken
+
+    return tiktoken.encoding_for_model(model_name)
+
+
+class TokenChunker:
+    """
+    Split texts into chunks of at most `chunk_size` tokens, where consecutive chunks share
+    up to `chunk_overlap` tokens:
+
+        chunker = TokenChunker(get_encoding("gpt-4o"), chunk_size=500, chunk_overlap=125)
+        chunks = chunker.split_text(text)
+    """
+
+    def __init__(self, encoding, chunk_size: int, chunk_overlap: int, separators: tuple[str, ...] = SEPARATORS):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"The chunk overlap ({chunk_overlap}) is larger than the chunk size ({chunk_size})")
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.byte_separators = tuple(separator.encode() for separator in separators)
+        # The length in bytes of every token seen so far, shared by all the texts split by this chunker
+        self.token_lengths = {}
+
+    def _token_offsets(self, tokens: list[int]) -> list[int]:
+        """Return the byte offset in the UTF-8 text where each token starts."""
+        missing = set(tokens).difference(self.token_lengths)
+        for token in missing:
+            self.token_lengths[token] = len(self.encoding.decode_single_token_bytes(token))
+        return list(itertools.accumulate(map(self.token_lengths.__getitem__, tokens), initial=0))[:-1]
+
+    def split_text(self, text: str) -> list[str]:
+        # The pieces are measured and cut on the UTF-8 bytes, where the token offsets are simple sums
+        data = text.encode()
+        offsets = self._token_offsets(self.encoding.encode_ordinary(text))
+
+        def length(start: int, end: int) -> int:
+            # The tokens that start inside the piece, without encoding it again
+            return bisect.bisect_left(offsets, end) - bisect.bisect_left(offsets, start)
+
+        return self._split(data, 0, len(data), self.byte_separators, length)
+
+    @staticmethod
+    def _pieces(data: bytes, start: int, end: int, separator: bytes) -> list[tuple[int, int]]:
+        """Return the (start, end) of the pieces of the text between each separator, which starts the next piece."""
+        if separator:
+            boundaries = [start]
+            position = data.find(separator, start, end)
+            while position != -1:
+                boundaries.append(position)
+                position = data.find(separator, position + len(separator), end)
+        else:
+            # Every character, which is where a byte doesn't continue a multi-byte UTF-8 sequence
+            boundaries = [position for position in range(start, end) if data[position] & 0xC0 != 0x80]
+        boundaries.append(end)
+        return [
+            (piece_start, piece_end)
+            for piece_start, piece_end in zip(boundaries, boundaries[1:])
+            if piece_end > piece_start
+        ]
+
+    def _split(self, data: bytes, start: int, end: int, separators: tuple[bytes, ...], length) -> list[str]:
+        # Split on the first separator found in the text, and on the next ones only for the pieces that are too long
+        separator = separators[-1]
+        next_separators = ()
+        for index, candidate in enumerate(separators):
+            if not candidate:
+                separator = candidate
+                break
+            if data.find(candidate, start, end) != -1:
+                separator = candidate
+                next_separators = separators[index + 1 :]
+                break
+
+        chunks = []
+        short_pieces = []
+        for piece_start, piece_end in self._pieces(data, start, end, separator):
+            piece_length = length(piece_start, piece_end)
+            if piece_length < self.chunk_size:
+                short_pieces.append((piece_start, piece_end, piece_length))
+                continue
+            if short_pieces:
+                chunks.extend(self._merge(data, short_pieces))
+                short_pieces = []
+            if next_separators:
+                chunks.extend(self._split(data, piece_start, piece_end, next_separators, length))
+            else:
+                chunks.append(data[piece_start:piece_end].decode())
+        if short_pieces:
+            chunks.extend(self._merge(data, short_pieces))
+        return chunks
+
+    def _merge(self, data: bytes, pieces: list[tuple[int, int, int]]) -> list[str]:
+        """Merge consecutive pieces into chunks of up to chunk_size tokens, starting each chunk with the overlap."""
+        chunks = []
+        current = collections.deque()
+        total = 0
+        for piece in pieces:
+            piece_length = piece[2]
+            if total + piece_length > self.chunk_size and current:
+                if chunk := data[current[0][0] : current[-1][1]].decode().strip():
+                    chunks.append(chunk)
+                # Keep the last pieces of the chunk, up to the overlap, as the start of the next one
+                while total > self.chunk_overlap or (total + piece_length > self.chunk_size and total > 0):
+                    total -= current.popleft()[2]
+            current.append(piece)
+            total += piece_length
+        if current and (chunk := data[current[0][0] : current[-1][1]].decode().strip()):
+            chunks.append(chunk)
+        return chunks
@@ -0,0 +1,187 @@
+"""
+Build OpenAI clients for the configured API_HOST.
+
+All clients created here share a single tuned httpx connection pool (one for sync
+clients and one for async clients), so scripts that make many calls reuse open
+connections instead of paying the connection and TLS handshake cost on every request.
+
+The pool can be tuned with these environment variables:
+
+* HTTP_POOL_MAX_CONNECTIONS: maximum number of open connections (default 20)
+* HTTP_POOL_MAX_KEEPALIVE: maximum number of idle connections kept alive (default 10)
+* HTTP_POOL_KEEPALIVE_EXPIRY: seconds an idle connection is kept alive (default 60)
+* HTTP2_ENABLED: set to "true" to negotiate HTTP/2 (requires the `h2` package)
+
+Set COMPLETION_CACHE_ENABLED to "true" to answer repeated low-temperature chat completions
+from a disk cache, see demo_utils/completion_cache.py, and RATE_LIMIT_ENABLED to pace
+requests under the rate limits of the deployment, see demo_utils/rate_limit.py.
+Set TRACING_EXPORTER to record an OpenTelemetry span for every request, see demo_utils/tracing.py.
+The modules behind these features are only imported when they're enabled, to keep the start-up fast.
+"""
+
+import functools
+import os
+
+import httpx
+import openai
+
+GITHUB_MODELS_ENDPOINT = "https://models.github.ai/inference"
+# Default address of the stand-in server from demo_utils/local_server.py
+LOCAL_ENDPOINT = "http://localhost:8000/v1"
+
+# Async Azure credentials hold their own HTTP sessions, so we keep track of them to close them properly.
+_async_azure_credentials = []
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_pool_limits() -> httpx.Limits:
+    """Return the connection pool limits configured through the environment."""
+    return httpx.Limits(
+        max_connections=int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv("HTTP_POOL_KEEPALIVE_EXPIRY", "60")),
+    )
+
+
+@functools.cache
+def get_rate_limiter():
+    """Return the process-wide RateLimiter shared by the sync and async connection pools."""
+    from demo_utils import rate_limit
+
+    return rate_limit.create_rate_limiter()
+
+
+def _rate_limit_enabled() -> bool:
+    return _env_flag("RATE_LIMIT_ENABLED") or bool(os.getenv("RATE_LIMIT_RPM") or os.getenv("RATE_LIMIT_TPM"))
+
+
+def _wrap_transport(transport):
+    """Add the optional features that are implemented as transport wrappers, based on the environment."""
+    if metrics_path := os.getenv("DEMO_METRICS_FILE"):
+        from demo_utils import metrics
+
+        transport = metrics.MetricsTransport(transport, metrics_path)
+    # Every attempt, including the ones rejected with a 429 error, is recorded in the metrics
+    if _rate_limit_enabled():
+        from demo_utils import rate_limit
+
+        transport = rate_limit.RateLimitTransport(
+            transport, get_rate_limiter(), max_retries=int(os.getenv("RATE_LIMIT_MAX_RETRIES", "5"))
+        )
+    # Cache hits don't go over the network, so they are neither rate limited nor recorded in the metrics
+    if _env_flag("COMPLETION_CACHE_ENABLED"):
+        from demo_utils import completion_cache
+
+        transport = completion_cache.CompletionCacheTransport(
+            transport,
+            completion_cache.create_cache(),
+            max_temperature=float(os.getenv("COMPLETION_CACHE_MAX_TEMPERATURE", "0.5")),
+        )
+    # The spans cover everything, including the time spent waiting for the rate limiter
+    if os.getenv("TRACING_EXPORTER"):
+        from demo_utils import tracing
+
+        transport = tracing.TracingTransport(transport)
+    return transport
+
+
+def _build_transport() -> httpx.BaseTransport:
+    return _wrap_transport(httpx.HTTPTransport(limits=get_pool_limits(), http2=_env_flag("HTTP2_ENABLED")))
+
+
+def _build_async_transport() -> httpx.AsyncBaseTransport:
+    return _wrap_transport(httpx.AsyncHTTPTransport(limits=get_pool_limits(), http2=_env_flag("HTTP2_ENABLED")))
+
+
+@functools.cache
+def get_http_client() -> httpx.Client:
+    """Return the process-wide httpx client shared by every sync OpenAI client."""
+    return openai.DefaultHttpxClient(transport=_build_transport())
+
+
+@functools.cache
+def get_async_http_client() -> httpx.AsyncClient:
+    """Return the process-wide httpx client shared by every async OpenAI client."""
+    return openai.DefaultAsyncHttpxClient(transport=_build_async_transport())
+
+
+def _client_kwargs(api_host: str, is_async: bool) -> dict:
+    if api_host == "azure":
+        from demo_utils import azure_auth
+
+        if is_async:
+            token_provider = azure_auth.get_async_bearer_token_provider(credentials=_async_azure_credentials)
+        else:
+            token_provider = azure_auth.get_bearer_token_provider()
+        return {"base_url": os.environ["AZURE_OPENAI_ENDPOINT"], "api_key": token_provider}
+    elif api_host == "ollama":
+        return {"base_url": os.environ["OLLAMA_ENDPOINT"], "api_key": "nokeyneeded"}
+    elif api_host == "github":
+        return {"base_url": GITHUB_MODELS_ENDPOINT, "api_key": os.environ["GITHUB_TOKEN"]}
+    elif api_host == "local":
+        return {"base_url": os.getenv("LOCAL_ENDPOINT", LOCAL_ENDPOINT), "api_key": "nokeyneeded"}
+    else:
+        return {"api_key": os.environ["OPENAI_KEY"]}
+
+
+def create_client(api_host: str | None = None) -> openai.OpenAI:
+    """
+    Create a sync OpenAI client for Azure, OpenAI.com, Ollama, GitHub Models or the local stand-in server,
+    backed by the shared connection pool.
+    """
+    api_host = api_host or os.getenv("API_HOST", "github")
+    return openai.OpenAI(**_client_kwargs(api_host, is_async=False), http_client=get_http_client())
+
+
+def create_async_client(api_host: str | None = None) -> openai.AsyncOpenAI:
+    """
+    Create an async OpenAI client for Azure, OpenAI.com, Ollama, GitHub Models or the local stand-in server,
+    backed by the shared async connection pool.
+    """
+    api_host = api_host or os.getenv("API_HOST", "github")
+    return openai.AsyncOpenAI(**_client_kwargs(api_host, is_async=True), http_client=get_async_http_client())
+
+
+def create_hedged_client(api_hosts: list[str]):
+    """
+    Create a HedgedClient that hedges and fails over chat completions across several API hosts,
+    in order of preference, each with the model configured for it (see demo_utils/hedging.py).
+    """
+    from demo_utils import hedging
+
+    backends = [
+        # The other backends take over when a request fails, so the SDK doesn't need to retry it
+        hedging.Backend(api_host, create_client(api_host).with_options(max_retries=0), get_model_name(api_host))
+        for api_host in api_hosts
+    ]
+    hedge_delay = os.getenv("HEDGE_DELAY")
+    return hedging.HedgedClient(
+        backends,
+        hedge_delay=float(hedge_delay) if hedge_delay else None,
+        percentile=float(os.getenv("HEDGE_PERCENTILE", "95")),
+        initial_delay=float(os.getenv("HEDGE_INITIAL_DELAY", "1.0")),
+    )
+
+
+async def close_async_credentials() -> None:
+    """Close any async Azure credentials opened by create_async_client."""
+    while _async_azure_credentials:
+        await _async_azure_credentials.pop().close()
+
+
+def get_model_name(api_host: str | None = None, github_default: str = "openai/gpt-4o") -> str:
+    """Return the chat model (or Azure deployment) name configured for the API host."""
+    api_host = api_host or os.getenv("API_HOST", "github")
+    if api_host == "azure":
+        return os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"]
+    elif api_host == "ollama":
+        return os.environ["OLLAMA_MODEL"]
+    elif api_host == "github":
+        return os.getenv("GITHUB_MODEL", github_default)
+    elif api_host == "local":
+        return os.getenv("LOCAL_MODEL", "local-model")
+    else:
+        return os.environ["OPENAI_MODEL"]
@@ -0,0 +1,147 @@
+"""
+A disk-backed cache of chat completion responses, for low-temperature calls that are repeated verbatim.
+
+When COMPLETION_CACHE_ENABLED is "true", the shared connection pool from demo_utils.clients answers
+a chat completion request (including `client.beta.chat.completions.parse` and streamed requests) from
+the cache if the exact same request was already sent to the same endpoint, without any network round-trip.
+The cache key covers the whole request body, so the model, messages, tools, response_format and every
+sampling parameter all have to match. Only requests with a temperature at or below
+COMPLETION_CACHE_MAX_TEMPERATURE are cached, since the answers to higher temperature calls are meant to vary.
+
+The cache can be tuned with these environment variables:
+
+* COMPLETION_CACHE_PATH: the SQLite file (default ~/.cache/python-openai-demos/completions.sqlite3)
+* COMPLETION_CACHE_MAX_TEMPERATURE: highest temperature that is cached (default 0.5)
+* COMPLETION_CACHE_MAX_ENTRIES: most responses kept, least recently used are evicted first (default 1000)
+* COMPLETION_CACHE_MAX_MB: most megabytes of responses kept (default 50)
+* COMPLETION_CACHE_MAX_AGE: seconds before a response expires (default 604800, a week)
+
+Show the hit/miss counters or empty the cache with:
+
+    python -m demo_utils.completion_cache --stats
+    python -m demo_utils.completion_cache --clear
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+
+import httpx
+
+from demo_utils.sqlite_cache import SQLiteCache
+from demo_utils.transports import TransportWrapper, canonical_json, observe_response, request_json
+
+DEFAULT_CACHE_PATH = pathlib.Path.home() / ".cache" / "python-openai-demos" / "completions.sqlite3"
+# The API's default temperature is 1, so requests without one are not cached
+DEFAULT_TEMPERATURE = 1.0
+# Response headers that still describe the body once it's replayed from the cache
+CACHED_HEADERS = ("content-type", "content-encoding")
+
+
+def create_cache() -> SQLiteCache:
+    """Return the completion cache configured through the environment."""
+    return SQLiteCache(
+        os.getenv("COMPLETION_CACHE_PATH") or DEFAULT_CACHE_PATH,
+        max_entries=int(os.getenv("COMPLETION_CACHE_MAX_ENTRIES", "1000")),
+        max_bytes=int(float(os.getenv("COMPLETION_CACHE_MAX_MB", "50")) * 1024 * 1024),
+        max_age=float(os.getenv("COMPLETION_CACHE_MAX_AGE", str(7 * 24 * 3600))),
+    )
+
+
+def cache_key(request: httpx.Request, body: dict) -> str:
+    # The same request sent to another endpoint or deployment may get a different answer
+    endpoint = f"{request.method} {request.url.copy_with(query=None)}"
+    return hashlib.sha256(endpoint.encode() + b"\n" + canonical_json(body)).hexdigest()
+
+
+class CompletionCacheTransport(TransportWrapper):
+    """Transport that answers repeated low-temperature chat completion requests from a SQLiteCache."""
+
+    def __init__(self, transport, cache: SQLiteCache, max_temperature: float = 0.5):
+        super().__init__(transport)
+        self.cache = cache
+        self.max_temperature = max_temperature
+
+    def _cache_key_for(self, request: httpx.Request) -> str | None:
+        """Return the cache key of the request, or None if it shouldn't be cached."""
+        if request.method != "POST" or not request.url.path.endswith("/chat/completions"):
+            return None
+        body = request_json(request)
+        temperature = body.get("temperature")
+        if temperature is None:
+            temperature = DEFAULT_TEMPERATURE
+        if not body or body.get("n", 1) != 1 or temperature > self.max_temperature:
+            return None
+        return cache_key(request, body)
+
+    def _cached_response(self, key: str) -> httpx.Response | None:
+        if (entry := self.cache.get(key)) is None:
+            return None
+        content, metadata = entry
+        headers = json.loads(metadata)
+        headers["x-demo-cache"] = "hit"
+        return httpx.Response(status_code=200, headers=headers, content=content)
+
+    def _store_response(self, key: str, response: httpx.Response) -> httpx.Response:
+        """Return the response unchanged, but store its body in the cache once it has been read completely."""
+        if response.status_code != 200:
+            return response
+        chunks = []
+        headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+
+        def on_end():
+            # The raw chunks are stored, still compressed if they were, along with their content-encoding
+            self.cache.set(key, b"".join(chunks), json.dumps(headers))
+
+        return observe_response(response, on_chunk=chunks.append, on_end=on_end)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if (key := self._cache_key_for(request)) is None:
+            return self.transport.handle_request(request)
+        if (response := self._cached_response(key)) is not None:
+            return response
+        return self._store_response(key, self.transport.handle_request(request))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if (key := self._cache_key_for(request)) is None:
+            return await self.transport.handle_async_request(request)
+        if (response := self._cached_response(key)) is not None:
+            return response
+        return self._store_response(key, await self.transport.handle_async_request(request))
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self.cache.close()
+
+    async def aclose(self) -> None:
+        try:
+            await super().aclose()
+        finally:
+            self.cache.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the chat completion cache.")
+    parser.add_argument("--clear", action="store_true", help="Delete every cached response and reset the counters")
+    parser.add_argument("--stats", action="store_true", help="Print the size and hit/miss counters of the cache")
+    args = parser.parse_args()
+
+    cache = create_cache()
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {cache.path}")
+    if args.stats or not args.clear:
+        stats = cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = f"{stats['hits'] / lookups:.0%}" if lookups else "-"
+        print(f"{cache.path}: {stats['entries']} responses, {stats['bytes'] / 1024:.1f} KiB")
+        print(f"hits: {stats['hits']}, misses: {stats['misses']}, hit rate: {hit_rate}")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
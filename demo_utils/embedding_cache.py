@@ -0,0 +1,175 @@
+"""
+A disk-backed cache of embeddings, shared by the ingestion scripts and the RAG query scripts.
+
+The same text always gets the same embedding from the same model, so every embedding is stored
+under the API endpoint, the model, the dimensions and the SHA-256 of the text. A repeated query, or
+a chunk that was already ingested (by either the English or the Spanish pipeline), is then answered
+from the cache without any network round-trip. The vectors are stored as float32, the precision the
+API returns them in.
+
+The cache is on unless EMBEDDING_CACHE_ENABLED is "false", and can be tuned with these environment variables:
+
+* EMBEDDING_CACHE_PATH: the SQLite file (default ~/.cache/python-openai-demos/embeddings.sqlite3)
+* EMBEDDING_CACHE_MAX_ENTRIES: most embeddings kept, least recently used are evicted first (default 100000)
+* EMBEDDING_CACHE_MAX_MB: most megabytes of embeddings kept (default 1024)
+* EMBEDDING_CACHE_MAX_AGE: seconds before an embedding expires (default 2592000, 30 days)
+
+Show the hit/miss counters or empty the cache with:
+
+    python -m demo_utils.embedding_cache --stats
+    python -m demo_utils.embedding_cache --clear
+"""
+
+import argparse
+import array
+import asyncio
+import collections
+import functools
+import hashlib
+import os
+import pathlib
+
+import openai
+
+from demo_utils.embeddings import DEFAULT_EMBEDDING_MODEL, embed_texts, embed_texts_async
+from demo_utils.sqlite_cache import SQLiteCache
+
+DEFAULT_CACHE_PATH = pathlib.Path.home() / ".cache" / "python-openai-demos" / "embeddings.sqlite3"
+
+
+def is_enabled() -> bool:
+    return os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+
+
+def create_cache() -> SQLiteCache:
+    """Return the embedding cache configured through the environment."""
+    return SQLiteCache(
+        os.getenv("EMBEDDING_CACHE_PATH") or DEFAULT_CACHE_PATH,
+        max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000")),
+        max_bytes=int(float(os.getenv("EMBEDDING_CACHE_MAX_MB", "1024")) * 1024 * 1024),
+        max_age=float(os.getenv("EMBEDDING_CACHE_MAX_AGE", str(30 * 24 * 3600))),
+    )
+
+
+@functools.cache
+def get_cache() -> SQLiteCache | None:
+    """Return the embedding cache shared by the process, or None if it's disabled."""
+    return create_cache() if is_enabled() else None
+
+
+def cache_key(endpoint: str, model: str, dimensions: int | None, text: str) -> str:
+    # Another endpoint may serve another model under the same name, like an Azure deployment or the local server
+    text_sha256 = hashlib.sha256(text.encode()).hexdigest()
+    return f"{endpoint}|{model}|{dimensions or 'default'}|{text_sha256}"
+
+
+def lookup(cache: SQLiteCache, client, texts: list[str], model: str, dimensions: int | None) -> tuple[list, dict, dict]:
+    """Return the cache key of every text, the cached embeddings by key, and the texts to embed by key."""
+    endpoint = str(client.base_url)
+    keys = [cache_key(endpoint, model, dimensions, text) for text in texts]
+    embeddings = {}
+    for key in dict.fromkeys(keys):
+        if (entry := cache.get(key)) is not None:
+            embeddings[key] = array.array("f", entry[0]).tolist()
+    # Each missing text is embedded once, even if it appears several times
+    missing = {key: text for key, text in zip(keys, texts) if key not in embeddings}
+    return keys, embeddings, missing
+
+
+def store(cache: SQLiteCache, embeddings: dict, missing: dict, new_embeddings: list[list[float]]) -> None:
+    for key, embedding in zip(missing, new_embeddings):
+        cache.set(key, array.array("f", embedding).tobytes())
+        embeddings[key] = embedding
+
+
+def get_embeddings(
+    client,
+    texts: list[str],
+    model: str = DEFAULT_EMBEDDING_MODEL,
+    dimensions: int | None = None,
+    usage: collections.Counter | None = None,
+) -> list[list[float]]:
+    """
+    Return the embeddings of the texts, in the same order, only sending the texts that aren't cached to the API.
+    The texts that weren't sent are counted under "cached_texts" in the usage counter.
+    """
+    cache = get_cache()
+    if cache is None:
+        return embed_texts(client, texts, model=model, dimensions=dimensions, usage=usage)
+    keys, embeddings, missing = lookup(cache, client, texts, model, dimensions)
+    if usage is not None:
+        usage["cached_texts"] += len(texts) - len(missing)
+    if missing:
+        new_embeddings = embed_texts(client, list(missing.values()), model=model, dimensions=dimensions, usage=usage)
+        store(cache, embeddings, missing, new_embeddings)
+    return [embeddings[key] for key in keys]
+
+
+async def get_embeddings_async(
+    client,
+    texts: list[str],
+    model: str = DEFAULT_EMBEDDING_MODEL,
+    dimensions: int | None = None,
+    usage: collections.Counter | None = None,
+    semaphore: asyncio.Semaphore | None = None,
+) -> list[list[float]]:
+    """Like get_embeddings, with an async client, sending the texts that aren't cached as concurrent requests."""
+    options = {"model": model, "dimensions": dimensions, "usage": usage, "semaphore": semaphore}
+    cache = get_cache()
+    if cache is None:
+        return await embed_texts_async(client, texts, **options)
+    keys, embeddings, missing = lookup(cache, client, texts, model, dimensions)
+    if usage is not None:
+        usage["cached_texts"] += len(texts) - len(missing)
+    if missing:
+        new_embeddings = await embed_texts_async(client, list(missing.values()), **options)
+        store(cache, embeddings, missing, new_embeddings)
+    return [embeddings[key] for key in keys]
+
+
+def get_embedding(
+    client, text: str, model: str = DEFAULT_EMBEDDING_MODEL, dimensions: int | None = None
+) -> list[float]:
+    """Return the embedding of a single text, like a search query, from the cache if it was embedded before."""
+    return get_embeddings(client, [text], model=model, dimensions=dimensions)[0]
+
+
+def get_query_embedding(client, query: str, dimensions: int, model: str = DEFAULT_EMBEDDING_MODEL) -> list[float]:
+    """
+    Return the embedding of a search query with the same number of dimensions as the stored embeddings it's
+    compared with, whatever EMBEDDING_DIMENSIONS is set to now, or raise an error if the model can't return it.
+    """
+    try:
+        embedding = get_embedding(client, query, model=model, dimensions=dimensions)
+    except openai.BadRequestError as error:
+        error.add_note(f"The stored embeddings have {dimensions} dimensions, which {model} must be able to return.")
+        raise
+    if len(embedding) != dimensions:
+        raise ValueError(
+            f"{model} returned an embedding of {len(embedding)} dimensions, but the stored embeddings have "
+            f"{dimensions}: ingest the documents again with the same model as the queries"
+        )
+    return embedding
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the embedding cache.")
+    parser.add_argument("--clear", action="store_true", help="Delete every cached embedding and reset the counters")
+    parser.add_argument("--stats", action="store_true", help="Print the size and hit/miss counters of the cache")
+    args = parser.parse_args()
+
+    cache = create_cache()
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {cache.path}")
+    if args.stats or not args.clear:
+        stats = cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = f"{stats['hits'] / lookups:.0%}" if lookups else "-"
+        print(f"{cache.path}: {stats['entries']} embeddings, {stats['bytes'] / 1024 / 1024:.1f} MiB")
+        print(f"hits: {stats['hits']}, misses: {stats['misses']}, hit rate: {hit_rate}")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Embed many texts with as few requests as possible.
+
+The embeddings API accepts a list of inputs, so instead of one round-trip per text we send
+batches of up to EMBEDDING_BATCH_SIZE texts (default 100) and about EMBEDDING_BATCH_MAX_TOKENS
+tokens (default 100000). If the service still rejects a batch as too large (a 413 error, or a 400
+error about the tokens or inputs per request), it's split in half and each half is retried, down to
+single texts. Any other error is raised right away.
+
+Models like text-embedding-3-small can return shorter embeddings through the `dimensions`
+parameter, which the scripts set from EMBEDDING_DIMENSIONS (default: the full size).
+
+The async variants keep up to EMBEDDING_CONCURRENCY requests (default 4) in flight at once,
+behind a semaphore that can be shared by every call that draws from the same quota. When a request
+fails, the others of the same call are cancelled before the error is raised.
+"""
+
+import asyncio
+import collections
+import math
+import os
+import re
+
+import openai
+
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+# The errors of a request over the token limit have this code, those of a request with too many inputs only a message
+TOO_LARGE_ERROR_CODES = ("max_tokens_per_request",)
+TOO_MANY_INPUTS_PATTERN = re.compile(r"too many inputs|at most \d+ inputs", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the tokens of a text on the high side (about 3 characters per token), to stay under the budget."""
+    return math.ceil(len(text) / 3) + 1
+
+
+def get_batch_size() -> int:
+    return int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+
+
+def get_max_batch_tokens() -> int:
+    return int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "100000"))
+
+
+def get_concurrency() -> int:
+    return int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+
+
+def get_dimensions() -> int | None:
+    """Return the EMBEDDING_DIMENSIONS to shorten the embeddings to, or None to keep the full size of the model."""
+    dimensions = os.getenv("EMBEDDING_DIMENSIONS")
+    return int(dimensions) if dimensions else None
+
+
+def make_batches(texts: list[str], batch_size: int, max_batch_tokens: int) -> list[list[int]]:
+    """Group the indexes of the texts, in order, into batches under both the size and the token limit."""
+    batches = []
+    batch, batch_tokens = [], 0
+    for index, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_batch_tokens):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(index)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def is_too_large_error(error: openai.APIStatusError) -> bool:
+    """
+    Whether the service rejected the request because of its size, which a smaller batch can fix. Other 400
+    errors, like an unknown model or invalid dimensions, would fail the same way for every half.
+    """
+    if error.status_code == 413:
+        return True
+    if error.status_code != 400:
+        return False
+    return error.code in TOO_LARGE_ERROR_CODES or bool(TOO_MANY_INPUTS_PATTERN.search(error.message))
+
+
+async def gather_or_cancel(*aws) -> list:
+    """
+    Like asyncio.gather, but when one of the awaitables fails, the others are cancelled (and waited for) before
+    the error is raised, so they don't keep sending requests after the caller got the error.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def read_response(response, usage: collections.Counter | None) -> list[list[float]]:
+    """Return the embeddings of the response in the order of the inputs, and add its token usage to the counter."""
+    if usage is not None and response.usage is not None:
+        usage["prompt_tokens"] += response.usage.prompt_tokens
+    # The embeddings carry the index of their input, which is how we map them back in order
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+def embed_batch(
+    client: openai.OpenAI,
+    texts: list[str],
+    model: str,
+    dimensions: int | None = None,
+    usage: collections.Counter | None = None,
+) -> list[list[float]]:
+    """Embed a batch of texts in one request, splitting it in halves if the service rejects it as too large."""
+    options = {"dimensions": dimensions} if dimensions else {}
+    try:
+        response = client.embeddings.create(model=model, input=texts, **options)
+    except openai.APIStatusError as error:
+        if len(texts) == 1 or not is_too_large_error(error):
+            raise
+        middle = len(texts) // 2
+        return embed_batch(client, texts[:middle], model, dimensions, usage) + embed_batch(
+            client, texts[middle:], model, dimensions, usage
+        )
+    return read_response(response, usage)
+
+
+async def embed_batch_async(
+    client: openai.AsyncOpenAI,
+    texts: list[str],
+    model: str,
+    dimensions: int | None = None,
+    usage: collections.Counter | None = None,
+    semaphore: asyncio.Semaphore | None = None,
+) -> list[list[float]]:
+    """Like embed_batch, with an async client, holding the semaphore (if any) only while a request is in flight."""
+    options = {"dimensions": dimensions} if dimensions else {}
+    try:
+        if semaphore is None:
+            response = await client.embeddings.create(model=model, input=texts, **options)
+        else:
+            async with semaphore:
+                response = await client.embeddings.create(model=model, input=texts, **options)
+    except openai.APIStatusError as error:
+        if len(texts) == 1 or not is_too_large_error(error):
+            raise
+        middle = len(texts) // 2
+        halves = await gather_or_cancel(
+            embed_batch_async(client, texts[:middle], model, dimensions, usage, semaphore),
+            embed_batch_async(client, texts[middle:], model, dimensions, usage, semaphore),
+        )
+        return halves[0] + halves[1]
+    return read_response(response, usage)
+
+
+def embed_texts(
+    client: openai.OpenAI,
+    texts: list[str],
+    model: str = DEFAULT_EMBEDDING_MODEL,
+    dimensions: int | None = None,
+    batch_size: int | None = None,
+    max_batch_tokens: int | None = None,
+    usage: collections.Counter | None = None,
+) -> list[list[float]]:
+    """Return the embeddings of the texts, in the same order, using batched requests."""
+    batch_size = batch_size or get_batch_size()
+    max_batch_tokens = max_batch_tokens or get_max_batch_tokens()
+    embeddings = [None] * len(texts)
+    for batch in make_batches(texts, batch_size, max_batch_tokens):
+        batch_embeddings = embed_batch(client, [texts[index] for index in batch], model, dimensions, usage)
+        for index, embedding in zip(batch, batch_embeddings):
+            embeddings[index] = embedding
+    return embeddings
+
+
+async def embed_texts_async(
+    client: openai.AsyncOpenAI,
+    texts: list[str],
+    model: str = DEFAULT_EMBEDDING_MODEL,
+    dimensions: int | None = None,
+    batch_size: int | None = None,
+    max_batch_tokens: int | None = None,
+    usage: collections.Counter | None = None,
+    semaphore: asyncio.Semaphore | None = None,
+) -> list[list[float]]:
+    """
+    Return the embeddings of the texts, in the same order, sending the batches concurrently with at most
+    EMBEDDING_CONCURRENCY requests in flight, or as many as the given semaphore allows.
+    """
+    batch_size = batch_size or get_batch_size()
+    max_batch_tokens = max_batch_tokens or get_max_batch_tokens()
+    semaphore = semaphore or asyncio.Semaphore(get_concurrency())
+    batches = make_batches(texts, batch_size, max_batch_tokens)
+    # The results come in the order of the batches, whatever order the responses come back in
+    results = await gather_or_cancel(
+        *(
+            embed_batch_async(client, [texts[index] for index in batch], model, dimensions, usage, semaphore)
+            for batch in batches
+        )
+    )
+    embeddings = [None] * len(texts)
+    for batch, batch_embeddings in zip(batches, results):
+        for index, embedding in zip(batch, batch_embeddings):
+            embeddings[index] = embedding
+    return embeddings
@@ -0,0 +1,58 @@
+import os
+import time
+
+
+class FileLock:
+    """
+    A minimal cross-platform lock file, for coordinating writes to a shared file between processes.
+
+        with FileLock("tokens.json.lock"):
+            ...
+    """
+
+    def __init__(self, path, timeout: float = 30.0, stale_after: float = 60.0):
+        self.path = str(path)
+        self.timeout = timeout
+        # A lock file older than this was left behind by a process that crashed while holding it
+        self.stale_after = stale_after
+        # Written into the lock file, so that only the holder of the lock removes it
+        self.token = None
+
+    def acquire(self) -> None:
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.stale_after:
+                        os.remove(self.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out waiting for the lock file {self.path}")
+                time.sleep(0.05)
+            else:
+                self.token = f"{os.getpid()}-{os.urandom(8).hex()}"
+                os.write(fd, self.token.encode())
+                os.close(fd)
+                return
+
+    def release(self) -> None:
+        """Remove the lock file, unless another process took it over as stale since it was acquired."""
+        token, self.token = self.token, None
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                if file.read() != token:
+                    return
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
@@ -0,0 +1,214 @@
+"""
+Hedged requests with automatic failover across several API hosts, to keep tail latency bounded
+when one backend is slow or degraded.
+
+A HedgedClient sends each chat completion to the healthiest backend first. If it hasn't answered
+(or, for streams, sent its first chunk) after a hedge delay, the same request is also sent to the
+next backend, and whichever answers first wins. If a backend fails, the next one is tried right away.
+The hedge delay is the 95th percentile of the recent latencies of the backend that was tried, so
+hedges only fire for the slowest requests, unless a fixed delay is given.
+
+The losing request is closed as soon as it returns. The sync OpenAI client can't abort a request
+that is still waiting for its response, so a non-streamed loser keeps running in the background
+until the backend answers it, and is then discarded.
+"""
+
+import collections
+import dataclasses
+import queue
+import statistics
+import threading
+import time
+import types
+
+# Backends with this many errors in a row are tried last, until UNHEALTHY_SECONDS have passed
+MAX_CONSECUTIVE_ERRORS = 3
+UNHEALTHY_SECONDS = 30.0
+# Latencies needed before the percentile is trusted over the initial hedge delay
+MIN_SAMPLES = 5
+
+
+@dataclasses.dataclass
+class BackendStats:
+    requests: int = 0
+    errors: int = 0
+    wins: int = 0
+    hedges: int = 0
+    consecutive_errors: int = 0
+    unhealthy_until: float = 0.0
+    # Recent latencies (to the first chunk for streams), separately for streamed and non-streamed requests
+    latencies: dict = dataclasses.field(
+        default_factory=lambda: {False: collections.deque(maxlen=100), True: collections.deque(maxlen=100)}
+    )
+
+    def percentile(self, percent: float, stream: bool) -> float | None:
+        samples = self.latencies[stream]
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return statistics.quantiles(samples, n=100, method="inclusive")[min(98, max(0, int(percent) - 1))]
+
+    def is_healthy(self, now: float) -> bool:
+        return now >= self.unhealthy_until
+
+
+@dataclasses.dataclass
+class Backend:
+    name: str
+    client: object
+    model: str
+    stats: BackendStats = dataclasses.field(default_factory=BackendStats)
+
+
+class HedgedStream:
+    """A chat completion stream whose first chunk was already read while racing the backends."""
+
+    def __init__(self, first_chunk, stream):
+        self.first_chunk = first_chunk
+        self.stream = stream
+
+    def __iter__(self):
+        if self.first_chunk is not None:
+            yield self.first_chunk
+        yield from self.stream
+
+    def close(self):
+        self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class HedgedClient:
+    """
+    A stand-in for an OpenAI client that spreads `chat.completions.create` calls over several backends.
+    The `model` argument is replaced by the model of the backend that each request is sent to.
+    """
+
+    def __init__(
+        self, backends: list[Backend], hedge_delay: float | None = None, percentile: float = 95, initial_delay=1.0
+    ):
+        self.backends = backends
+        self.hedge_delay = hedge_delay
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.lock = threading.Lock()
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create_chat_completion))
+
+    def ranked_backends(self) -> list[Backend]:
+        """Return the backends in their configured order, with the unhealthy ones last."""
+        now = time.monotonic()
+        with self.lock:
+            return sorted(self.backends, key=lambda backend: not backend.stats.is_healthy(now))
+
+    def delay_for(self, backend: Backend, stream: bool) -> float:
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        with self.lock:
+            delay = backend.stats.percentile(self.percentile, stream)
+        return self.initial_delay if delay is None else delay
+
+    def _record(self, backend: Backend, latency: float | None, stream: bool, hedge: bool) -> None:
+        with self.lock:
+            stats = backend.stats
+            stats.requests += 1
+            stats.hedges += hedge
+            if latency is None:
+                stats.errors += 1
+                stats.consecutive_errors += 1
+                if stats.consecutive_errors >= MAX_CONSECUTIVE_ERRORS:
+                    stats.unhealthy_until = time.monotonic() + UNHEALTHY_SECONDS
+            else:
+                stats.consecutive_errors = 0
+                stats.latencies[stream].append(latency)
+
+    def _attempt(self, backend: Backend, kwargs: dict, results: queue.Queue) -> None:
+        start = time.perf_counter()
+        try:
+            response = backend.client.chat.completions.create(**{**kwargs, "model": backend.model})
+            first_chunk = None
+            if kwargs.get("stream"):
+                first_chunk = next(iter(response), None)
+            results.put((backend, time.perf_counter() - start, response, first_chunk, None))
+        except Exception as error:
+            results.put((backend, None, None, None, error))
+
+    @staticmethod
+    def _close(response, stream: bool) -> None:
+        if stream and response is not None:
+            response.close()
+
+    def _discard_losers(self, results: queue.Queue, pending: int, stream: bool, hedged: set) -> None:
+        """Wait for the requests that lost the race, to close them and record their latency."""
+        for _ in range(pending):
+            backend, latency, response, _, _ = results.get()
+            self._record(backend, latency, stream, backend.name in hedged)
+            self._close(response, stream)
+
+    def create_chat_completion(self, **kwargs):
+        stream = bool(kwargs.get("stream"))
+        backends = self.ranked_backends()
+        results = queue.Queue()
+        hedged = set()
+        pending = 0
+        next_index = 0
+        deadline = None
+        error = None
+
+        def launch(is_hedge: bool):
+            nonlocal pending, next_index, deadline
+            backend = backends[next_index]
+            next_index += 1
+            pending += 1
+            if is_hedge:
+                hedged.add(backend.name)
+            threading.Thread(target=self._attempt, args=(backend, kwargs, results), daemon=True).start()
+            deadline = time.monotonic() + self.delay_for(backend, stream)
+
+        launch(is_hedge=False)
+        while pending:
+            can_hedge = next_index < len(backends)
+            try:
+                timeout = max(0.0, deadline - time.monotonic()) if can_hedge else None
+                backend, latency, response, first_chunk, error = results.get(timeout=timeout)
+            except queue.Empty:
+                # The backends in flight are slower than usual, so the next one races them
+                launch(is_hedge=True)
+                continue
+            pending -= 1
+            self._record(backend, latency, stream, backend.name in hedged)
+            if error is not None:
+                # Fail over to the next backend right away
+                if next_index < len(backends):
+                    launch(is_hedge=False)
+                continue
+            with self.lock:
+                backend.stats.wins += 1
+            if pending:
+                threading.Thread(
+                    target=self._discard_losers, args=(results, pending, stream, hedged), daemon=True
+                ).start()
+            return HedgedStream(first_chunk, response) if stream else response
+        raise error
+
+    def health(self) -> dict:
+        """Return the request, error, win and hedge counts and latency percentiles of every backend."""
+        now = time.monotonic()
+        report = {}
+        with self.lock:
+            for backend in self.backends:
+                stats = backend.stats
+                report[backend.name] = {
+                    "healthy": stats.is_healthy(now),
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "wins": stats.wins,
+                    "hedges": stats.hedges,
+                    "p50_s": stats.percentile(50, stream=False),
+                    "p95_s": stats.percentile(95, stream=False),
+                    "stream_p50_s": stats.percentile(50, stream=True),
+                    "stream_p95_s": stats.percentile(95, stream=True),
+                }
+        return report
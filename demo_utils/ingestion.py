@@ -0,0 +1,690 @@
+"""
+Incremental ingestion of PDFs for the RAG demos.
+
+Next to the chunks file, a manifest records the SHA-256 of every source PDF, of the splitter
+configuration and of the text of every chunk. On the next run, only the PDFs whose hash changed
+are extracted and split again, only the chunks with new text are embedded, and the chunks of the PDFs
+that are no longer ingested are dropped. If the splitter configuration or the embedding model changed,
+or the manifest is missing, everything is rebuilt.
+
+The ingestion runs as a pipeline of three stages connected by bounded queues, so that the PDFs are
+extracted and split (in a pool of processes, see demo_utils.pdf_extraction) while the previous chunks
+are being embedded, and the embedded chunks are appended to the output files as they come. A stage
+waits when the next one falls behind, so the memory used stays flat however many PDFs there are.
+
+ingest_pdfs_async does the same with an AsyncOpenAI client: instead of one batch at a time, it keeps
+up to EMBEDDING_CONCURRENCY embedding requests in flight, and still writes the batches in order.
+
+Every INGESTION_CHECKPOINT_SECONDS (default 10), and when a run fails, a checkpoint next to the chunks
+file records where the partial output files end after each completed PDF, and the text hashes of the
+chunks written since. The next run with the same settings picks the partial files up after the last
+completed PDF that didn't change, and reuses the embeddings of the chunks written after it, so a crash
+or a rate limit only loses the work done since the last checkpoint. At the end, the lunr index of the
+chunks is saved next to them (see demo_utils.keyword_index), and with VECTOR_INDEX=hnsw the HNSW graph of
+the embeddings is built too (see demo_utils.vector_search).
+
+Before they're embedded, the chunks that are near-duplicates of an earlier chunk (see
+demo_utils.near_duplicates) are dropped, and every drop is recorded in the manifest with the chunk it
+duplicates, and reported to `on_duplicate`.
+"""
+
+import asyncio
+import collections
+import contextlib
+import dataclasses
+import hashlib
+import itertools
+import json
+import os
+import pathlib
+import queue
+import threading
+import time
+
+from demo_utils.chunk_store import (
+    ChunkWriter,
+    dequantize,
+    file_sha256,
+    get_embedding_dtype,
+    load_chunks,
+    load_embeddings,
+    load_partial_chunks,
+    load_partial_embeddings,
+    load_scales,
+    partial_paths_for,
+    partial_sizes,
+    write_json,
+)
+from demo_utils.embedding_cache import get_embeddings, get_embeddings_async
+from demo_utils.embeddings import DEFAULT_EMBEDDING_MODEL, get_batch_size, get_concurrency, get_dimensions
+from demo_utils.keyword_index import open_keyword_index
+from demo_utils.near_duplicates import NearDuplicate, NearDuplicateIndex, get_dedupe_threshold
+from demo_utils.pdf_extraction import iter_extract_and_split, splitter_config
+from demo_utils.transports import canonical_json
+from demo_utils.vector_search import get_vector_index, load_vector_index
+
+MANIFEST_VERSION = 1
+# The value of the settings that manifests and checkpoints from before they existed were written with
+SETTING_DEFAULTS = {"embedding_dimensions": None, "embedding_dtype": "float32", "dedupe_threshold": 0.0}
+# Most PDFs, and batches of embedded chunks, waiting between two stages of the pipeline
+QUEUE_SIZE = 4
+# Least seconds between two progress reports
+PROGRESS_INTERVAL = 1.0
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def manifest_path_for(chunks_path) -> pathlib.Path:
+    chunks_path = pathlib.Path(chunks_path)
+    return chunks_path.with_name(f"{chunks_path.stem}.manifest.json")
+
+
+def checkpoint_path_for(chunks_path) -> pathlib.Path:
+    chunks_path = pathlib.Path(chunks_path)
+    return chunks_path.with_name(f"{chunks_path.stem}.checkpoint.json")
+
+
+def get_checkpoint_seconds() -> float:
+    return float(os.getenv("INGESTION_CHECKPOINT_SECONDS", "10"))
+
+
+def find_pdfs(directory) -> list[pathlib.Path]:
+    """Return every PDF in the directory and its subdirectories, sorted by path."""
+    return sorted(path for path in pathlib.Path(directory).rglob("*") if path.suffix.lower() == ".pdf")
+
+
+class PipelineStopped(Exception):
+    """Raised in a stage of the pipeline when another stage failed."""
+
+
+class Pipeline:
+    """The bounded queues between the stages of the ingestion, and the error that stopped it, if any."""
+
+    DONE = object()
+
+    def __init__(self):
+        self.stopped = threading.Event()
+        self.error = None
+
+    def stop(self, error: BaseException) -> None:
+        if self.error is None:
+            self.error = error
+        self.stopped.set()
+
+    def put(self, items: queue.Queue, item) -> None:
+        """Put the item in the queue, waiting while it's full unless the pipeline stopped."""
+        while not self.stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise PipelineStopped()
+
+    def get(self, items: queue.Queue):
+        """Return the next item of the queue, waiting while it's empty unless the pipeline stopped."""
+        while not self.stopped.is_set():
+            try:
+                return items.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        raise PipelineStopped()
+
+    def iter(self, items: queue.Queue):
+        """Yield the items of the queue until the stage before puts DONE."""
+        while (item := self.get(items)) is not self.DONE:
+            yield item
+
+    def start_stage(self, name: str, function, output: queue.Queue) -> threading.Thread:
+        """Run the stage in a thread, and put DONE in its output queue when it's done."""
+
+        def run():
+            try:
+                function()
+                self.put(output, self.DONE)
+            except PipelineStopped:
+                pass
+            except BaseException as error:
+                self.stop(error)
+
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        thread.start()
+        return thread
+
+
+@dataclasses.dataclass
+class IngestionProgress:
+    files_done: int
+    files_total: int
+    chunks_written: int
+    seconds: float
+    # The size of the PDFs to extract, done and left, which is how the remaining work is estimated
+    bytes_done: int
+    bytes_left: int
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks_written / self.seconds if self.seconds else 0.0
+
+    @property
+    def eta_seconds(self) -> float | None:
+        """The seconds left at the throughput measured so far, or None before the first PDF is done."""
+        if not self.bytes_left:
+            return 0.0
+        return self.bytes_left * self.seconds / self.bytes_done if self.bytes_done else None
+
+
+@dataclasses.dataclass
+class IngestionSummary:
+    extracted_files: list[str]
+    unchanged_files: list[str]
+    dropped_files: list[str]
+    # The chunks sent to the embeddings API, and those with the embedding of an earlier run
+    embedded_chunks: int
+    reused_chunks: int
+    # The prompt tokens of the embedding requests, as reported by the API, and the duration of the whole run
+    embedded_tokens: int = 0
+    seconds: float = 0.0
+    # The PDFs that were already done in the checkpoint of a run that stopped
+    resumed_files: list[str] = dataclasses.field(default_factory=list)
+    # The chunks dropped in this run as near-duplicates of an earlier chunk
+    duplicate_chunks: list[NearDuplicate] = dataclasses.field(default_factory=list)
+    # The chunks with a new text that was found in the embedding cache, so not sent to the API
+    cached_chunks: int = 0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.embedded_chunks / self.seconds if self.seconds else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.embedded_tokens / self.seconds if self.seconds else 0.0
+
+
+def same_settings(document: dict, settings: dict) -> bool:
+    """Whether a manifest or a checkpoint was written with the settings, where older ones lack the storage settings."""
+    return document.get("version") == MANIFEST_VERSION and all(
+        document.get(key, SETTING_DEFAULTS.get(key)) == value for key, value in settings.items()
+    )
+
+
+def load_previous(chunks_path, manifest_path, settings: dict) -> tuple[dict, dict, object, object]:
+    """
+    Return the files of the previous manifest, the previous chunks by id (with the "row" of their embedding),
+    and the memory-mapped embeddings and their scales (None for float32), or empty values if there is no previous
+    run or it used other settings.
+    """
+    try:
+        with open(manifest_path, encoding="utf-8") as file:
+            manifest = json.load(file)
+        chunks = load_chunks(chunks_path)
+        embeddings = load_embeddings(chunks_path)
+        scales = load_scales(chunks_path)
+    except (OSError, ValueError):
+        return {}, {}, None, None
+    if (
+        not same_settings(manifest, settings)
+        or len(embeddings) != len(chunks)
+        or (scales is not None and len(scales) != len(chunks))
+    ):
+        return {}, {}, None, None
+    chunks_by_id = {chunk["id"]: {**chunk, "row": row} for row, chunk in enumerate(chunks)}
+    return manifest["files"], chunks_by_id, embeddings, scales
+
+
+def load_checkpoint(chunks_path, settings: dict) -> dict | None:
+    """Return the checkpoint of a run that stopped with the same settings, if its partial files are still whole."""
+    try:
+        with open(checkpoint_path_for(chunks_path), encoding="utf-8") as file:
+            checkpoint = json.load(file)
+        sizes = [path.stat().st_size if path.exists() else 0 for path in partial_paths_for(chunks_path)]
+    except (OSError, ValueError):
+        return None
+    if not same_settings(checkpoint, settings) or any(
+        size < expected for size, expected in zip(sizes, partial_sizes(checkpoint, settings["embedding_dtype"]))
+    ):
+        return None
+    return checkpoint
+
+
+class IngestionRun:
+    """
+    The state of one ingestion, shared by the threaded and the async pipelines: what the previous run
+    left behind, which PDFs changed, and the output files the embedded chunks are appended to.
+    The PDFs are named by their path relative to `root`, or by their file name without one.
+    """
+
+    def __init__(
+        self,
+        pdf_paths: list,
+        chunks_path,
+        embedding_model: str,
+        root=None,
+        on_progress=None,
+        dimensions: int | None = None,
+        dtype: str | None = None,
+        dedupe_threshold: float | None = None,
+        on_duplicate=None,
+    ):
+        self.start = time.perf_counter()
+        self.pdf_paths = [pathlib.Path(path) for path in pdf_paths]
+        self.names = {
+            path: path.relative_to(root).as_posix() if root is not None else path.name for path in self.pdf_paths
+        }
+        self.chunks_path = chunks_path
+        self.manifest_path = manifest_path_for(chunks_path)
+        self.checkpoint_path = checkpoint_path_for(chunks_path)
+        self.embedding_model = embedding_model
+        self.dimensions = dimensions if dimensions is not None else get_dimensions()
+        self.dtype = dtype or get_embedding_dtype()
+        self.on_progress = on_progress
+        self.on_duplicate = on_duplicate
+        self.dedupe_threshold = dedupe_threshold if dedupe_threshold is not None else get_dedupe_threshold()
+        # A change to any of these settings makes the previous chunks or embeddings unusable
+        self.settings = {
+            "splitter_sha256": hashlib.sha256(canonical_json(splitter_config())).hexdigest(),
+            "embedding_model": embedding_model,
+            "embedding_dimensions": self.dimensions,
+            "embedding_dtype": self.dtype,
+            "dedupe_threshold": self.dedupe_threshold,
+        }
+        self.previous_files, self.previous_chunks, self.previous_embeddings, self.previous_scales = load_previous(
+            chunks_path, self.manifest_path, self.settings
+        )
+
+        # The previous chunks that still match the manifest, and the rows of their embeddings by the hash of their text
+        self.intact_chunk_ids = set()
+        self.previous_rows = {}
+        for file_entry in self.previous_files.values():
+            for chunk_id, chunk_hash in file_entry["chunks"].items():
+                chunk = self.previous_chunks.get(chunk_id)
+                if chunk is not None and text_sha256(chunk["text"]) == chunk_hash:
+                    self.intact_chunk_ids.add(chunk_id)
+                    self.previous_rows[chunk_hash] = chunk["row"]
+
+        self.file_hashes = {self.names[path]: file_sha256(path) for path in self.pdf_paths}
+        self.files = {
+            name: {"sha256": sha256, "chunks": {}, "duplicates": {}} for name, sha256 in self.file_hashes.items()
+        }
+        self.file_index = {self.names[path]: index for index, path in enumerate(self.pdf_paths)}
+        # The positions in the output files after each completed PDF, and the index of the first PDF not completed
+        self.completed = []
+        self.next_index = 0
+        self.resumed_embeddings = {}
+        # The chunks kept so far, to find the near-duplicates among the next ones, and those dropped in this run
+        self.kept_chunks = NearDuplicateIndex(self.dedupe_threshold) if self.dedupe_threshold > 0 else None
+        self.duplicates = []
+        position = self.resume(load_checkpoint(chunks_path, self.settings))
+        self.resumed_count = self.next_index
+
+        pending_paths = self.pdf_paths[self.next_index :]
+        self.changed_paths = self.find_changed_paths()
+        self.changed = set(self.changed_paths)
+        self.unchanged_paths = [path for path in pending_paths if path not in self.changed]
+        self.counts = {"new": 0, "reused": 0, "written": 0}
+        self.usage = collections.Counter()
+        self.bytes_left = sum(path.stat().st_size for path in self.changed_paths)
+        self.bytes_done = 0
+        self.last_progress = 0.0
+        self.writing = False
+        self.last_checkpoint = time.monotonic()
+        self.writer = ChunkWriter(chunks_path, resume=position, dtype=self.dtype)
+        if position is None:
+            self.checkpoint_path.unlink(missing_ok=True)
+        else:
+            # The partial files were cut after the resumed PDFs, so the checkpoint must not point past that anymore
+            self.checkpoint()
+
+    def resume(self, checkpoint: dict | None) -> dict | None:
+        """
+        Take over the PDFs at the start of the checkpoint that are still the first ones and unchanged, and keep
+        the embeddings of the chunks written after them. Return the position to resume the output files from.
+        """
+        if checkpoint is None:
+            return None
+        for entry, path in zip(checkpoint["files"], self.pdf_paths):
+            if entry["name"] != self.names[path] or entry["sha256"] != self.file_hashes[entry["name"]]:
+                break
+            self.files[entry["name"]].update(chunks=entry["chunks"], duplicates=entry.get("duplicates", {}))
+            self.completed.append(entry)
+            self.next_index += 1
+
+        start = self.completed[-1]["rows"] if self.completed else 0
+        if self.kept_chunks is not None and self.completed:
+            # The chunks of the resumed PDFs are only in the partial chunks file, and the next ones may duplicate them
+            for chunk in load_partial_chunks(self.chunks_path, self.completed[-1]["chunks_bytes"]):
+                self.kept_chunks.add(chunk["id"], chunk["text"])
+        later_hashes = [
+            chunk_hash for entry in checkpoint["files"][self.next_index :] for chunk_hash in entry["chunks"].values()
+        ] + checkpoint["partial"]
+        if later_hashes:
+            embeddings = load_partial_embeddings(
+                self.chunks_path, start, checkpoint["rows"], checkpoint["dimensions"], self.dtype
+            )
+            self.resumed_embeddings = dict(zip(later_hashes, embeddings))
+        if not self.completed:
+            return None
+        return {key: self.completed[-1][key] for key in ("rows", "chunks_bytes", "dimensions")}
+
+    def is_unchanged(self, path: pathlib.Path) -> bool:
+        file_entry = self.previous_files.get(self.names[path])
+        return (
+            file_entry is not None
+            and file_entry["sha256"] == self.file_hashes[self.names[path]]
+            and all(chunk_id in self.intact_chunk_ids for chunk_id in file_entry["chunks"])
+        )
+
+    def find_changed_paths(self) -> list[pathlib.Path]:
+        """
+        Return the PDFs after the resumed ones to extract and split again: the changed ones, and after the first
+        difference with the previous run, the ones with chunks dropped as near-duplicates, since the chunk they
+        duplicated may be gone and the dropped chunks aren't kept anywhere.
+        """
+        remaining = [name for name in self.previous_files if name in self.files]
+        differs = len(remaining) < len(self.previous_files) or remaining != [
+            name for name in self.files if name in self.previous_files
+        ]
+        changed_paths = []
+        for index, path in enumerate(self.pdf_paths):
+            name = self.names[path]
+            if index < self.next_index:
+                differs = differs or self.previous_files.get(name, {}).get("sha256") != self.file_hashes[name]
+            elif not self.is_unchanged(path) or (differs and self.previous_files[name].get("duplicates")):
+                changed_paths.append(path)
+                differs = True
+            else:
+                # The chunks dropped from an unchanged PDF are still near-duplicates of the same chunks
+                self.files[name]["duplicates"] = dict(self.previous_files[name].get("duplicates", {}))
+        return changed_paths
+
+    def extract_stage(self, pipeline: Pipeline, output: queue.Queue, workers: int | None) -> None:
+        """Put the chunks of every PDF in the queue, in order, the unchanged ones with their previous chunks."""
+        with contextlib.closing(iter_extract_and_split(self.changed_paths, workers)) as results:
+            for path in self.pdf_paths[self.next_index :]:
+                name = self.names[path]
+                if path in self.changed:
+                    _, texts = next(results)
+                    file_chunks = [{"id": f"{name}-{(i + 1)}", "text": text} for i, text in enumerate(texts)]
+                else:
+                    file_chunks = [
+                        {"id": chunk_id, "text": self.previous_chunks[chunk_id]["text"]}
+                        for chunk_id in self.previous_files[name]["chunks"]
+                    ]
+                pipeline.put(output, (name, file_chunks))
+
+    def prepare(self, name: str, file_chunks: list[dict]) -> list[tuple]:
+        """
+        Return the (file name, chunk, text hash) of the chunks that aren't near-duplicates of an earlier chunk,
+        with the embedding of the texts embedded before.
+        """
+        items = []
+        for chunk in file_chunks:
+            if self.kept_chunks is not None and (duplicate := self.kept_chunks.check(chunk["id"], chunk["text"])):
+                self.drop_duplicate(name, duplicate)
+                continue
+            chunk_hash = text_sha256(chunk["text"])
+            if (row := self.previous_rows.get(chunk_hash)) is not None:
+                chunk["embedding"] = self.previous_embeddings[row]
+                if self.previous_scales is not None:
+                    chunk["embedding"] = dequantize(chunk["embedding"], self.previous_scales[row])
+            elif (embedding := self.resumed_embeddings.get(chunk_hash)) is not None:
+                chunk["embedding"] = embedding
+            items.append((name, chunk, chunk_hash))
+        return items
+
+    def drop_duplicate(self, name: str, duplicate: NearDuplicate) -> None:
+        self.files[name]["duplicates"][duplicate.chunk_id] = {
+            "duplicate_of": duplicate.duplicate_of,
+            "similarity": round(duplicate.similarity, 3),
+        }
+        self.duplicates.append(duplicate)
+        if self.on_duplicate is not None:
+            self.on_duplicate(duplicate)
+
+    def missing(self, batch: list[tuple]) -> list[dict]:
+        """Return the chunks of the batch with a text that wasn't embedded before, and count them."""
+        new_chunks = [chunk for _, chunk, _ in batch if "embedding" not in chunk]
+        self.counts["new"] += len(new_chunks)
+        self.counts["reused"] += len(batch) - len(new_chunks)
+        return new_chunks
+
+    def write(self, batch: list[tuple]) -> None:
+        for name, items in itertools.groupby(batch, key=lambda item: item[0]):
+            items = list(items)
+            self.complete_files(self.file_index[name])
+            self.writing = True
+            self.writer.write([chunk for _, chunk, _ in items], [chunk["embedding"] for _, chunk, _ in items])
+            self.writing = False
+            for _, chunk, chunk_hash in items:
+                self.files[name]["chunks"][chunk["id"]] = chunk_hash
+            self.counts["written"] += len(items)
+        if time.monotonic() - self.last_checkpoint >= get_checkpoint_seconds():
+            self.checkpoint()
+
+    def complete_files(self, index: int) -> None:
+        """Record where the output files end after the PDFs before the index, now that all their chunks are written."""
+        if index <= self.next_index:
+            return
+        position = self.writer.position()
+        for path in self.pdf_paths[self.next_index : index]:
+            name = self.names[path]
+            self.completed.append({"name": name, **self.files[name], **position})
+            if path in self.changed:
+                self.bytes_done += path.stat().st_size
+                self.bytes_left -= path.stat().st_size
+        self.next_index = index
+        self.report_progress(force=index == len(self.pdf_paths))
+
+    def report_progress(self, force: bool = False) -> None:
+        if self.on_progress is None or (not force and time.monotonic() - self.last_progress < PROGRESS_INTERVAL):
+            return
+        self.last_progress = time.monotonic()
+        self.on_progress(
+            IngestionProgress(
+                files_done=self.next_index,
+                files_total=len(self.pdf_paths),
+                chunks_written=self.counts["written"],
+                seconds=time.perf_counter() - self.start,
+                bytes_done=self.bytes_done,
+                bytes_left=self.bytes_left,
+            )
+        )
+
+    def checkpoint(self) -> None:
+        """Save the completed PDFs, and the hashes of the chunks written since, once the output files are on disk."""
+        position = self.writer.position()
+        self.writer.sync()
+        partial = []
+        if self.next_index < len(self.pdf_paths):
+            partial = list(self.files[self.names[self.pdf_paths[self.next_index]]]["chunks"].values())
+        checkpoint = {
+            "version": MANIFEST_VERSION,
+            **self.settings,
+            "files": self.completed,
+            "partial": partial,
+            **position,
+        }
+        write_json(self.checkpoint_path, checkpoint)
+        self.last_checkpoint = time.monotonic()
+
+    def release_previous(self) -> None:
+        # The previous embeddings must be unmapped before their file can be replaced
+        self.previous_chunks = self.previous_embeddings = self.previous_scales = None
+        self.resumed_embeddings = {}
+
+    def abort(self) -> None:
+        """Keep the partial output files and a checkpoint to resume from, unless the run failed while writing them."""
+        self.release_previous()
+        keep = not self.writing
+        if keep:
+            self.checkpoint()
+        else:
+            self.checkpoint_path.unlink(missing_ok=True)
+        self.writer.abort(keep=keep)
+
+    def finish(self) -> IngestionSummary:
+        self.complete_files(len(self.pdf_paths))
+        self.release_previous()
+        # The manifest is written last: if the run stops in between, the chunk hashes no longer match and aren't trusted
+        self.writer.close()
+        manifest = {"version": MANIFEST_VERSION, "splitter": splitter_config(), **self.settings, "files": self.files}
+        write_json(self.manifest_path, manifest, indent=2)
+        self.checkpoint_path.unlink(missing_ok=True)
+        # The search indexes are built (or found up to date) now, rather than when a query script first starts
+        open_keyword_index(self.chunks_path, load_chunks(self.chunks_path), ref="id", fields=["text"])
+        if get_vector_index() == "hnsw":
+            load_vector_index(self.chunks_path)
+        return IngestionSummary(
+            extracted_files=[self.names[path] for path in self.changed_paths],
+            unchanged_files=[self.names[path] for path in self.unchanged_paths],
+            dropped_files=[name for name in self.previous_files if name not in self.files],
+            embedded_chunks=self.counts["new"] - self.usage["cached_texts"],
+            reused_chunks=self.counts["reused"],
+            embedded_tokens=self.usage["prompt_tokens"],
+            seconds=time.perf_counter() - self.start,
+            resumed_files=[self.names[path] for path in self.pdf_paths[: self.resumed_count]],
+            duplicate_chunks=self.duplicates,
+            cached_chunks=self.usage["cached_texts"],
+        )
+
+
+def ingest_pdfs(
+    client,
+    pdf_paths: list,
+    chunks_path,
+    embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+    workers: int | None = None,
+    root=None,
+    on_progress=None,
+    dimensions: int | None = None,
+    dtype: str | None = None,
+    dedupe_threshold: float | None = None,
+    on_duplicate=None,
+) -> IngestionSummary:
+    """
+    Extract, split and embed the PDFs into the chunks file and its embeddings matrix (see demo_utils.chunk_store),
+    reusing the chunks and embeddings of the previous run for everything that didn't change, and resuming from the
+    checkpoint of a run that stopped. on_progress is called with an IngestionProgress as the PDFs are done.
+    The embeddings are shortened to `dimensions` (EMBEDDING_DIMENSIONS by default) and stored as `dtype`
+    (EMBEDDING_STORAGE by default, "float32" or "int8"). The chunks that are near-duplicates of an earlier chunk,
+    at `dedupe_threshold` (INGESTION_DEDUPE_THRESHOLD by default, 0 to keep them all), are dropped before they're
+    embedded, and on_duplicate is called with a NearDuplicate for each of them.
+    """
+    run = IngestionRun(
+        pdf_paths, chunks_path, embedding_model, root, on_progress, dimensions, dtype, dedupe_threshold, on_duplicate
+    )
+    pipeline = Pipeline()
+    split_files = queue.Queue(maxsize=QUEUE_SIZE)
+    embedded_batches = queue.Queue(maxsize=QUEUE_SIZE)
+
+    def embed_stage():
+        # Chunks from consecutive PDFs are embedded together, so the requests stay as full as before
+        batch_size = get_batch_size()
+        batch = []
+
+        def flush():
+            # Only the chunks with a text that wasn't embedded before are embedded, and those may be in the cache
+            if new_chunks := run.missing(batch):
+                texts = [chunk["text"] for chunk in new_chunks]
+                embeddings = get_embeddings(
+                    client, texts, model=embedding_model, dimensions=run.dimensions, usage=run.usage
+                )
+                for chunk, embedding in zip(new_chunks, embeddings):
+                    chunk["embedding"] = embedding
+            pipeline.put(embedded_batches, list(batch))
+            batch.clear()
+
+        for name, file_chunks in pipeline.iter(split_files):
+            batch.extend(run.prepare(name, file_chunks))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+    threads = [
+        pipeline.start_stage("extract", lambda: run.extract_stage(pipeline, split_files, workers), split_files),
+        pipeline.start_stage("embed", embed_stage, embedded_batches),
+    ]
+    try:
+        for batch in pipeline.iter(embedded_batches):
+            run.write(batch)
+    except BaseException as error:
+        pipeline.stop(error)
+    for thread in threads:
+        thread.join()
+    if pipeline.error is not None:
+        run.abort()
+        raise pipeline.error
+    return run.finish()
+
+
+async def ingest_pdfs_async(
+    client,
+    pdf_paths: list,
+    chunks_path,
+    embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+    workers: int | None = None,
+    concurrency: int | None = None,
+    root=None,
+    on_progress=None,
+    dimensions: int | None = None,
+    dtype: str | None = None,
+    dedupe_threshold: float | None = None,
+    on_duplicate=None,
+) -> IngestionSummary:
+    """
+    Like ingest_pdfs, with an AsyncOpenAI client that keeps up to `concurrency` embedding requests in flight
+    (EMBEDDING_CONCURRENCY by default) instead of one. The batches are written in order as soon as every batch
+    before them is embedded, and at most QUEUE_SIZE embedded batches wait for a slower one.
+    """
+    run = IngestionRun(
+        pdf_paths, chunks_path, embedding_model, root, on_progress, dimensions, dtype, dedupe_threshold, on_duplicate
+    )
+    concurrency = concurrency or get_concurrency()
+    semaphore = asyncio.Semaphore(concurrency)
+    pipeline = Pipeline()
+    split_files = queue.Queue(maxsize=QUEUE_SIZE)
+    in_flight = collections.deque()
+
+    async def embed(batch: list[tuple]) -> list[tuple]:
+        if new_chunks := run.missing(batch):
+            texts = [chunk["text"] for chunk in new_chunks]
+            embeddings = await get_embeddings_async(
+                client, texts, model=embedding_model, dimensions=run.dimensions, usage=run.usage, semaphore=semaphore
+            )
+            for chunk, embedding in zip(new_chunks, embeddings):
+                chunk["embedding"] = embedding
+        return batch
+
+    async def submit(batch: list[tuple]) -> None:
+        in_flight.append(asyncio.create_task(embed(batch)))
+        # Write the batches that are done in order, and wait for the oldest one when too many are queued behind it
+        while in_flight and (in_flight[0].done() or len(in_flight) > concurrency + QUEUE_SIZE):
+            run.write(await in_flight.popleft())
+
+    # The PDFs are extracted and split in a thread, and its queue is read from another one so the requests keep going
+    thread = pipeline.start_stage("extract", lambda: run.extract_stage(pipeline, split_files, workers), split_files)
+    try:
+        batch_size = get_batch_size()
+        batch = []
+        while (item := await asyncio.to_thread(pipeline.get, split_files)) is not Pipeline.DONE:
+            batch.extend(run.prepare(*item))
+            if len(batch) >= batch_size:
+                await submit(batch)
+                batch = []
+        if batch:
+            await submit(batch)
+        while in_flight:
+            run.write(await in_flight.popleft())
+    except BaseException as error:
+        pipeline.stop(error)
+        for task in in_flight:
+            task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
+    thread.join()
+    if pipeline.error is not None:
+        run.abort()
+        raise pipeline.error
+    return run.finish()
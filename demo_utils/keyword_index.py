@@ -0,0 +1,46 @@
+"""
+Keyword search index of the chunks or CSV rows (lunr), saved next to the file they were read from.
+
+Building a lunr index stems every token of every document, which the query scripts used to do at every
+start. The index is saved instead, in lunr's own JSON format (`Index.serialize()`), next to its source
+(rag_ingested_chunks.lunr.json for rag_ingested_chunks.json, hybrid.lunr.json for hybrid.csv), along with
+the SHA-256 of the source, the indexed fields and the lunr version. A script loads it with `Index.load`
+while those match, and builds and saves it again when the source changed. The ingestion scripts build it
+as they finish, and the CSV scripts the first time they load the CSV.
+
+    documents = load_chunks("rag_ingested_chunks.json")
+    index = open_keyword_index("rag_ingested_chunks.json", documents, ref="id", fields=["text"])
+"""
+
+import json
+import pathlib
+
+from demo_utils.chunk_store import file_sha256, write_json
+
+
+def keyword_index_path_for(source_path) -> pathlib.Path:
+    source_path = pathlib.Path(source_path)
+    return source_path.with_name(f"{source_path.stem}.lunr.json")
+
+
+def open_keyword_index(source_path, documents: list[dict], ref: str, fields: list[str]):
+    """
+    Return the lunr index of the documents read from the source file, loaded from the disk if it was built
+    from the same source with the same fields, or built from the documents and saved next to it otherwise.
+    """
+    import lunr
+    from lunr.index import Index
+
+    index_path = keyword_index_path_for(source_path)
+    metadata = {"source_sha256": file_sha256(source_path), "ref": ref, "fields": fields, "lunr": lunr.__VERSION__}
+    try:
+        with open(index_path, encoding="utf-8") as file:
+            saved = json.load(file)
+    except (OSError, ValueError):
+        saved = {}
+    if saved.get("metadata") == metadata:
+        return Index.load(saved["index"])
+
+    index = lunr.lunr(ref=ref, fields=fields, documents=documents)
+    write_json(index_path, {"metadata": metadata, "index": index.serialize()})
+    return index
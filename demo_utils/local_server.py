@@ -0,0 +1,756 @@
+"""
+A local stand-in for an OpenAI-compatible API, so that the demos and benchmarks can run
+offline and reproducibly. It implements /chat/completions (including streaming, tools and
+response_format), /embeddings, /models, and the /files and /batches endpoints of the Batch API,
+with knobs for latency, throughput and rate limits.
+
+Start it with:
+
+    python -m demo_utils.local_server --port 8000 --ttft 0.3 --tokens-per-second 50
+
+Then run any script with API_HOST=local (see .env.sample.local).
+"""
+
+import argparse
+import base64
+import collections
+import dataclasses
+import email.parser
+import email.policy
+import hashlib
+import json
+import math
+import random
+import re
+import struct
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILLER_WORDS = (
+    "the local model says that bees visit flowers in the warm afternoon while cats nap "
+    "near the window and hybrid cars glide quietly down the road toward the city"
+).split()
+
+
+@dataclasses.dataclass
+class LocalServerConfig:
+    # Seconds of delay added to every new connection, approximating a TCP + TLS handshake
+    connect_latency: float = 0.0
+    # Seconds before the first token of a chat completion (and before an embeddings response)
+    ttft: float = 0.0
+    # Completion tokens generated per second after the first one (0 means instantly)
+    tokens_per_second: float = 0.0
+    # Number of completion tokens generated when the request doesn't set max_tokens
+    completion_tokens: int = 40
+    # Probability of answering any request with a 429 error
+    error_rate: float = 0.0
+    # Seconds sent in the retry-after header of injected 429 errors
+    retry_after: float = 1.0
+    # Requests and tokens allowed per minute (0 means unlimited), reported in x-ratelimit-* headers
+    rpm_limit: int = 0
+    tpm_limit: int = 0
+    # Size of the fake embeddings when the request doesn't set dimensions
+    embedding_dimensions: int = 1536
+    # Maximum number of inputs and tokens accepted by a single embeddings request
+    max_embedding_inputs: int = 2048
+    max_embedding_tokens: int = 300_000
+    # Seconds a batch stays in progress before its results are written
+    batch_delay: float = 1.0
+    seed: int = 0
+    verbose: bool = False
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of tokens in a text (about 4 characters per token)."""
+    return max(1, math.ceil(len(text) / 4)) if text else 0
+
+
+def message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def fake_embedding(text: str, dimensions: int) -> list[float]:
+    """
+    Return a deterministic unit-length embedding for the text, using signed feature hashing
+    of its words, so that texts that share words are closer to each other.
+    """
+    vector = [0.0] * dimensions
+    words = re.findall(r"\w+", text.lower()) or [text]
+    for word in words:
+        digest = hashlib.sha256(word.encode()).digest()
+        index = int.from_bytes(digest[:4], "little") % dimensions
+        vector[index] += 1.0 if digest[4] % 2 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def example_from_schema(schema: dict, defs: dict | None = None):
+    """Build a value that is valid for a (Pydantic-generated) JSON schema."""
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return example_from_schema(defs[schema["$ref"].split("/")[-1]], defs)
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "const" in schema:
+        return schema["const"]
+    for key in ("anyOf", "oneOf", "allOf"):
+        if key in schema:
+            options = [option for option in schema[key] if option.get("type") != "null"] or schema[key]
+            return example_from_schema(options[0], defs)
+    schema_type = schema.get("type", "object")
+    if isinstance(schema_type, list):
+        schema_type = next((option for option in schema_type if option != "null"), "null")
+    if schema_type == "object":
+        return {name: example_from_schema(value, defs) for name, value in schema.get("properties", {}).items()}
+    if schema_type == "array":
+        return [example_from_schema(schema.get("items", {}), defs)]
+    if schema_type == "integer":
+        return 1
+    if schema_type == "number":
+        return 1.0
+    if schema_type == "boolean":
+        return True
+    if schema_type == "null":
+        return None
+    return {"date": "2025-01-01", "date-time": "2025-01-01T00:00:00Z", "email": "someone@example.com"}.get(
+        schema.get("format"), "example"
+    )
+
+
+class InvalidRequestError(Exception):
+    """A request that the API would reject with a 400 error."""
+
+    def __init__(self, message: str, code: str | None = None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+def build_message(body: dict, max_tokens: int) -> dict:
+    """Return the assistant message for a chat completion request: tool calls, schema-valid JSON, or filler text."""
+    messages = body.get("messages", [])
+    tools = body.get("tools") or []
+    tool_choice = body.get("tool_choice", "auto")
+    last_role = messages[-1].get("role") if messages else "user"
+    if tools and tool_choice != "none" and last_role != "tool":
+        if isinstance(tool_choice, dict):
+            name = tool_choice["function"]["name"]
+            tool = next(tool for tool in tools if tool["function"]["name"] == name)
+        else:
+            tool = tools[0]
+        function = tool["function"]
+        arguments = example_from_schema(function.get("parameters", {}))
+        tool_call = {
+            "id": f"call_{uuid.uuid4().hex[:24]}",
+            "type": "function",
+            "function": {"name": function["name"], "arguments": json.dumps(arguments)},
+        }
+        return {"role": "assistant", "content": None, "tool_calls": [tool_call]}
+
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        content = json.dumps(example_from_schema(response_format["json_schema"].get("schema", {})))
+    elif response_format.get("type") == "json_object":
+        content = json.dumps({"response": "example"})
+    else:
+        prompt = message_text(messages[-1]) if messages else ""
+        rng = random.Random(hashlib.sha256(prompt.encode()).digest())
+        words = [rng.choice(FILLER_WORDS) for _ in range(max(1, int(max_tokens * 0.75)))]
+        content = " ".join(words).capitalize() + "."
+    return {"role": "assistant", "content": content, "refusal": None}
+
+
+def chat_prompt_tokens(body: dict) -> int:
+    return sum(estimate_tokens(message_text(message)) for message in body.get("messages", []))
+
+
+def chat_max_tokens(body: dict, config: LocalServerConfig) -> int:
+    return body.get("max_completion_tokens") or body.get("max_tokens") or config.completion_tokens
+
+
+def build_chat_completion(body: dict, config: LocalServerConfig) -> dict:
+    """Return the (non-streamed) chat completion object that answers a request."""
+    prompt_tokens = chat_prompt_tokens(body)
+    message = build_message(body, chat_max_tokens(body, config))
+    completion_tokens = estimate_tokens(message.get("content") or "") + sum(
+        estimate_tokens(call["function"]["arguments"]) for call in message.get("tool_calls", [])
+    )
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "local-model"),
+        "system_fingerprint": "local",
+        "choices": [
+            {
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+                "logprobs": None,
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def embedding_texts(body: dict) -> list[str]:
+    inputs = body.get("input", [])
+    if not isinstance(inputs, list) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    return [text if isinstance(text, str) else " ".join(map(str, text)) for text in inputs]
+
+
+def build_embeddings(body: dict, config: LocalServerConfig) -> dict:
+    """Return the embeddings response for a request, or raise InvalidRequestError if it's over the limits."""
+    texts = embedding_texts(body)
+    tokens = sum(estimate_tokens(text) for text in texts)
+    if len(texts) > config.max_embedding_inputs:
+        raise InvalidRequestError(f"'$.input' is invalid, it can contain at most {config.max_embedding_inputs} inputs.")
+    if tokens > config.max_embedding_tokens:
+        raise InvalidRequestError(
+            f"Requested {tokens} tokens, max {config.max_embedding_tokens} tokens per request", "max_tokens_per_request"
+        )
+    dimensions = body.get("dimensions") or config.embedding_dimensions
+    data = []
+    for index, text in enumerate(texts):
+        embedding = fake_embedding(text, dimensions)
+        if body.get("encoding_format") == "base64":
+            embedding = base64.b64encode(struct.pack(f"<{dimensions}f", *embedding)).decode()
+        data.append({"object": "embedding", "index": index, "embedding": embedding})
+    return {
+        "object": "list",
+        "data": data,
+        "model": body.get("model", "text-embedding-3-small"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+class RateLimitWindow:
+    """Tracks the requests and tokens used in the last minute."""
+
+    def __init__(self, rpm_limit: int, tpm_limit: int):
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.events = collections.deque()
+        self.lock = threading.Lock()
+
+    def try_acquire(self, tokens: int) -> tuple[float, dict]:
+        """Record a request and return (seconds to wait before retrying or 0 if allowed, headers)."""
+        with self.lock:
+            now = time.monotonic()
+            while self.events and now - self.events[0][0] >= 60:
+                self.events.popleft()
+            used_requests = len(self.events)
+            used_tokens = sum(event_tokens for _, event_tokens in self.events)
+            over_requests = self.rpm_limit and used_requests + 1 > self.rpm_limit
+            over_tokens = self.tpm_limit and used_tokens + tokens > self.tpm_limit
+            wait = 0.0
+            if over_requests or over_tokens:
+                wait = max(60 - (now - self.events[0][0]), 0.001) if self.events else 1.0
+            else:
+                self.events.append((now, tokens))
+                used_requests += 1
+                used_tokens += tokens
+            reset = f"{60 - (now - self.events[0][0]):.3f}s" if self.events else "0s"
+            headers = {}
+            if self.rpm_limit:
+                headers["x-ratelimit-limit-requests"] = str(self.rpm_limit)
+                headers["x-ratelimit-remaining-requests"] = str(max(0, self.rpm_limit - used_requests))
+                headers["x-ratelimit-reset-requests"] = reset
+            if self.tpm_limit:
+                headers["x-ratelimit-limit-tokens"] = str(self.tpm_limit)
+                headers["x-ratelimit-remaining-tokens"] = str(max(0, self.tpm_limit - used_tokens))
+                headers["x-ratelimit-reset-tokens"] = reset
+            return wait, headers
+
+
+class BatchStore:
+    """In-memory files and batch jobs for the Batch API, with each batch processed in a background thread."""
+
+    TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+    def __init__(self, config: LocalServerConfig):
+        self.config = config
+        self.files = {}
+        self.contents = {}
+        self.batches = {}
+        self.lock = threading.Lock()
+
+    def add_file(self, content: bytes, filename: str, purpose: str) -> dict:
+        file = {
+            "id": f"file-{uuid.uuid4().hex}",
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+        with self.lock:
+            self.files[file["id"]] = file
+            self.contents[file["id"]] = content
+        return file
+
+    def create_batch(self, input_file_id: str, endpoint: str, completion_window: str, metadata=None) -> dict:
+        now = int(time.time())
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex}",
+            "object": "batch",
+            "endpoint": endpoint,
+            "errors": None,
+            "input_file_id": input_file_id,
+            "completion_window": completion_window,
+            "status": "validating",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": now,
+            "in_progress_at": None,
+            "expires_at": now + 24 * 3600,
+            "finalizing_at": None,
+            "completed_at": None,
+            "failed_at": None,
+            "expired_at": None,
+            "cancelling_at": None,
+            "cancelled_at": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": metadata,
+        }
+        with self.lock:
+            self.batches[batch["id"]] = batch
+        threading.Thread(target=self.run_batch, args=(batch["id"],), daemon=True).start()
+        return dict(batch)
+
+    def get_batch(self, batch_id: str) -> dict | None:
+        with self.lock:
+            batch = self.batches.get(batch_id)
+            return json.loads(json.dumps(batch)) if batch else None
+
+    def cancel_batch(self, batch_id: str) -> dict | None:
+        with self.lock:
+            batch = self.batches.get(batch_id)
+            if batch and batch["status"] not in self.TERMINAL_STATUSES:
+                batch.update(status="cancelling", cancelling_at=int(time.time()))
+        return self.get_batch(batch_id)
+
+    def _update(self, batch_id: str, **fields) -> dict:
+        with self.lock:
+            batch = self.batches[batch_id]
+            batch.update(fields)
+            return batch
+
+    def validate_lines(self, content: bytes, endpoint: str) -> tuple[list, list]:
+        """Return (the parsed request lines, the validation errors), like the checks done before a batch starts."""
+        requests, errors = [], []
+        custom_ids = set()
+        for line_number, line in enumerate(content.decode("utf-8", errors="replace").splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                errors.append(
+                    {"code": "invalid_json_line", "message": "This line is not valid JSON.", "line": line_number}
+                )
+                continue
+            custom_id = request.get("custom_id")
+            if not custom_id or custom_id in custom_ids:
+                message = "Each request needs a custom_id that is unique within the batch."
+                errors.append({"code": "duplicate_custom_id", "message": message, "line": line_number})
+            elif request.get("url", "").split("?")[0].rstrip("/") != endpoint.rstrip("/"):
+                message = f"The url {request.get('url')!r} doesn't match the endpoint {endpoint!r} of the batch."
+                errors.append({"code": "mismatched_endpoint", "message": message, "line": line_number})
+            custom_ids.add(custom_id)
+            requests.append(request)
+        if not requests and not errors:
+            errors.append(
+                {"code": "empty_file", "message": "The input file doesn't contain any requests.", "line": None}
+            )
+        return requests, errors
+
+    def answer(self, request: dict) -> tuple[int, dict]:
+        body = request.get("body") or {}
+        try:
+            if request["url"].rstrip("/").endswith("/chat/completions"):
+                return 200, build_chat_completion(body, self.config)
+            if request["url"].rstrip("/").endswith("/embeddings"):
+                return 200, build_embeddings(body, self.config)
+            raise InvalidRequestError(f"The url {request['url']!r} is not supported in a batch.")
+        except InvalidRequestError as error:
+            return 400, {"error": {"message": error.message, "type": "invalid_request_error", "code": error.code}}
+
+    def run_batch(self, batch_id: str) -> None:
+        batch = self.get_batch(batch_id)
+        with self.lock:
+            content = self.contents.get(batch["input_file_id"])
+        if content is None:
+            errors = [{"code": "invalid_file", "message": f"No file with id {batch['input_file_id']}.", "line": None}]
+            self._update(
+                batch_id, status="failed", failed_at=int(time.time()), errors={"object": "list", "data": errors}
+            )
+            return
+        requests, errors = self.validate_lines(content, batch["endpoint"])
+        if errors:
+            self._update(
+                batch_id, status="failed", failed_at=int(time.time()), errors={"object": "list", "data": errors}
+            )
+            return
+        counts = {"total": len(requests), "completed": 0, "failed": 0}
+        with self.lock:
+            batch = self.batches[batch_id]
+            if batch["status"] == "cancelling":
+                batch.update(status="cancelled", cancelled_at=int(time.time()), request_counts=counts)
+                return
+            batch.update(status="in_progress", in_progress_at=int(time.time()), request_counts=dict(counts))
+        # Batches are processed whenever there is spare capacity, which we pretend takes batch_delay seconds
+        time.sleep(self.config.batch_delay)
+
+        outputs, failures = [], []
+        for request in requests:
+            if self.get_batch(batch_id)["status"] == "cancelling":
+                break
+            status_code, body = self.answer(request)
+            result = {
+                "id": f"batch_req_{uuid.uuid4().hex}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": status_code, "request_id": uuid.uuid4().hex, "body": body},
+                "error": None,
+            }
+            (outputs if status_code == 200 else failures).append(result)
+            counts["completed" if status_code == 200 else "failed"] += 1
+            self._update(batch_id, request_counts=dict(counts))
+
+        cancelled = self.get_batch(batch_id)["status"] == "cancelling"
+        if not cancelled:
+            self._update(batch_id, status="finalizing", finalizing_at=int(time.time()))
+        # Like the real API, the results of the requests that ran before a cancellation are kept
+        fields = {}
+        if outputs:
+            output = "".join(json.dumps(result) + "\n" for result in outputs).encode()
+            fields["output_file_id"] = self.add_file(output, "batch_output.jsonl", "batch_output")["id"]
+        if failures:
+            error_output = "".join(json.dumps(result) + "\n" for result in failures).encode()
+            fields["error_file_id"] = self.add_file(error_output, "batch_errors.jsonl", "batch_output")["id"]
+        if cancelled:
+            self._update(batch_id, status="cancelled", cancelled_at=int(time.time()), **fields)
+        else:
+            self._update(batch_id, status="completed", completed_at=int(time.time()), **fields)
+
+
+class LocalOpenAIHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so that clients can keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    @property
+    def config(self) -> LocalServerConfig:
+        return self.server.config
+
+    def setup(self):
+        super().setup()
+        # Simulates the extra round-trips (TCP + TLS handshake) paid by every new connection
+        if self.config.connect_latency:
+            time.sleep(self.config.connect_latency)
+
+    def log_message(self, format, *args):
+        if self.config.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_error_json(self, status, message, error_type, headers=None, code=None):
+        self.send_json(status, {"error": {"message": message, "type": error_type, "code": code}}, headers)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def check_rate_limits(self, tokens: int) -> dict | None:
+        """Return the x-ratelimit headers for the response, or None if a 429 error was sent."""
+        wait, headers = self.server.rate_limits.try_acquire(tokens)
+        if not wait and self.server.random() < self.config.error_rate:
+            wait = self.config.retry_after
+        if wait:
+            headers["retry-after"] = str(math.ceil(wait))
+            headers["retry-after-ms"] = str(int(wait * 1000))
+            self.send_error_json(429, "Rate limit reached, please retry later.", "rate_limit_exceeded", headers)
+            return None
+        return headers
+
+    @property
+    def url_path(self) -> str:
+        return urllib.parse.urlsplit(self.path).path.rstrip("/")
+
+    def do_GET(self):
+        path = self.url_path
+        if path.endswith("/models"):
+            self.send_json(
+                200, {"object": "list", "data": [{"id": "local-model", "object": "model", "owned_by": "local"}]}
+            )
+        elif match := re.search(r"/files/([\w-]+)(/content)?$", path):
+            self.handle_get_file(match[1], with_content=bool(match[2]))
+        elif match := re.search(r"/batches/([\w-]+)$", path):
+            self.send_batch(self.server.batch_store.get_batch(match[1]), match[1])
+        else:
+            self.send_error_json(404, f"Unknown path {self.path}", "not_found")
+
+    def do_POST(self):
+        path = self.url_path
+        if path.endswith("/files"):
+            self.handle_upload_file()
+            return
+        body = self.read_json()
+        if path.endswith("/chat/completions"):
+            self.handle_chat_completion(body)
+        elif path.endswith("/embeddings"):
+            self.handle_embeddings(body)
+        elif path.endswith("/batches"):
+            self.handle_create_batch(body)
+        elif match := re.search(r"/batches/([\w-]+)/cancel$", path):
+            self.send_batch(self.server.batch_store.cancel_batch(match[1]), match[1])
+        else:
+            self.send_error_json(404, f"Unknown path {self.path}", "not_found")
+
+    def handle_upload_file(self):
+        length = int(self.headers.get("Content-Length", 0))
+        # Parse the multipart/form-data body as a MIME message, the standard library has no form parser
+        header = f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode()
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(header + self.rfile.read(length))
+        fields, upload = {}, None
+        for part in message.iter_parts() if message.is_multipart() else []:
+            if part.get_filename() is not None:
+                upload = (part.get_filename(), part.get_payload(decode=True))
+            else:
+                fields[part.get_param("name", header="content-disposition")] = part.get_payload(decode=True).decode()
+        if upload is None or not fields.get("purpose"):
+            self.send_error_json(400, "The request needs a file and a purpose.", "invalid_request_error")
+            return
+        filename, content = upload
+        self.send_json(200, self.server.batch_store.add_file(content, filename, fields["purpose"]))
+
+    def handle_get_file(self, file_id, with_content):
+        store = self.server.batch_store
+        with store.lock:
+            file, content = store.files.get(file_id), store.contents.get(file_id)
+        if file is None:
+            self.send_error_json(404, f"No such File object: {file_id}", "invalid_request_error")
+        elif not with_content:
+            self.send_json(200, file)
+        else:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+    def handle_create_batch(self, body):
+        store = self.server.batch_store
+        endpoint = body.get("endpoint", "")
+        if not endpoint.rstrip("/").endswith(("/chat/completions", "/embeddings")):
+            self.send_error_json(400, f"The endpoint {endpoint!r} is not supported.", "invalid_request_error")
+            return
+        with store.lock:
+            known_file = body.get("input_file_id") in store.files
+        if not known_file:
+            self.send_error_json(400, f"No file with id {body.get('input_file_id')!r}.", "invalid_request_error")
+            return
+        batch = store.create_batch(
+            body["input_file_id"], endpoint, body.get("completion_window", "24h"), body.get("metadata")
+        )
+        self.send_json(200, batch)
+
+    def send_batch(self, batch, batch_id):
+        if batch is None:
+            self.send_error_json(404, f"No batch found with id '{batch_id}'.", "invalid_request_error")
+        else:
+            self.send_json(200, batch)
+
+    def handle_chat_completion(self, body):
+        headers = self.check_rate_limits(chat_prompt_tokens(body) + chat_max_tokens(body, self.config))
+        if headers is None:
+            return
+
+        completion = build_chat_completion(body, self.config)
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            self.stream_chat_completion(completion, include_usage, headers)
+            return
+
+        time.sleep(self.config.ttft + self.generation_time(completion["usage"]["completion_tokens"]))
+        self.send_json(200, completion, headers)
+
+    def generation_time(self, tokens):
+        return tokens / self.config.tokens_per_second if self.config.tokens_per_second else 0.0
+
+    def write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+
+    def write_event(self, completion, choices, usage=None):
+        chunk = {**completion, "object": "chat.completion.chunk", "choices": choices}
+        if usage is not None:
+            chunk["usage"] = usage
+        self.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+
+    def stream_chat_completion(self, completion, include_usage, headers):
+        choice = completion["choices"][0]
+        message, finish_reason = choice["message"], choice["finish_reason"]
+        chunk_fields = {name: completion[name] for name in ("id", "created", "model", "system_fingerprint")}
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            time.sleep(self.config.ttft)
+            self.write_event(chunk_fields, [{"index": 0, "delta": {"role": "assistant", "content": ""}}])
+            if message.get("tool_calls"):
+                tool_calls = [{"index": i, **call} for i, call in enumerate(message["tool_calls"])]
+                self.write_event(chunk_fields, [{"index": 0, "delta": {"tool_calls": tool_calls}}])
+            else:
+                # Send the content in pieces of about one token each, paced by tokens_per_second
+                pieces = re.findall(r"\S+\s*", message["content"])
+                for piece in pieces:
+                    self.write_event(chunk_fields, [{"index": 0, "delta": {"content": piece}}])
+                    time.sleep(self.generation_time(1))
+            self.write_event(chunk_fields, [{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+            if include_usage:
+                self.write_event(chunk_fields, [], completion["usage"])
+            self.write_chunk(b"data: [DONE]\n\n")
+            self.write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading the stream, which is fine
+            self.close_connection = True
+
+    def handle_embeddings(self, body):
+        try:
+            # Validate the request before it counts against the rate limits
+            response = build_embeddings(body, self.config)
+        except InvalidRequestError as error:
+            self.send_error_json(400, error.message, "invalid_request_error", code=error.code)
+            return
+        headers = self.check_rate_limits(response["usage"]["prompt_tokens"])
+        if headers is None:
+            return
+        time.sleep(self.config.ttft)
+        self.send_json(200, response, headers)
+
+
+class LocalOpenAIServer(ThreadingHTTPServer):
+    """
+    OpenAI-compatible HTTP server that can run in a background thread:
+
+        with LocalOpenAIServer(port=0, ttft=0.2) as server:
+            client = openai.OpenAI(base_url=server.base_url, api_key="nokeyneeded")
+
+    Keyword arguments are the fields of LocalServerConfig.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=8000, **settings):
+        super().__init__((host, port), LocalOpenAIHandler)
+        self.config = LocalServerConfig(**settings)
+        self.rate_limits = RateLimitWindow(self.config.rpm_limit, self.config.tpm_limit)
+        self.batch_store = BatchStore(self.config)
+        self._random = random.Random(self.config.seed)
+        self._random_lock = threading.Lock()
+        self._thread = None
+
+    def handle_error(self, request, client_address):
+        # Clients closing their idle keep-alive connections is expected, anything else is logged
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def random(self) -> float:
+        with self._random_lock:
+            return self._random.random()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    defaults = LocalServerConfig()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--connect-latency",
+        type=float,
+        default=defaults.connect_latency,
+        help="Seconds of delay added to every new connection",
+    )
+    parser.add_argument("--ttft", type=float, default=defaults.ttft, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second, help="0 means instantly")
+    parser.add_argument(
+        "--completion-tokens",
+        type=int,
+        default=defaults.completion_tokens,
+        help="Tokens generated when the request doesn't set max_tokens",
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=defaults.error_rate, help="Probability of a 429 error per request"
+    )
+    parser.add_argument(
+        "--retry-after", type=float, default=defaults.retry_after, help="Seconds to wait after an injected 429"
+    )
+    parser.add_argument("--rpm-limit", type=int, default=defaults.rpm_limit, help="Requests per minute, 0 is unlimited")
+    parser.add_argument("--tpm-limit", type=int, default=defaults.tpm_limit, help="Tokens per minute, 0 is unlimited")
+    parser.add_argument("--embedding-dimensions", type=int, default=defaults.embedding_dimensions)
+    parser.add_argument("--max-embedding-inputs", type=int, default=defaults.max_embedding_inputs)
+    parser.add_argument("--max-embedding-tokens", type=int, default=defaults.max_embedding_tokens)
+    parser.add_argument(
+        "--batch-delay", type=float, default=defaults.batch_delay, help="Seconds a batch stays in progress"
+    )
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="Seed for the injected errors")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = vars(parser.parse_args())
+
+    server = LocalOpenAIServer(args.pop("host"), args.pop("port"), **args)
+    print(f"Serving an OpenAI-compatible API on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Per-request metrics for every OpenAI API call made through demo_utils.clients.
+
+When the DEMO_METRICS_FILE environment variable is set, the shared connection pool records
+one JSON line per request in that file, with its latency, time to first token (for streamed
+responses) and token usage. The benchmark harness in benchmarks/run_scripts.py uses this.
+"""
+
+import json
+import threading
+import time
+
+import httpx
+
+from demo_utils.transports import ResponseStats, TransportWrapper, observe_response, request_json
+
+
+class MetricsTransport(TransportWrapper):
+    """Transport that appends a JSON line with metrics for every request to a file."""
+
+    def __init__(self, transport, path):
+        super().__init__(transport)
+        self.path = path
+        self.lock = threading.Lock()
+
+    def write_record(self, record: dict) -> None:
+        with self.lock, open(self.path, "a") as file:
+            file.write(json.dumps(record) + "\n")
+
+    def _observe(self, request: httpx.Request, response: httpx.Response, stats: ResponseStats, body: dict):
+        stats.set_content_encoding(response.headers.get("content-encoding"))
+
+        def on_close():
+            stats.finish()
+            self.write_record(
+                {
+                    "type": "request",
+                    "path": request.url.path,
+                    "model": body.get("model"),
+                    "status": response.status_code,
+                    "stream": stats.is_stream,
+                    "latency_s": stats.latency,
+                    "ttft_s": stats.ttft,
+                    "prompt_tokens": stats.prompt_tokens,
+                    "completion_tokens": stats.completion_tokens,
+                }
+            )
+
+        return observe_response(response, stats.feed, on_close)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = request_json(request)
+        stats = ResponseStats(time.perf_counter(), bool(body.get("stream")))
+        response = self.transport.handle_request(request)
+        return self._observe(request, response, stats, body)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = request_json(request)
+        stats = ResponseStats(time.perf_counter(), bool(body.get("stream")))
+        response = await self.transport.handle_async_request(request)
+        return self._observe(request, response, stats, body)
@@ -0,0 +1,153 @@
+"""
+Find near-duplicate chunks with MinHash signatures and locality-sensitive hashing (LSH), so the ingestion
+can drop them before they're embedded.
+
+Two chunks are near-duplicates when the Jaccard similarity of their sets of word 5-grams (their "shingles")
+reaches the threshold, INGESTION_DEDUPE_THRESHOLD (default 0.8, 0 to keep every chunk). Comparing every
+chunk with every other one would be quadratic, so each chunk gets a MinHash signature instead: for many
+random hash functions, the smallest hash of its shingles. Two signatures agree on a hash function with a
+probability equal to the Jaccard similarity of the chunks. The signatures are cut into bands, and only the
+chunks that share a whole band with the new one are compared with it, which finds the pairs above the
+threshold with a high probability, in constant time per chunk.
+
+To see the near-duplicates of a chunks file at a given threshold:
+
+    python -m demo_utils.near_duplicates rag_ingested_chunks.json --threshold 0.7
+"""
+
+import argparse
+import dataclasses
+import hashlib
+import os
+import re
+
+from demo_utils.chunk_store import load_chunks
+
+NUM_PERM = 128
+SHINGLE_SIZE = 5
+# The hash functions are (a * x + b) mod a Mersenne prime, cut to 32 bits
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+def get_dedupe_threshold() -> float:
+    return float(os.getenv("INGESTION_DEDUPE_THRESHOLD", "0.8"))
+
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE):
+    """Return the 32-bit hashes of the word n-grams of the text, in lowercase and without punctuation."""
+    import numpy as np
+
+    words = re.findall(r"\w+", text.lower())
+    shingles = {" ".join(words[start : start + size]) for start in range(max(1, len(words) - size + 1))}
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=4).digest(), "little") for shingle in shingles],
+        dtype=np.uint64,
+    )
+
+
+def lsh_bands(threshold: float, num_perm: int) -> tuple[int, int]:
+    """
+    Return the number of bands and of rows per band that give the least false positives below the threshold
+    plus false negatives above it, where a pair of chunks is a candidate when all the rows of a band agree.
+    """
+    import numpy as np
+
+    similarities = np.linspace(0, 1, 1001)
+    below = similarities < threshold
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        probabilities = 1 - (1 - similarities**rows) ** bands
+        error = probabilities[below].sum() + (1 - probabilities[~below]).sum()
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+@dataclasses.dataclass
+class NearDuplicate:
+    chunk_id: str
+    # The chunk that was kept, and the estimated Jaccard similarity of the two
+    duplicate_of: str
+    similarity: float
+
+
+class NearDuplicateIndex:
+    """
+    The MinHash signatures of the chunks kept so far, bucketed by band. `check` tells whether a new chunk is a
+    near-duplicate of one of them, and adds it to the index if it's not:
+
+        index = NearDuplicateIndex(threshold=0.8)
+        kept = [chunk for chunk in chunks if index.check(chunk["id"], chunk["text"]) is None]
+    """
+
+    def __init__(self, threshold: float, num_perm: int = NUM_PERM, seed: int = 1):
+        import numpy as np
+
+        self.threshold = threshold
+        self.bands, self.rows = lsh_bands(threshold, num_perm)
+        # The coefficients are below 2**32, like the shingle hashes, so a * x + b can't overflow 64 bits
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self.buckets = [{} for _ in range(self.bands)]
+        self.ids = []
+        self.signatures = []
+
+    def signature(self, text: str):
+        """Return the smallest hash of the shingles of the text for each hash function."""
+        import numpy as np
+
+        hashes = (self.a * shingle_hashes(text) + self.b) % np.uint64(MERSENNE_PRIME) & np.uint64(MAX_HASH)
+        return hashes.min(axis=1).astype(np.uint32)
+
+    def band_keys(self, signature) -> list[bytes]:
+        return [signature[band * self.rows : (band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def find(self, signature) -> tuple[int, float] | None:
+        """Return the index and similarity of the most similar chunk above the threshold, the first one on ties."""
+        candidates = set()
+        for buckets, key in zip(self.buckets, self.band_keys(signature)):
+            candidates.update(buckets.get(key, ()))
+        best = None
+        for candidate in sorted(candidates):
+            # The candidates share a band by chance too, so their estimated similarity is checked
+            similarity = float((self.signatures[candidate] == signature).mean())
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (candidate, similarity)
+        return best
+
+    def add(self, chunk_id: str, text: str, signature=None) -> None:
+        if signature is None:
+            signature = self.signature(text)
+        for buckets, key in zip(self.buckets, self.band_keys(signature)):
+            buckets.setdefault(key, []).append(len(self.ids))
+        self.ids.append(chunk_id)
+        self.signatures.append(signature)
+
+    def check(self, chunk_id: str, text: str) -> NearDuplicate | None:
+        """Return the NearDuplicate if the chunk is too similar to a chunk in the index, otherwise add it."""
+        signature = self.signature(text)
+        if (match := self.find(signature)) is not None:
+            return NearDuplicate(chunk_id, duplicate_of=self.ids[match[0]], similarity=match[1])
+        self.add(chunk_id, text, signature)
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the near-duplicate chunks of a chunks file.")
+    parser.add_argument("chunks_path", help="Chunks file written by the ingestion scripts")
+    parser.add_argument("--threshold", type=float, default=get_dedupe_threshold(), help="Least Jaccard similarity")
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.chunks_path)
+    index = NearDuplicateIndex(args.threshold)
+    duplicates = [duplicate for chunk in chunks if (duplicate := index.check(chunk["id"], chunk["text"]))]
+    for duplicate in duplicates:
+        print(f"{duplicate.chunk_id} is a near-duplicate of {duplicate.duplicate_of} ({duplicate.similarity:.2f})")
+    print(f"{len(duplicates)} of {len(chunks)} chunks are near-duplicates at a threshold of {args.threshold}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Extract the text of PDFs and split it into chunks, in parallel across a pool of worker processes.
+
+Converting a PDF to markdown is CPU-bound, so the PDFs are processed by INGESTION_WORKERS processes
+(default: one per CPU). Large PDFs can also be cut into tasks of
+INGESTION_PAGES_PER_TASK pages (default 0, whole PDFs), but the heading levels that pymupdf4llm
+detects depend on the pages it sees, so the markdown may differ slightly from a whole-PDF conversion.
+Either way, `iter_extract_and_split` yields the results in the order of the input files, so the output is
+deterministic, one PDF at a time as they're ready, with only a few PDFs in flight.
+PDF_EXTRACTOR selects how the text is extracted: "markdown" (default) converts the pages to markdown with
+pymupdf4llm, "text" takes the raw text of PyMuPDF with light cleanup, which is much faster but loses the
+headings and tables (see benchmarks/pdf_text.py to compare them on a corpus).
+
+The worker processes import the main script, so a script that uses this module must only start
+the pipeline under `if __name__ == "__main__":`.
+"""
+
+import collections
+import concurrent.futures
+import contextlib
+import functools
+import os
+
+from demo_utils.chunking import TokenChunker, get_encoding
+
+# Tiktoken encoding used to measure the chunk sizes, and the size and overlap of the chunks in tokens
+SPLITTER_MODEL = "gpt-4o"
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 125
+
+
+def extract_markdown(pdf_path, pages: list[int] | None = None) -> str:
+    """
+    Convert a PDF file (or only some of its 0-based pages) to markdown text.
+    pymupdf4llm is imported here since it is slow to load and only needed once there is a file to process.
+    """
+    import pymupdf4llm
+
+    return pymupdf4llm.to_markdown(str(pdf_path), pages=pages)
+
+
+def extract_plain_text(pdf_path, pages: list[int] | None = None) -> str:
+    """
+    Return the raw text of a PDF file (or only some of its 0-based pages), without the layout and table
+    analysis of pymupdf4llm: one paragraph per text block, with its lines joined and hyphenated words mended.
+    """
+    import pymupdf
+
+    # Ligatures are expanded to plain letters, so that "ﬁ" matches "fi" in searches
+    flags = (pymupdf.TEXTFLAGS_BLOCKS & ~pymupdf.TEXT_PRESERVE_LIGATURES) | pymupdf.TEXT_DEHYPHENATE
+    paragraphs = []
+    with pymupdf.open(pdf_path) as document:
+        for page_number in range(document.page_count) if pages is None else pages:
+            for block in document[page_number].get_text("blocks", flags=flags):
+                # Blocks are (x0, y0, x1, y1, text, block number, block type), type 1 is an image
+                if block[6] == 0 and (text := " ".join(block[4].split())):
+                    paragraphs.append(text)
+    # Every part ends with a blank line, so the page ranges of a file can be joined back together
+    return "".join(f"{paragraph}\n\n" for paragraph in paragraphs)
+
+
+EXTRACTORS = {"markdown": extract_markdown, "text": extract_plain_text}
+
+
+def get_extractor() -> str:
+    extractor = os.getenv("PDF_EXTRACTOR", "markdown")
+    if extractor not in EXTRACTORS:
+        raise ValueError(f"PDF_EXTRACTOR must be one of {', '.join(EXTRACTORS)}, not {extractor!r}")
+    return extractor
+
+
+@functools.cache
+def get_chunker():
+    """Return the chunker of the process, so the tokenizer is loaded once and reused for every PDF."""
+    return TokenChunker(get_encoding(SPLITTER_MODEL), chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+
+def split_text(text: str) -> list[str]:
+    """Split the text into overlapping chunks of about 500 tokens, encoding it only once."""
+    return get_chunker().split_text(text)
+
+
+def get_pages_per_task() -> int:
+    return int(os.getenv("INGESTION_PAGES_PER_TASK", "0"))
+
+
+def splitter_config() -> dict:
+    """Return the settings that determine the chunks of a PDF, to tell when the PDFs must be split again."""
+    return {
+        "extractor": get_extractor(),
+        "chunker": "token_offsets",
+        "model_name": SPLITTER_MODEL,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "pages_per_task": get_pages_per_task(),
+    }
+
+
+def page_count(pdf_path) -> int:
+    import pymupdf
+
+    with pymupdf.open(pdf_path) as document:
+        return document.page_count
+
+
+def page_ranges(pdf_path, pages_per_task: int) -> tuple[int, list[list[int] | None]]:
+    """Return the page count of the PDF and its extraction tasks: ranges of pages, or [None] for the whole file."""
+    pages = page_count(pdf_path)
+    if pages_per_task and pages > pages_per_task:
+        return pages, [
+            list(range(start, min(pages, start + pages_per_task))) for start in range(0, pages, pages_per_task)
+        ]
+    return pages, [None]
+
+
+def get_worker_count() -> int:
+    return int(os.getenv("INGESTION_WORKERS", "0")) or os.cpu_count() or 1
+
+
+def _submit(executor, function, *args) -> concurrent.futures.Future:
+    """Submit the call to the executor, or run it right away if there is none."""
+    if executor is not None:
+        return executor.submit(function, *args)
+    future = concurrent.futures.Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as error:
+        future.set_exception(error)
+    return future
+
+
+@contextlib.contextmanager
+def _worker_pool(workers: int | None, tasks: int):
+    """Yield a process pool for the tasks, or None to run them in this process if there is a single worker."""
+    workers = min(workers or get_worker_count(), tasks)
+    if workers <= 1:
+        # Starting a pool only pays off when there are several workers to keep busy
+        yield None
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        yield executor
+
+
+def extract_texts(
+    pdf_paths: list, workers: int | None = None, pages_per_task: int | None = None, extractor: str | None = None
+) -> list[str]:
+    """
+    Return the text of each PDF (markdown by default, see PDF_EXTRACTOR), in the order of pdf_paths,
+    extracted like iter_extract_and_split does but without splitting it, for the benchmarks.
+    """
+    return [text for _, text in _iter_extract(pdf_paths, workers, pages_per_task, extractor, split=False)]
+
+
+def iter_extract_and_split(
+    pdf_paths: list, workers: int | None = None, pages_per_task: int | None = None, extractor: str | None = None
+):
+    """
+    Yield (path, list of text chunks) for each PDF as soon as it's ready, in the order of pdf_paths.
+    Only about two PDFs per worker are in flight at a time, so the memory stays bounded however many PDFs there are.
+    """
+    return _iter_extract(pdf_paths, workers, pages_per_task, extractor, split=True)
+
+
+def _iter_extract(pdf_paths: list, workers: int | None, pages_per_task: int | None, extractor: str | None, split: bool):
+    if pages_per_task is None:
+        pages_per_task = get_pages_per_task()
+    extract = EXTRACTORS[extractor or get_extractor()]
+    workers = min(workers or get_worker_count(), len(pdf_paths)) or 1
+    # The PDFs being extracted (with a future per page range), then being split, both in file order
+    extracting = collections.deque()
+    splitting = collections.deque()
+
+    def start_splitting(executor) -> None:
+        path, futures = extracting.popleft()
+        text = "".join(future.result() for future in futures)
+        # Without splitting, the text is the result, in a future that is already done
+        splitting.append((path, _submit(executor, split_text, text) if split else _submit(None, str, text)))
+
+    def next_result(executor):
+        # The PDFs whose extraction is done can be split while waiting for the oldest one
+        while extracting and all(future.done() for future in extracting[0][1]):
+            start_splitting(executor)
+        if not splitting:
+            start_splitting(executor)
+        path, future = splitting.popleft()
+        return path, future.result()
+
+    with _worker_pool(workers, len(pdf_paths)) as executor:
+        for pdf_path in pdf_paths:
+            _, ranges = page_ranges(pdf_path, pages_per_task)
+            extracting.append((pdf_path, [_submit(executor, extract, pdf_path, pages) for pages in ranges]))
+            while len(extracting) + len(splitting) > 2 * workers:
+                yield next_result(executor)
+        while extracting or splitting:
+            yield next_result(executor)
@@ -0,0 +1,207 @@
+"""
+Client-side pacing of API requests, to stay just under the requests-per-minute and tokens-per-minute
+limits of a deployment instead of bursting into a storm of 429 errors.
+
+When RATE_LIMIT_ENABLED is "true" (or a limit is set), every request made through the shared
+connection pools of demo_utils.clients goes through a single process-wide RateLimiter, so sync clients,
+async clients and concurrent tasks (like the asyncio.gather in chat_async.py) share the same budget:
+
+* Two token buckets, one for requests and one for tokens, refill at RATE_LIMIT_RPM and RATE_LIMIT_TPM
+  per minute (scaled by RATE_LIMIT_HEADROOM, default 0.95). A request waits until both buckets can pay
+  for it, with the tokens estimated from the prompt and max_tokens, like the service does.
+* Without configured limits, the buckets are sized from the x-ratelimit-limit-* response headers.
+  The x-ratelimit-remaining-* and x-ratelimit-reset-* headers also hold requests back once the
+  service reports that its budget is spent.
+* A 429 response pauses every caller for the retry-after time, then the request is retried
+  (up to RATE_LIMIT_MAX_RETRIES times, default 5) before the error is passed on to the SDK.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import httpx
+
+from demo_utils.transports import TransportWrapper, request_json
+
+# Completion tokens assumed for a chat request that doesn't set max_tokens
+DEFAULT_COMPLETION_TOKENS = 256
+RATE_LIMIT_KINDS = ("requests", "tokens")
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value: str | None) -> float | None:
+    """Parse a duration from a rate limit header, like "1s", "6m0s", "20ms" or "0.5", into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after(response: httpx.Response) -> float | None:
+    """Return the seconds to wait before retrying, from the retry-after-ms or retry-after header."""
+    if (milliseconds := parse_duration(response.headers.get("retry-after-ms"))) is not None:
+        return milliseconds / 1000
+    # retry-after may also be an HTTP date, which we treat like a missing header
+    return parse_duration(response.headers.get("retry-after"))
+
+
+def estimate_tokens(body: dict) -> int:
+    """Estimate the tokens a request counts against the tokens-per-minute limit (about 4 characters per token)."""
+    if "messages" in body:
+        prompt_tokens = len(json.dumps(body["messages"])) // 4
+        completion_tokens = body.get("max_completion_tokens") or body.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+        return prompt_tokens + completion_tokens * body.get("n", 1)
+    if "input" in body:
+        return len(json.dumps(body["input"])) // 4
+    return 0
+
+
+class TokenBucket:
+    """A bucket that holds up to `capacity` units and refills at `per_minute` units per minute."""
+
+    def __init__(self, per_minute: float, capacity: float | None = None):
+        self.rate = per_minute / 60
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take the amount from the bucket and return the seconds to wait until it was actually available."""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        # The level can go negative: later callers then wait behind the ones that reserved before them
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level / self.rate)
+
+
+class RateLimiter:
+    """Paces requests across every thread and event loop of the process, see the module docstring."""
+
+    def __init__(
+        self, requests_per_minute: float | None = None, tokens_per_minute: float | None = None, headroom: float = 0.95
+    ):
+        self.headroom = headroom
+        self.buckets = {}
+        self.configured = set()
+        for kind, limit in zip(RATE_LIMIT_KINDS, (requests_per_minute, tokens_per_minute)):
+            if limit:
+                self.buckets[kind] = TokenBucket(limit * headroom)
+                self.configured.add(kind)
+        # {kind: [remaining, monotonic reset time]} as last reported by the service
+        self.server_budgets = {}
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        """Reserve a request of `tokens` tokens, and return the seconds to wait before sending it."""
+        amounts = {"requests": 1, "tokens": tokens}
+        with self.lock:
+            now = time.monotonic()
+            delay = self.paused_until - now
+            for kind, bucket in self.buckets.items():
+                delay = max(delay, bucket.reserve(amounts[kind], now))
+            for kind, budget in self.server_budgets.items():
+                if now < budget[1]:
+                    budget[0] -= amounts[kind]
+                    if budget[0] < 0:
+                        delay = max(delay, budget[1] - now)
+            return max(0.0, delay)
+
+    def pause_delay(self) -> float:
+        """Return the seconds left in a pause caused by a 429 response."""
+        with self.lock:
+            return max(0.0, self.paused_until - time.monotonic())
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for the given seconds."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers: httpx.Headers) -> None:
+        """Adjust the budgets to the x-ratelimit-* headers of a response."""
+        with self.lock:
+            now = time.monotonic()
+            for kind in RATE_LIMIT_KINDS:
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                if kind not in self.configured and limit and limit.isdigit() and int(limit) > 0:
+                    bucket = self.buckets.get(kind)
+                    if bucket is None or bucket.capacity != int(limit) * self.headroom:
+                        self.buckets[kind] = TokenBucket(int(limit) * self.headroom)
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                if remaining and remaining.isdigit() and reset is not None:
+                    # The service hasn't counted the requests that are still in flight, so this is slightly optimistic
+                    self.server_budgets[kind] = [int(remaining), now + reset]
+
+
+def create_rate_limiter() -> RateLimiter:
+    """Return a rate limiter configured through the environment."""
+    return RateLimiter(
+        requests_per_minute=float(os.getenv("RATE_LIMIT_RPM", "0")),
+        tokens_per_minute=float(os.getenv("RATE_LIMIT_TPM", "0")),
+        headroom=float(os.getenv("RATE_LIMIT_HEADROOM", "0.95")),
+    )
+
+
+def backoff(attempt: int) -> float:
+    """Exponential backoff with jitter, for 429 responses without a retry-after header."""
+    return min(60.0, 2**attempt) * random.uniform(0.5, 1.0)
+
+
+class RateLimitTransport(TransportWrapper):
+    """Transport that paces requests with a RateLimiter and retries the ones rejected with a 429 error."""
+
+    def __init__(self, transport, limiter: RateLimiter, max_retries: int = 5):
+        super().__init__(transport)
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    def _retry_delay(self, response: httpx.Response, attempt: int) -> float | None:
+        """Return the seconds to pause before retrying a 429 response, or None to give up."""
+        if response.status_code != 429 or attempt >= self.max_retries:
+            return None
+        delay = retry_after(response)
+        return backoff(attempt) if delay is None else delay
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        tokens = estimate_tokens(request_json(request))
+        for attempt in itertools.count():
+            time.sleep(self.limiter.reserve(tokens))
+            # A 429 response to another caller may have paused everyone while we were waiting
+            while delay := self.limiter.pause_delay():
+                time.sleep(delay)
+            response = self.transport.handle_request(request)
+            self.limiter.update_from_headers(response.headers)
+            if (delay := self._retry_delay(response, attempt)) is None:
+                return response
+            response.read()
+            response.close()
+            self.limiter.pause(delay)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        tokens = estimate_tokens(request_json(request))
+        for attempt in itertools.count():
+            await asyncio.sleep(self.limiter.reserve(tokens))
+            while delay := self.limiter.pause_delay():
+                await asyncio.sleep(delay)
+            response = await self.transport.handle_async_request(request)
+            self.limiter.update_from_headers(response.headers)
+            if (delay := self._retry_delay(response, attempt)) is None:
+                return response
+            await response.aread()
+            await response.aclose()
+            self.limiter.pause(delay)
@@ -0,0 +1,135 @@
+"""
+A small key-value cache stored in a SQLite file, shared by every script and process that uses it.
+
+Entries expire after `max_age` seconds, and once the cache holds more than `max_entries`
+entries or `max_bytes` bytes of values, the least recently used entries are evicted.
+Hits and misses are counted in the same file, so the counters add up across runs.
+"""
+
+import pathlib
+import sqlite3
+import threading
+import time
+
+# Stands in for a missing limit in SQL comparisons
+UNLIMITED = 2**62
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    metadata TEXT,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class SQLiteCache:
+    """
+    A persistent cache of bytes values, with optional JSON-encoded metadata per entry:
+
+        cache = SQLiteCache("cache.sqlite3", max_entries=1000)
+        cache.set("key", b"value", metadata='{"status": 200}')
+        value, metadata = cache.get("key")
+    """
+
+    def __init__(
+        self,
+        path,
+        max_entries: int | None = 1000,
+        max_bytes: int | None = 50 * 1024 * 1024,
+        max_age: float | None = 7 * 24 * 3600,
+    ):
+        self.path = pathlib.Path(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        # Counters for this process only, the totals for the file are in the counters table
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # The connection is shared by the threads of the process (and the event loop), behind the lock
+        self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.max_age is not None and created_at < time.time() - self.max_age
+
+    def _count(self, name: str) -> None:
+        self.connection.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT (name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key: str) -> tuple[bytes, str | None] | None:
+        """Return the (value, metadata) stored for the key, or None if it's missing or expired."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value, metadata, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self._is_expired(row[2]):
+                self.misses += 1
+                self._count("misses")
+                return None
+            self.connection.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            self._count("hits")
+            return bytes(row[0]), row[1]
+
+    def set(self, key: str, value: bytes, metadata: str | None = None) -> None:
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries (key, value, metadata, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, metadata, len(value), now, now),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        if self.max_age is not None:
+            self.connection.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.max_age,))
+        if self.max_entries is None and self.max_bytes is None:
+            return
+        # Keep the most recently used entries that fit within both limits
+        self.connection.execute(
+            """
+            DELETE FROM entries WHERE key IN (
+                SELECT key FROM (
+                    SELECT key,
+                        ROW_NUMBER() OVER (ORDER BY accessed_at DESC) AS position,
+                        SUM(size) OVER (ORDER BY accessed_at DESC ROWS UNBOUNDED PRECEDING) AS total_size
+                    FROM entries
+                ) WHERE position > ? OR total_size > ?
+            )
+            """,
+            (
+                self.max_entries if self.max_entries is not None else UNLIMITED,
+                self.max_bytes if self.max_bytes is not None else UNLIMITED,
+            ),
+        )
+
+    def clear(self) -> None:
+        """Delete every entry and reset the counters."""
+        with self.lock:
+            self.connection.execute("DELETE FROM entries")
+            self.connection.execute("DELETE FROM counters")
+
+    def stats(self) -> dict:
+        """Return the number and total size of the entries, and the hit/miss counters of the file."""
+        with self.lock:
+            entries, size = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            counters = dict(self.connection.execute("SELECT name, value FROM counters").fetchall())
+        return {"entries": entries, "bytes": size, "hits": counters.get("hits", 0), "misses": counters.get("misses", 0)}
+
+    def close(self) -> None:
+        self.connection.close()
@@ -0,0 +1,261 @@
+"""
+Optional OpenTelemetry tracing of the demo scripts, to find out where the time of a slow answer went.
+
+Tracing is off unless TRACING_EXPORTER is set, and it needs the packages from requirements-tracing.txt.
+Once enabled, the shared connection pools of demo_utils.clients create a span for every API call,
+with the model, token usage, latency and time to first token as attributes, and the scripts can add
+spans for their own stages with the `traced` decorator or the `span` context manager.
+
+TRACING_EXPORTER selects where the spans go:
+
+* console: print every span to stderr
+* file: append the spans to TRACING_FILE (default traces.jsonl) as OTLP JSON lines, viewable offline
+* otlp: send the spans to an OTLP collector (requires opentelemetry-exporter-otlp-proto-http,
+  configured with the standard OTEL_EXPORTER_OTLP_* environment variables)
+* package.module:factory: any other exporter, returned by calling the given function
+"""
+
+import contextlib
+import functools
+import importlib
+import json
+import os
+import pathlib
+import sys
+import threading
+import time
+
+import httpx
+
+from demo_utils.transports import ResponseStats, TransportWrapper, observe_response, request_json
+
+SERVICE_NAME = "python-openai-demos"
+# Operation names from the OpenTelemetry semantic conventions for generative AI, by API path
+OPERATIONS = {"/chat/completions": "chat", "/embeddings": "embeddings"}
+
+
+def is_enabled() -> bool:
+    return bool(os.getenv("TRACING_EXPORTER"))
+
+
+class OTLPFileSpanExporter:
+    """
+    Span exporter that appends each batch of spans to a file as one line of OTLP JSON,
+    the format of the OpenTelemetry collector's file exporter, so it works without any network.
+    """
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _value(value) -> dict:
+        # The order matters, because bool is a subclass of int
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        if isinstance(value, list | tuple):
+            return {"arrayValue": {"values": [OTLPFileSpanExporter._value(item) for item in value]}}
+        return {"stringValue": str(value)}
+
+    @classmethod
+    def _attributes(cls, attributes) -> list:
+        return [{"key": key, "value": cls._value(value)} for key, value in (attributes or {}).items()]
+
+    @classmethod
+    def _span(cls, span) -> dict:
+        context = span.get_span_context()
+        return {
+            "traceId": f"{context.trace_id:032x}",
+            "spanId": f"{context.span_id:016x}",
+            "parentSpanId": f"{span.parent.span_id:016x}" if span.parent else "",
+            "name": span.name,
+            # The OTLP enum values start at 1 for SPAN_KIND_INTERNAL, the Python ones at 0
+            "kind": span.kind.value + 1,
+            "startTimeUnixNano": str(span.start_time),
+            "endTimeUnixNano": str(span.end_time),
+            "attributes": cls._attributes(span.attributes),
+            "events": [
+                {
+                    "timeUnixNano": str(event.timestamp),
+                    "name": event.name,
+                    "attributes": cls._attributes(event.attributes),
+                }
+                for event in span.events
+            ],
+            "status": {"code": span.status.status_code.value, "message": span.status.description or ""},
+        }
+
+    def export(self, spans):
+        from opentelemetry.sdk.trace.export import SpanExportResult
+
+        resource_spans = {}
+        for span in spans:
+            resource = resource_spans.setdefault(
+                id(span.resource), {"resource": {"attributes": self._attributes(span.resource.attributes)}, "spans": {}}
+            )
+            scope = span.instrumentation_scope
+            scope_key = (scope.name, scope.version) if scope else ("", None)
+            resource["spans"].setdefault(scope_key, []).append(self._span(span))
+        traces_data = {
+            "resourceSpans": [
+                {
+                    "resource": resource["resource"],
+                    "scopeSpans": [
+                        {"scope": {"name": name, "version": version or ""}, "spans": scope_spans}
+                        for (name, version), scope_spans in resource["spans"].items()
+                    ],
+                }
+                for resource in resource_spans.values()
+            ]
+        }
+        with self.lock, open(self.path, "a") as file:
+            file.write(json.dumps(traces_data) + "\n")
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def create_exporter(name: str):
+    """Return the span exporter selected by TRACING_EXPORTER, see the module docstring."""
+    if name == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        return ConsoleSpanExporter(out=sys.stderr)
+    elif name == "file":
+        return OTLPFileSpanExporter(os.getenv("TRACING_FILE", "traces.jsonl"))
+    elif name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter()
+    elif ":" in name:
+        module_name, factory_name = name.split(":", 1)
+        return getattr(importlib.import_module(module_name), factory_name)()
+    else:
+        raise ValueError(f"Unknown TRACING_EXPORTER {name!r}, use console, file, otlp or package.module:factory")
+
+
+@functools.cache
+def get_tracer():
+    """Return the tracer of the demo scripts, setting up the exporter the first time, or None if tracing is off."""
+    if not is_enabled():
+        return None
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    script = pathlib.Path(sys.argv[0]).name if sys.argv and sys.argv[0] else "python"
+    provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME, "process.command": script}))
+    # The provider flushes the remaining spans when the process exits
+    provider.add_span_processor(BatchSpanProcessor(create_exporter(os.environ["TRACING_EXPORTER"])))
+    trace.set_tracer_provider(provider)
+    return trace.get_tracer("demo_utils")
+
+
+@contextlib.contextmanager
+def span(name: str, attributes: dict | None = None):
+    """Run the block in a new span (when tracing is enabled), and yield the span or None."""
+    if (tracer := get_tracer()) is None:
+        yield None
+        return
+    with tracer.start_as_current_span(name, attributes=attributes) as current_span:
+        yield current_span
+
+
+def traced(name: str | None = None):
+    """Decorator that runs every call of the function in a span named after it."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name or function.__name__):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class TracingTransport(TransportWrapper):
+    """Transport that records a client span for every API call, ending it once the response body is read."""
+
+    def _start_span(self, request: httpx.Request, body: dict):
+        from opentelemetry.trace import SpanKind
+
+        operation = next((name for path, name in OPERATIONS.items() if request.url.path.endswith(path)), None)
+        model = body.get("model")
+        attributes = {
+            "http.request.method": request.method,
+            "server.address": request.url.host,
+            "url.path": request.url.path,
+        }
+        if operation:
+            attributes["gen_ai.operation.name"] = operation
+        if model:
+            attributes["gen_ai.request.model"] = model
+        for parameter in ("temperature", "top_p", "max_tokens", "seed"):
+            if isinstance(body.get(parameter), int | float):
+                attributes[f"gen_ai.request.{parameter}"] = body[parameter]
+        attributes["gen_ai.request.stream"] = bool(body.get("stream"))
+        name = f"{operation} {model}" if operation and model else f"{request.method} {request.url.path}"
+        return get_tracer().start_span(name, kind=SpanKind.CLIENT, attributes=attributes)
+
+    def _end_span_with_error(self, current_span, error: Exception) -> None:
+        from opentelemetry.trace import Status, StatusCode
+
+        current_span.record_exception(error)
+        current_span.set_status(Status(StatusCode.ERROR, str(error)))
+        current_span.end()
+
+    def _observe(self, response: httpx.Response, current_span, stats: ResponseStats) -> httpx.Response:
+        stats.set_content_encoding(response.headers.get("content-encoding"))
+        current_span.set_attribute("http.response.status_code", response.status_code)
+        if cache_status := response.headers.get("x-demo-cache"):
+            current_span.set_attribute("demo.cache", cache_status)
+
+        def on_close():
+            from opentelemetry.trace import Status, StatusCode
+
+            stats.finish()
+            if stats.prompt_tokens is not None:
+                current_span.set_attribute("gen_ai.usage.input_tokens", stats.prompt_tokens)
+            if stats.completion_tokens is not None:
+                current_span.set_attribute("gen_ai.usage.output_tokens", stats.completion_tokens)
+            current_span.set_attribute("demo.latency_s", stats.latency)
+            if stats.ttft is not None:
+                current_span.set_attribute("demo.time_to_first_token_s", stats.ttft)
+            if response.status_code >= 400:
+                current_span.set_status(Status(StatusCode.ERROR, f"HTTP {response.status_code}"))
+            current_span.end()
+
+        return observe_response(response, stats.feed, on_close)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = request_json(request)
+        current_span = self._start_span(request, body)
+        stats = ResponseStats(time.perf_counter(), bool(body.get("stream")))
+        try:
+            response = self.transport.handle_request(request)
+        except Exception as error:
+            self._end_span_with_error(current_span, error)
+            raise
+        return self._observe(response, current_span, stats)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = request_json(request)
+        current_span = self._start_span(request, body)
+        stats = ResponseStats(time.perf_counter(), bool(body.get("stream")))
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception as error:
+            self._end_span_with_error(current_span, error)
+            raise
+        return self._observe(response, current_span, stats)
@@ -0,0 +1,192 @@
+"""
+Building blocks for httpx transports that wrap the shared connection pool from demo_utils.clients.
+
+Each wrapper works for both the sync and the async pool, so a feature like metrics or
+caching only has to be written once and then applies to every OpenAI client.
+"""
+
+import json
+import time
+import zlib
+
+import httpx
+
+
+class TransportWrapper(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """Base class for a transport that wraps either a sync or an async transport."""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self.transport.handle_request(request)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self.transport.handle_async_request(request)
+
+    def close(self) -> None:
+        self.transport.close()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class ObservedStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """
+    A response body stream that reports every chunk to callbacks, along with the end of the body
+    (`on_end`, only when it was read completely) and the closing of the stream (`on_close`, always).
+    """
+
+    def __init__(self, stream, on_chunk=None, on_close=None, on_end=None):
+        self.stream = stream
+        self.on_chunk = on_chunk
+        self.on_close = on_close
+        self.on_end = on_end
+        self.closed = False
+
+    def _chunk(self, chunk: bytes) -> None:
+        if self.on_chunk is not None:
+            self.on_chunk(chunk)
+
+    def _close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            if self.on_close is not None:
+                self.on_close()
+
+    def _end(self) -> None:
+        if self.on_end is not None:
+            self.on_end()
+
+    def __iter__(self):
+        for chunk in self.stream:
+            self._chunk(chunk)
+            yield chunk
+        self._end()
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            self._chunk(chunk)
+            yield chunk
+        self._end()
+
+    def close(self) -> None:
+        try:
+            self.stream.close()
+        finally:
+            self._close()
+
+    async def aclose(self) -> None:
+        try:
+            await self.stream.aclose()
+        finally:
+            self._close()
+
+
+def observe_response(response: httpx.Response, on_chunk=None, on_close=None, on_end=None) -> httpx.Response:
+    """Return a copy of a not-yet-read response whose body is reported to the callbacks."""
+    return httpx.Response(
+        status_code=response.status_code,
+        headers=response.headers,
+        stream=ObservedStream(response.stream, on_chunk, on_close, on_end),
+        extensions=response.extensions,
+    )
+
+
+def canonical_json(value) -> bytes:
+    """Serialize a value to JSON with sorted keys, so equal values always give equal bytes."""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def request_json(request: httpx.Request) -> dict:
+    """Return the JSON body of a request, or an empty dict if it doesn't have one."""
+    try:
+        body = json.loads(request.read() or b"{}")
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+class ResponseStats:
+    """
+    Parses an OpenAI response body as it arrives, either plain JSON or server-sent events,
+    to find the time to first token and the token usage.
+    """
+
+    def __init__(self, start: float, is_stream: bool):
+        self.start = start
+        self.is_stream = is_stream
+        self.first_token_time = None
+        self.end_time = None
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.content_chunks = 0
+        self._buffer = b""
+        self._body_chunks = []
+        self._decoder = None
+
+    def set_content_encoding(self, encoding: str | None) -> None:
+        """The chunks fed to us come straight from the transport, so they may still be compressed."""
+        encoding = (encoding or "identity").lower()
+        if encoding == "gzip":
+            self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            self._decoder = zlib.decompressobj()
+        elif encoding != "identity":
+            # We can't decode other encodings (like brotli) without extra packages, so the body is ignored
+            self._decoder = False
+
+    def feed(self, chunk: bytes) -> None:
+        if self._decoder is False:
+            return
+        if self._decoder is not None:
+            chunk = self._decoder.decompress(chunk)
+        if not self.is_stream:
+            self._body_chunks.append(chunk)
+            return
+        *lines, self._buffer = (self._buffer + chunk).split(b"\n")
+        for line in lines:
+            self._parse_event(line.strip())
+
+    def _parse_event(self, line: bytes) -> None:
+        if not line.startswith(b"data:") or line == b"data: [DONE]":
+            return
+        try:
+            event = json.loads(line[len(b"data:") :])
+        except json.JSONDecodeError:
+            return
+        for choice in event.get("choices") or []:
+            delta = choice.get("delta") or {}
+            if delta.get("content") or delta.get("tool_calls") or delta.get("reasoning_content"):
+                self.content_chunks += 1
+                if self.first_token_time is None:
+                    self.first_token_time = time.perf_counter()
+        self._read_usage(event)
+
+    def _read_usage(self, body: dict) -> None:
+        usage = body.get("usage") or {}
+        if usage:
+            self.prompt_tokens = usage.get("prompt_tokens")
+            self.completion_tokens = usage.get("completion_tokens")
+
+    def finish(self) -> None:
+        self.end_time = time.perf_counter()
+        if self.is_stream:
+            self._parse_event(self._buffer.strip())
+        else:
+            try:
+                body = json.loads(b"".join(self._body_chunks) or b"{}")
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                body = {}
+            if isinstance(body, dict):
+                self._read_usage(body)
+        self._buffer = b""
+        self._body_chunks = []
+
+    @property
+    def latency(self) -> float | None:
+        return None if self.end_time is None else self.end_time - self.start
+
+    @property
+    def ttft(self) -> float | None:
+        return None if self.first_token_time is None else self.first_token_time - self.start
@@ -0,0 +1,230 @@
+"""
+Exact vector search over the embeddings matrix of the chunks, by cosine similarity.
+
+The ingestion stores the rows normalized (see demo_utils.chunk_store), so scoring a query is a single
+matrix-vector product of the memory-mapped matrix with the normalized query, and the top results are
+picked with `argpartition` (linear in the number of rows) before only those are sorted. A float32 matrix
+whose rows aren't normalized, from an older ingestion or another model, is normalized into a copy in memory
+instead. int8 rows (EMBEDDING_STORAGE=int8) stay as they are, memory-mapped, and their products with the
+query are multiplied by the inverse of their norm, which gives the same cosine similarity.
+
+    index = VectorIndex.load("rag_ingested_chunks.json")
+    rows = index.search(query_embedding, limit=5)
+
+Exact search reads every row for every query, which gets too slow past a few hundred thousand chunks.
+With VECTOR_INDEX=hnsw, `load_vector_index` returns an HNSWIndex instead: an approximate nearest-neighbor
+graph (hnswlib, installed separately with `pip install hnswlib`) that only visits a small part of the rows.
+The ingestion scripts build it next to the chunks file (rag_ingested_chunks.hnsw.bin, with its settings
+and the SHA-256 of the embeddings it was built from in rag_ingested_chunks.hnsw.json), and it's built
+again when the embeddings or the settings change. HNSW_M (default 16) is the number of links per node
+and HNSW_EF_CONSTRUCTION (default 200) the breadth of the search while building: higher values give a
+better graph, but a larger and slower to build one. HNSW_EF (default 64) is the breadth of the search
+for a query, the trade-off between recall and latency (see `python -m benchmarks.hnsw`).
+"""
+
+import json
+import os
+import pathlib
+
+from demo_utils.chunk_store import (
+    NORM_TOLERANCE,
+    dot_products,
+    embeddings_path_for,
+    file_sha256,
+    load_embeddings,
+    write_json,
+)
+
+# Rows converted to float32 at a time while computing the norms, so the whole matrix is never copied at once
+BLOCK_ROWS = 4096
+# Rows checked to tell a normalized matrix, spread over all of it
+NORM_SAMPLE_ROWS = 1024
+VECTOR_INDEXES = ("exact", "hnsw")
+
+
+def get_vector_index() -> str:
+    vector_index = os.getenv("VECTOR_INDEX", "exact")
+    if vector_index not in VECTOR_INDEXES:
+        raise ValueError(f"VECTOR_INDEX must be one of {', '.join(VECTOR_INDEXES)}, not {vector_index!r}")
+    return vector_index
+
+
+def get_hnsw_settings() -> dict:
+    """Return the settings the HNSW graph is built with, which make it stale when they change."""
+    return {"m": int(os.getenv("HNSW_M", "16")), "ef_construction": int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))}
+
+
+def get_hnsw_ef() -> int:
+    return int(os.getenv("HNSW_EF", "64"))
+
+
+def hnsw_paths_for(chunks_path) -> tuple[pathlib.Path, pathlib.Path]:
+    """Return the paths of the HNSW graph of a chunks file and of its metadata."""
+    chunks_path = pathlib.Path(chunks_path)
+    return chunks_path.with_name(f"{chunks_path.stem}.hnsw.bin"), chunks_path.with_name(f"{chunks_path.stem}.hnsw.json")
+
+
+def row_norms(matrix, block_rows: int = BLOCK_ROWS):
+    """Return the L2 norm of every row of the matrix as float32, with the norms of 0 replaced by 1."""
+    import numpy as np
+
+    norms = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), block_rows):
+        block = np.asarray(matrix[start : start + block_rows], dtype=np.float32)
+        norms[start : start + len(block)] = np.sqrt(np.einsum("ij,ij->i", block, block))
+    # An empty row has no direction, it only keeps the division from failing
+    norms[norms == 0] = 1
+    return norms
+
+
+def is_normalized(matrix, sample_rows: int = NORM_SAMPLE_ROWS) -> bool:
+    """Whether the rows of a float32 matrix have a norm of 1, judging from rows spread over the whole matrix."""
+    import numpy as np
+
+    sample = np.asarray(matrix[:: max(1, len(matrix) // sample_rows)], dtype=np.float32)
+    return bool(np.all(np.abs(np.linalg.norm(sample, axis=1) - 1) < NORM_TOLERANCE))
+
+
+class VectorIndex:
+    """The embeddings of the chunks, ready to be searched by cosine similarity, with one row per chunk."""
+
+    def __init__(self, embeddings, block_rows: int = BLOCK_ROWS):
+        import numpy as np
+
+        # The width of the rows, which the query embeddings must have too
+        self.dimensions = embeddings.shape[1]
+        if embeddings.dtype == np.int8:
+            self.matrix = embeddings
+            self.scales = 1 / row_norms(embeddings, block_rows)
+        elif embeddings.dtype == np.float32 and is_normalized(embeddings):
+            self.matrix = embeddings
+            self.scales = None
+        else:
+            norms = row_norms(embeddings, block_rows)
+            self.matrix = np.empty(embeddings.shape, dtype=np.float32)
+            for start in range(0, len(embeddings), block_rows):
+                end = start + block_rows
+                np.divide(embeddings[start:end], norms[start:end, None], out=self.matrix[start:end], casting="unsafe")
+            self.scales = None
+
+    @classmethod
+    def load(cls, chunks_path) -> "VectorIndex":
+        """Build the index of the embeddings saved next to the chunks file (see demo_utils.chunk_store)."""
+        return cls(load_embeddings(chunks_path))
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    def scores(self, query):
+        """Return the cosine similarity of the query with every row."""
+        import numpy as np
+
+        query = np.asarray(query, dtype=np.float32)
+        return dot_products(self.matrix, query / (np.linalg.norm(query) or 1), self.scales)
+
+    def search(self, query, limit: int) -> list[int]:
+        """Return the rows of the `limit` embeddings most similar to the query, the most similar first."""
+        import numpy as np
+
+        scores = self.scores(query)
+        if limit < len(scores):
+            # Only the top rows are sorted, after argpartition puts them in front in linear time
+            top = np.argpartition(-scores, limit)[:limit]
+        else:
+            top = np.arange(len(scores))
+        return top[np.argsort(-scores[top], kind="stable")].tolist()
+
+
+class HNSWIndex:
+    """
+    An approximate nearest-neighbor graph of the embeddings by cosine similarity, with the same `search` as
+    VectorIndex. `ef` is the number of candidates kept while searching, at least the number of results.
+    """
+
+    def __init__(self, graph, rows: int, ef: int | None = None):
+        self.graph = graph
+        self.rows = rows
+        self.dimensions = graph.dim
+        self.ef = ef or get_hnsw_ef()
+
+    @classmethod
+    def build(cls, embeddings, m: int = 16, ef_construction: int = 200, block_rows: int = BLOCK_ROWS) -> "HNSWIndex":
+        """Build the graph of the rows, converting a block of int8 rows to float32 at a time."""
+        import hnswlib
+        import numpy as np
+
+        graph = hnswlib.Index(space="cosine", dim=embeddings.shape[1])
+        graph.init_index(max_elements=len(embeddings), ef_construction=ef_construction, M=m, random_seed=100)
+        for start in range(0, len(embeddings), block_rows):
+            block = np.asarray(embeddings[start : start + block_rows], dtype=np.float32)
+            graph.add_items(block, np.arange(start, start + len(block)))
+        return cls(graph, len(embeddings))
+
+    @classmethod
+    def load(cls, path, dimensions: int, rows: int, ef: int | None = None) -> "HNSWIndex":
+        import hnswlib
+
+        graph = hnswlib.Index(space="cosine", dim=dimensions)
+        graph.load_index(str(path), max_elements=rows)
+        return cls(graph, rows, ef)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def search(self, query, limit: int) -> list[int]:
+        """Return the rows of about the `limit` embeddings most similar to the query, the most similar first."""
+        import numpy as np
+
+        limit = min(limit, self.rows)
+        if not limit:
+            return []
+        self.graph.set_ef(max(self.ef, limit))
+        labels, _ = self.graph.knn_query(np.asarray(query, dtype=np.float32), k=limit)
+        return labels[0].tolist()
+
+
+def open_hnsw_index(chunks_path, ef: int | None = None) -> HNSWIndex:
+    """
+    Return the HNSW graph of the chunks file, loaded from the disk if it was built from the same embeddings
+    with the same settings, or built and saved next to it otherwise.
+    """
+    graph_path, metadata_path = hnsw_paths_for(chunks_path)
+    embeddings_path = embeddings_path_for(chunks_path)
+    embeddings = load_embeddings(chunks_path)
+    settings = get_hnsw_settings()
+    stat = embeddings_path.stat()
+    try:
+        with open(metadata_path, encoding="utf-8") as file:
+            metadata = json.load(file)
+    except (OSError, ValueError):
+        metadata = {}
+    fresh = graph_path.exists() and metadata.get("settings") == settings
+    # The embeddings are only hashed when their file was written again since, which the ingestion always does
+    if fresh and (metadata.get("size"), metadata.get("mtime_ns")) != (stat.st_size, stat.st_mtime_ns):
+        fresh = metadata.get("embeddings_sha256") == file_sha256(embeddings_path)
+        if fresh:
+            write_json(metadata_path, {**metadata, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}, indent=2)
+    if fresh:
+        return HNSWIndex.load(graph_path, embeddings.shape[1], len(embeddings), ef)
+
+    index = HNSWIndex.build(embeddings, **settings)
+    index.ef = ef or index.ef
+    index.graph.save_index(str(graph_path))
+    metadata = {
+        "settings": settings,
+        "embeddings_sha256": file_sha256(embeddings_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+    write_json(metadata_path, metadata, indent=2)
+    return index
+
+
+def load_vector_index(chunks_path):
+    """
+    Return the index to search the embeddings of the chunks file with, as set by VECTOR_INDEX:
+    a VectorIndex for exact search (the default), or an HNSWIndex for approximate search.
+    """
+    if get_vector_index() == "hnsw" and len(load_embeddings(chunks_path)):
+        return open_hnsw_index(chunks_path)
+    return VectorIndex.load(chunks_path)
@@ -1,16 +1,17 @@
+import sys
 from pathlib import Path
 
-import azure.identity
 from dotenv import load_dotenv
 
+# Allows importing the shared demo_utils modules from the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from demo_utils.azure_auth import get_azure_token  # noqa: E402
+
 # Load environment variables from .env file
 load_dotenv(override=True)
 
-# Get a token from Azure
-token_provider = azure.identity.get_bearer_token_provider(
-    azure.identity.DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default"
-)
-token = token_provider()
+# Get a token from Azure, reusing the one shared with the Python scripts if it isn't about to expire
+token = get_azure_token()
 
 # Path to the .env file
 env_path = Path(__file__).parent / ".env"
@@ -19,9 +20,12 @@ env_path = Path(__file__).parent / ".env"
 with open(env_path) as f:
     lines = f.readlines()
 
-# Write back non-AUTH_TOKEN lines and append the new token
-with open(env_path, "w") as f:
-    for line in lines:
-        if not line.startswith("TOKEN"):
-            f.write(line)
-    f.write(f"TOKEN={token}\n")
+# Only rewrite the file when the token has changed
+token_line = f"TOKEN={token}\n"
+if token_line not in lines:
+    # Write back non-AUTH_TOKEN lines and append the new token
+    with open(env_path, "w") as f:
+        for line in lines:
+            if not line.startswith("TOKEN"):
+                f.write(line)
+        f.write(token_line)
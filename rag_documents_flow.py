@@ -1,42 +1,23 @@
-import json
 import os
 
-import azure.identity
-import openai
 from dotenv import load_dotenv
-from lunr import lunr
+
+from demo_utils.chunk_store import load_chunks
+from demo_utils.clients import create_client, get_model_name
+from demo_utils.keyword_index import open_keyword_index
 
 # Setup the OpenAI client to use either Azure, OpenAI.com, or Ollama API
 load_dotenv(override=True)
 API_HOST = os.getenv("API_HOST", "github")
 
-if API_HOST == "azure":
-    token_provider = azure.identity.get_bearer_token_provider(
-        azure.identity.DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default"
-    )
-    client = openai.OpenAI(
-        base_url=os.environ["AZURE_OPENAI_ENDPOINT"],
-        api_key=token_provider,
-    )
-    MODEL_NAME = os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"]
-
-elif API_HOST == "ollama":
-    client = openai.OpenAI(base_url=os.environ["OLLAMA_ENDPOINT"], api_key="nokeyneeded")
-    MODEL_NAME = os.environ["OLLAMA_MODEL"]
-
-elif API_HOST == "github":
-    client = openai.OpenAI(base_url="https://models.github.ai/inference", api_key=os.environ["GITHUB_TOKEN"])
-    MODEL_NAME = os.getenv("GITHUB_MODEL", "openai/gpt-4o")
-
-else:
-    client = openai.OpenAI(api_key=os.environ["OPENAI_KEY"])
-    MODEL_NAME = os.environ["OPENAI_MODEL"]
+client = create_client(API_HOST)
+MODEL_NAME = get_model_name(API_HOST)
 
-# Index the data from the JSON - each object has id, text, and embedding
-with open("rag_ingested_chunks.json") as file:
-    documents = json.load(file)
-    documents_by_id = {doc["id"]: doc for doc in documents}
-index = lunr(ref="id", fields=["text"], documents=documents)
+# Index the data from the JSON - each object has id and text
+documents = load_chunks("rag_ingested_chunks.json")
+documents_by_id = {doc["id"]: doc for doc in documents}
+# The lunr index saved by the ingestion script is loaded, and only built again if the chunks changed
+index = open_keyword_index("rag_ingested_chunks.json", documents, ref="id", fields=["text"])
 
 # Get the user question
 user_question = "where do digger bees live?"
@@ -1,45 +1,34 @@
-import json
+import functools
 import os
 
-import azure.identity
-import openai
 from dotenv import load_dotenv
-from lunr import lunr
-from sentence_transformers import CrossEncoder
+
+from demo_utils.chunk_store import load_chunks
+from demo_utils.clients import create_client, get_model_name
+from demo_utils.embedding_cache import get_query_embedding
+from demo_utils.keyword_index import open_keyword_index
+from demo_utils.tracing import traced
+from demo_utils.vector_search import load_vector_index
 
 # Setup the OpenAI client to use either Azure, OpenAI.com, or Ollama API
 load_dotenv(override=True)
 API_HOST = os.getenv("API_HOST", "github")
 
-if API_HOST == "azure":
-    token_provider = azure.identity.get_bearer_token_provider(
-        azure.identity.DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default"
-    )
-    client = openai.OpenAI(
-        base_url=os.environ["AZURE_OPENAI_ENDPOINT"],
-        api_key=token_provider,
-    )
-    MODEL_NAME = os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"]
-
-elif API_HOST == "ollama":
-    client = openai.OpenAI(base_url=os.environ["OLLAMA_ENDPOINT"], api_key="nokeyneeded")
-    MODEL_NAME = os.environ["OLLAMA_MODEL"]
-
-elif API_HOST == "github":
-    client = openai.OpenAI(base_url="https://models.github.ai/inference", api_key=os.environ["GITHUB_TOKEN"])
-    MODEL_NAME = os.getenv("GITHUB_MODEL", "openai/gpt-4o")
+client = create_client(API_HOST)
+MODEL_NAME = get_model_name(API_HOST)
 
-else:
-    client = openai.OpenAI(api_key=os.environ["OPENAI_KEY"])
-    MODEL_NAME = os.environ["OPENAI_MODEL"]
-
-# Index the data from the JSON - each object has id, text, and embedding
-with open("rag_ingested_chunks.json") as file:
-    documents = json.load(file)
-    documents_by_id = {doc["id"]: doc for doc in documents}
-index = lunr(ref="id", fields=["text"], documents=documents)
+# Index the data from the JSON - each object has id and text
+documents = load_chunks("rag_ingested_chunks.json")
+documents_by_id = {doc["id"]: doc for doc in documents}
+# The embeddings are the rows of a memory-mapped matrix in a .npy file, normalized by the ingestion script,
+# so that a query is scored with a single matrix-vector product without copying them
+# With VECTOR_INDEX=hnsw, the approximate HNSW graph built by the ingestion script is loaded instead
+vector_index = load_vector_index("rag_ingested_chunks.json")
+# The lunr index saved by the ingestion script is loaded, and only built again if the chunks changed
+index = open_keyword_index("rag_ingested_chunks.json", documents, ref="id", fields=["text"])
 
 
+@traced()
 def full_text_search(query, limit):
     """
     Perform a full-text search on the indexed documents.
@@ -49,27 +38,18 @@ def full_text_search(query, limit):
     return retrieved_documents
 
 
+@traced()
 def vector_search(query, limit):
     """
-    Perform a vector search on the indexed documents
-    using a simple cosine similarity function.
+    Perform a vector search on the indexed documents,
+    ranked by the cosine similarity of their embeddings with the query embedding.
     """
-
-    def cosine_similarity(a, b):
-        return sum(x * y for x, y in zip(a, b)) / ((sum(x * x for x in a) ** 0.5) * (sum(y * y for y in b) ** 0.5))
-
-    query_embedding = client.embeddings.create(model="text-embedding-3-small", input=query).data[0].embedding
-    similarities = []
-    for doc in documents:
-        doc_embedding = doc["embedding"]
-        similarity = cosine_similarity(query_embedding, doc_embedding)
-        similarities.append((doc, similarity))
-    similarities.sort(key=lambda x: x[1], reverse=True)
-
-    retrieved_documents = [doc for doc, _ in similarities[:limit]]
+    query_embedding = get_query_embedding(client, query, vector_index.dimensions, model="text-embedding-3-small")
+    retrieved_documents = [documents[row] for row in vector_index.search(query_embedding, limit)]
     return retrieved_documents
 
 
+@traced()
 def reciprocal_rank_fusion(text_results, vector_results, k=60):
     """
     Perform Reciprocal Rank Fusion (RRF) on the results from text and vector searches,
@@ -91,16 +71,30 @@ def reciprocal_rank_fusion(text_results, vector_results, k=60):
     return retrieved_documents
 
 
+@functools.cache
+def get_cross_encoder():
+    """
+    Load the cross-encoder model the first time it is used.
+    Importing sentence_transformers (and PyTorch) is by far the slowest part of starting this script,
+    so we only do it when we actually rerank results.
+    """
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+
+@traced()
 def rerank(query, retrieved_documents):
     """
     Rerank the results using a cross-encoder model.
     """
-    encoder = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+    encoder = get_cross_encoder()
     scores = encoder.predict([(query, doc["text"]) for doc in retrieved_documents])
     scored_documents = [v for _, v in sorted(zip(scores, retrieved_documents), reverse=True)]
     return scored_documents
 
 
+@traced()
 def hybrid_search(query, limit):
     """
     Perform a hybrid search using both full-text and vector search.
@@ -1,60 +1,62 @@
-import json
 import os
 import pathlib
 
-import azure.identity
-import openai
-import pymupdf4llm
 from dotenv import load_dotenv
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from demo_utils.clients import create_client, get_model_name
+from demo_utils.ingestion import find_pdfs, ingest_pdfs
 
 # Setup the OpenAI client to use either Azure, OpenAI.com, or Ollama API
 load_dotenv(override=True)
 API_HOST = os.getenv("API_HOST", "github")
 
-if API_HOST == "azure":
-    token_provider = azure.identity.get_bearer_token_provider(
-        azure.identity.DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default"
-    )
-    client = openai.OpenAI(
-        base_url=os.environ["AZURE_OPENAI_ENDPOINT"],
-        api_key=token_provider,
+client = create_client(API_HOST)
+MODEL_NAME = get_model_name(API_HOST)
+
+
+data_dir = pathlib.Path(os.path.dirname(__file__)) / "data"
+
+
+def print_progress(progress):
+    eta = f"{progress.eta_seconds:.0f}s" if progress.eta_seconds is not None else "-"
+    print(
+        f"{progress.files_done}/{progress.files_total} PDFs, {progress.chunks_written} chunks "
+        f"({progress.chunks_per_second:.1f}/sec), ETA {eta}"
     )
-    MODEL_NAME = os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"]
 
-elif API_HOST == "ollama":
-    client = openai.OpenAI(base_url=os.environ["OLLAMA_ENDPOINT"], api_key="nokeyneeded")
-    MODEL_NAME = os.environ["OLLAMA_MODEL"]
 
-elif API_HOST == "github":
-    client = openai.OpenAI(base_url="https://models.github.ai/inference", api_key=os.environ["GITHUB_TOKEN"])
-    MODEL_NAME = os.getenv("GITHUB_MODEL", "openai/gpt-4o")
+def print_duplicate(duplicate):
+    print(
+        f"Dropped {duplicate.chunk_id} before embedding it, a near-duplicate of {duplicate.duplicate_of} "
+        f"({duplicate.similarity:.0%} similar)"
+    )
 
-else:
-    client = openai.OpenAI(api_key=os.environ["OPENAI_KEY"])
-    MODEL_NAME = os.environ["OPENAI_MODEL"]
 
-data_dir = pathlib.Path(os.path.dirname(__file__)) / "data"
-filenames = ["California_carpenter_bee.pdf", "Centris_pallida.pdf", "Western_honey_bee.pdf", "Aphideater_hoverfly.pdf"]
-all_chunks = []
-for filename in filenames:
-    # Extract text from the PDF file
-    md_text = pymupdf4llm.to_markdown(data_dir / filename)
-
-    # Split the text into smaller chunks
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        model_name="gpt-4o", chunk_size=500, chunk_overlap=125
+def main():
+    # Extract text from every PDF under data/, split it into smaller chunks and generate embeddings for the chunks,
+    # only for the PDFs and chunks that changed since the last run, and save them to a JSON file
+    summary = ingest_pdfs(
+        client,
+        find_pdfs(data_dir),
+        "rag_ingested_chunks.json",
+        "text-embedding-3-small",
+        root=data_dir,
+        on_progress=print_progress,
+        on_duplicate=print_duplicate,
+    )
+    print(
+        f"Extracted {len(summary.extracted_files)} PDFs ({len(summary.unchanged_files)} unchanged, "
+        f"{len(summary.resumed_files)} resumed from a checkpoint, "
+        f"{len(summary.dropped_files)} dropped), embedded {summary.embedded_chunks} chunks "
+        f"({summary.cached_chunks} more from the embedding cache) and reused {summary.reused_chunks} embeddings, "
+        f"{len(summary.duplicate_chunks)} near-duplicate chunks dropped"
     )
-    texts = text_splitter.create_documents([md_text])
-    file_chunks = [{"id": f"{filename}-{(i + 1)}", "text": text.page_content} for i, text in enumerate(texts)]
-
-    # Generate embeddings using openAI SDK for each text
-    for file_chunk in file_chunks:
-        file_chunk["embedding"] = (
-            client.embeddings.create(model="text-embedding-3-small", input=file_chunk["text"]).data[0].embedding
-        )
-    all_chunks.extend(file_chunks)
-
-# Save the documents with embeddings to a JSON file
-with open("rag_ingested_chunks.json", "w") as f:
-    json.dump(all_chunks, f, indent=4)
+    print(
+        f"Embedded {summary.chunks_per_second:.1f} chunks/sec and {summary.tokens_per_second:.0f} tokens/sec "
+        f"in {summary.seconds:.1f} seconds"
+    )
+
+
+# The worker processes import this script too, so only the main process runs the pipeline
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import pathlib
+
+from dotenv import load_dotenv
+
+from demo_utils.clients import close_async_credentials, create_async_client, get_model_name
+from demo_utils.ingestion import find_pdfs, ingest_pdfs_async
+
+# Setup the OpenAI client to use either Azure, OpenAI.com, or Ollama API
+load_dotenv(override=True)
+API_HOST = os.getenv("API_HOST", "github")
+
+client = create_async_client(API_HOST)
+MODEL_NAME = get_model_name(API_HOST)
+
+
+data_dir = pathlib.Path(os.path.dirname(__file__)) / "data"
+
+
+def print_progress(progress):
+    eta = f"{progress.eta_seconds:.0f}s" if progress.eta_seconds is not None else "-"
+    print(
+        f"{progress.files_done}/{progress.files_total} PDFs, {progress.chunks_written} chunks "
+        f"({progress.chunks_per_second:.1f}/sec), ETA {eta}"
+    )
+
+
+def print_duplicate(duplicate):
+    print(
+        f"Dropped {duplicate.chunk_id} before embedding it, a near-duplicate of {duplicate.duplicate_of} "
+        f"({duplicate.similarity:.0%} similar)"
+    )
+
+
+async def close_clients() -> None:
+    """Close the OpenAI async client and (if applicable) the Azure credential."""
+    await client.close()
+    await close_async_credentials()
+
+
+async def main():
+    # Same as rag_documents_ingestion.py, but with up to EMBEDDING_CONCURRENCY embedding requests in flight at once,
+    # while the chunks are still saved in the order of the PDFs
+    try:
+        summary = await ingest_pdfs_async(
+            client,
+            find_pdfs(data_dir),
+            "rag_ingested_chunks.json",
+            "text-embedding-3-small",
+            root=data_dir,
+            on_progress=print_progress,
+            on_duplicate=print_duplicate,
+        )
+    finally:
+        await close_clients()
+    print(
+        f"Extracted {len(summary.extracted_files)} PDFs ({len(summary.unchanged_files)} unchanged, "
+        f"{len(summary.resumed_files)} resumed from a checkpoint, "
+        f"{len(summary.dropped_files)} dropped), embedded {summary.embedded_chunks} chunks "
+        f"({summary.cached_chunks} more from the embedding cache) and reused {summary.reused_chunks} embeddings, "
+        f"{len(summary.duplicate_chunks)} near-duplicate chunks dropped"
+    )
+    print(
+        f"Embedded {summary.chunks_per_second:.1f} chunks/sec and {summary.tokens_per_second:.0f} tokens/sec "
+        f"in {summary.seconds:.1f} seconds"
+    )
+
+
+# The worker processes import this script too, so only the main process runs the pipeline
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,34 +1,20 @@
 import asyncio
 import os
+import sys
+from pathlib import Path
 
-import azure.identity.aio
-import openai
 from dotenv import load_dotenv
 
+# Permite importar los módulos compartidos de demo_utils desde la carpeta principal
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from demo_utils.clients import close_async_credentials, create_async_client, get_model_name  # noqa: E402
+
 # Configura el cliente de OpenAI para usar la API de Azure, OpenAI.com u Ollama
 load_dotenv(override=True)
 API_HOST = os.getenv("API_HOST", "github")
 
-azure_credential = None  # Guarda la Azure Credential para poder cerrarla correctamente
-if API_HOST == "azure":
-    azure_credential = azure.identity.aio.DefaultAzureCredential()
-    token_provider = azure.identity.aio.get_bearer_token_provider(
-        azure_credential, "https://cognitiveservices.azure.com/.default"
-    )
-    client = openai.AsyncOpenAI(
-        base_url=os.environ["AZURE_OPENAI_ENDPOINT"],
-        api_key=token_provider,
-    )
-    MODEL_NAME = os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"]
-elif API_HOST == "ollama":
-    client = openai.AsyncOpenAI(base_url=os.environ["OLLAMA_ENDPOINT"], api_key="nokeyneeded")
-    MODEL_NAME = os.environ["OLLAMA_MODEL"]
-elif API_HOST == "github":
-    client = openai.AsyncOpenAI(base_url="https://models.github.ai/inference", api_key=os.environ["GITHUB_TOKEN"])
-    MODEL_NAME = os.getenv("GITHUB_MODEL", "openai/gpt-4o")
-else:
-    client = openai.AsyncOpenAI(api_key=os.environ["OPENAI_KEY"])
-    MODEL_NAME = os.environ["OPENAI_MODEL"]
+client = create_async_client(API_HOST)
+MODEL_NAME = get_model_name(API_HOST)
 
 
 async def generate_response(location):
@@ -74,8 +60,7 @@ async def multiple() -> None:
 async def close_clients() -> None:
     """Cierra el cliente OpenAI y la credencial de Azure (si existe)."""
     await client.close()
-    if azure_credential is not None:
-        await azure_credential.close()
+    await close_async_credentials()
 
 
 async def main():
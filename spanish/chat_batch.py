@@ -0,0 +1,71 @@
+import os
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Permite importar los módulos compartidos de demo_utils desde la carpeta principal
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from demo_utils import batch  # noqa: E402
+from demo_utils.clients import create_client, get_model_name  # noqa: E402
+
+# Configura el cliente de OpenAI para usar la API de Azure, OpenAI.com o el servidor local de prueba
+load_dotenv(override=True)
+API_HOST = os.getenv("API_HOST", "github")
+
+if API_HOST not in ("azure", "openai", "local"):
+    print(f"La API de Batch no está disponible en {API_HOST}, usa azure, openai o local.")
+    sys.exit(1)
+
+client = create_client(API_HOST)
+MODEL_NAME = get_model_name(API_HOST)
+
+# La misma pregunta que en chat_async.py, pero para muchos lugares a la vez, con el precio de Batch
+LOCATIONS = ["Tokio", "Berkeley", "Singapur", "Lisboa", "Nairobi", "Montreal", "Buenos Aires", "Reikiavik"]
+BATCH_FILE = "batch_requests.jsonl"
+ENDPOINT = batch.batch_endpoint(API_HOST)
+
+# Cada solicitud tiene un custom_id, que nos permite encontrar su resultado en el archivo de salida
+requests = {
+    f"lugar-{index}": {
+        "model": MODEL_NAME,
+        "messages": [
+            {"role": "system", "content": "Eres un asistente útil."},
+            {
+                "role": "user",
+                "content": (
+                    f"Nombra un solo lugar que debería visitar en mi viaje a {location} y descríbelo en una oración"
+                ),
+            },
+        ],
+        "temperature": 1,
+        "max_tokens": 400,
+    }
+    for index, location in enumerate(LOCATIONS)
+}
+batch.write_batch_file(BATCH_FILE, requests, ENDPOINT)
+
+job = batch.submit_batch(client, BATCH_FILE, ENDPOINT)
+print(f"Se envió el batch {job.id} con {len(requests)} solicitudes, esperando a que termine...")
+
+
+def print_progress(job):
+    counts = job.request_counts
+    print(f"Batch {job.status}: {counts.completed} completadas, {counts.failed} fallidas de {counts.total}")
+
+
+job = batch.wait_for_batch(client, job.id, on_update=print_progress)
+if job.status != "completed":
+    errors = job.errors.data if job.errors and job.errors.data else []
+    print(f"Batch {job.status}:", "; ".join(f"línea {error.line}: {error.message}" for error in errors))
+    sys.exit(1)
+
+results = batch.download_results(client, job)
+for index, location in enumerate(LOCATIONS):
+    result = results.get(f"lugar-{index}")
+    if result is None:
+        print(f"{location}: sin resultado")
+    elif result["status_code"] != 200:
+        print(f"{location}: error {result['status_code']}: {result['body'] or result['error']}")
+    else:
+        print(f"{location}: {result['body']['choices'][0]['message']['content']}\n")
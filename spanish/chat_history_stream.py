@@ -1,31 +1,21 @@
 import os
+import sys
+from pathlib import Path
 
-import azure.identity
-import openai
 from dotenv import load_dotenv
 
+# Permite importar los módulos compartidos de demo_utils desde la carpeta principal
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from demo_utils.clients import create_client, create_hedged_client, get_model_name  # noqa: E402
+
 # Configura el cliente de OpenAI para usar la API de Azure, OpenAI.com u Ollama
 load_dotenv(override=True)
 API_HOST = os.getenv("API_HOST", "github")
+# Opcionalmente, una lista de hosts como "ollama,github" para cubrir solicitudes lentas y fallos entre ellos
+API_HOSTS = os.getenv("API_HOSTS")
 
-if API_HOST == "azure":
-    token_provider = azure.identity.get_bearer_token_provider(
-        azure.identity.DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default"
-    )
-    client = openai.OpenAI(
-        base_url=os.environ["AZURE_OPENAI_ENDPOINT"],
-        api_key=token_provider,
-    )
-    MODEL_NAME = os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"]
-elif API_HOST == "ollama":
-    client = openai.OpenAI(base_url=os.environ["OLLAMA_ENDPOINT"], api_key="nokeyneeded")
-    MODEL_NAME = os.environ["OLLAMA_MODEL"]
-elif API_HOST == "github":
-    client = openai.OpenAI(base_url="https://models.github.ai/inference", api_key=os.environ["GITHUB_TOKEN"])
-    MODEL_NAME = os.getenv("GITHUB_MODEL", "openai/gpt-4o")
-else:
-    client = openai.OpenAI(api_key=os.environ["OPENAI_KEY"])
-    MODEL_NAME = os.environ["OPENAI_MODEL"]
+client = create_hedged_client(API_HOSTS.split(",")) if API_HOSTS else create_client(API_HOST)
+MODEL_NAME = get_model_name(API_HOST)
 
 
 messages = [
@@ -1,45 +1,38 @@
-import json
+import functools
 import os
+import sys
+from pathlib import Path
 
-import azure.identity
-import openai
 from dotenv import load_dotenv
-from lunr import lunr
-from sentence_transformers import CrossEncoder
+
+# Permite importar los módulos compartidos de demo_utils desde la carpeta principal
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from demo_utils.chunk_store import load_chunks  # noqa: E402
+from demo_utils.clients import create_client, get_model_name  # noqa: E402
+from demo_utils.embedding_cache import get_query_embedding  # noqa: E402
+from demo_utils.keyword_index import open_keyword_index  # noqa: E402
+from demo_utils.tracing import traced  # noqa: E402
+from demo_utils.vector_search import load_vector_index  # noqa: E402
 
 # Configura el cliente de OpenAI para usar la API de Azure, OpenAI.com u Ollama
 load_dotenv(override=True)
 API_HOST = os.getenv("API_HOST", "github")
 
-if API_HOST == "azure":
-    token_provider = azure.identity.get_bearer_token_provider(
-        azure.identity.DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default"
-    )
-    client = openai.OpenAI(
-        base_url=os.environ["AZURE_OPENAI_ENDPOINT"],
-        api_key=token_provider,
-    )
-    MODEL_NAME = os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"]
-
-elif API_HOST == "ollama":
-    client = openai.OpenAI(base_url=os.environ["OLLAMA_ENDPOINT"], api_key="nokeyneeded")
-    MODEL_NAME = os.environ["OLLAMA_MODEL"]
-
-elif API_HOST == "github":
-    client = openai.OpenAI(base_url="https://models.github.ai/inference", api_key=os.environ["GITHUB_TOKEN"])
-    MODEL_NAME = os.getenv("GITHUB_MODEL", "openai/gpt-4o")
+client = create_client(API_HOST)
+MODEL_NAME = get_model_name(API_HOST)
 
-else:
-    client = openai.OpenAI(api_key=os.environ["OPENAI_KEY"])
-    MODEL_NAME = os.environ["OPENAI_MODEL"]
-
-# Indexar los datos del JSON - cada objeto tiene id, texto y embedding
-with open("rag_ingested_chunks.json") as file:
-    documents = json.load(file)
-    documents_by_id = {doc["id"]: doc for doc in documents}
-index = lunr(ref="id", fields=["text"], documents=documents)
+# Indexar los datos del JSON - cada objeto tiene id y texto
+documents = load_chunks("rag_ingested_chunks.json")
+documents_by_id = {doc["id"]: doc for doc in documents}
+# Los embeddings son las filas de una matriz mapeada en memoria en un archivo .npy, normalizadas por el script
+# de ingesta, así que cada consulta se puntúa con un único producto matriz-vector sin copiarlas
+# Con VECTOR_INDEX=hnsw se carga en su lugar el grafo HNSW aproximado que construye el script de ingesta
+vector_index = load_vector_index("rag_ingested_chunks.json")
+# Se carga el índice de lunr que guarda el script de ingesta, y solo se reconstruye si cambiaron los fragmentos
+index = open_keyword_index("rag_ingested_chunks.json", documents, ref="id", fields=["text"])
 
 
+@traced()
 def full_text_search(query, limit):
     """
     Realizar una búsqueda de texto completo en los documentos indexados.
@@ -49,27 +42,18 @@ def full_text_search(query, limit):
     return retrieved_documents
 
 
+@traced()
 def vector_search(query, limit):
     """
-    Realizar una búsqueda vectorial en los documentos indexados
-    utilizando una función simple de similitud de coseno.
+    Realizar una búsqueda vectorial en los documentos indexados,
+    ordenados por la similitud de coseno de sus embeddings con el de la consulta.
     """
-
-    def cosine_similarity(a, b):
-        return sum(x * y for x, y in zip(a, b)) / ((sum(x * x for x in a) ** 0.5) * (sum(y * y for y in b) ** 0.5))
-
-    query_embedding = client.embeddings.create(model="text-embedding-3-small", input=query).data[0].embedding
-    similarities = []
-    for doc in documents:
-        doc_embedding = doc["embedding"]
-        similarity = cosine_similarity(query_embedding, doc_embedding)
-        similarities.append((doc, similarity))
-    similarities.sort(key=lambda x: x[1], reverse=True)
-
-    retrieved_documents = [doc for doc, _ in similarities[:limit]]
+    query_embedding = get_query_embedding(client, query, vector_index.dimensions, model="text-embedding-3-small")
+    retrieved_documents = [documents[row] for row in vector_index.search(query_embedding, limit)]
     return retrieved_documents
 
 
+@traced()
 def reciprocal_rank_fusion(text_results, vector_results, k=60):
     """
     Realizar la Fusión de Rango Recíproco (RRF) en los resultados de búsquedas de texto y vectoriales,
@@ -91,16 +75,30 @@ def reciprocal_rank_fusion(text_results, vector_results, k=60):
     return retrieved_documents
 
 
+@functools.cache
+def get_cross_encoder():
+    """
+    Carga el modelo cross-encoder la primera vez que se usa.
+    Importar sentence_transformers (y PyTorch) es lo más lento al iniciar este script,
+    así que solo lo hacemos cuando realmente reclasificamos resultados.
+    """
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+
+@traced()
 def rerank(query, retrieved_documents):
     """
     Reclasificar los resultados utilizando un cross-enconder modelo .
     """
-    encoder = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+    encoder = get_cross_encoder()
     scores = encoder.predict([(query, doc["text"]) for doc in retrieved_documents])
     scored_documents = [v for _, v in sorted(zip(scores, retrieved_documents), reverse=True)]
     return scored_documents
 
 
+@traced()
 def hybrid_search(query, limit):
     """
     Realizar una búsqueda híbrida utilizando tanto búsqueda de texto completo como vectorial.
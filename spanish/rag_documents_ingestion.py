@@ -1,60 +1,66 @@
-import json
 import os
 import pathlib
+import sys
 
-import azure.identity
-import openai
-import pymupdf4llm
 from dotenv import load_dotenv
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# Permite importar los módulos compartidos de demo_utils desde la carpeta principal
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from demo_utils.clients import create_client, get_model_name  # noqa: E402
+from demo_utils.ingestion import find_pdfs, ingest_pdfs  # noqa: E402
 
 # Configura el cliente de OpenAI para usar la API de Azure, OpenAI.com u Ollama
 load_dotenv(override=True)
 API_HOST = os.getenv("API_HOST", "github")
 
-if API_HOST == "azure":
-    token_provider = azure.identity.get_bearer_token_provider(
-        azure.identity.DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default"
-    )
-    client = openai.OpenAI(
-        base_url=os.environ["AZURE_OPENAI_ENDPOINT"],
-        api_key=token_provider,
+client = create_client(API_HOST)
+MODEL_NAME = get_model_name(API_HOST)
+
+
+data_dir = pathlib.Path(os.path.dirname(__file__)) / "data"
+
+
+def print_progress(progress):
+    eta = f"{progress.eta_seconds:.0f}s" if progress.eta_seconds is not None else "-"
+    print(
+        f"{progress.files_done}/{progress.files_total} PDF, {progress.chunks_written} fragmentos "
+        f"({progress.chunks_per_second:.1f}/s), tiempo restante {eta}"
     )
-    MODEL_NAME = os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"]
 
-elif API_HOST == "ollama":
-    client = openai.OpenAI(base_url=os.environ["OLLAMA_ENDPOINT"], api_key="nokeyneeded")
-    MODEL_NAME = os.environ["OLLAMA_MODEL"]
 
-elif API_HOST == "github":
-    client = openai.OpenAI(base_url="https://models.github.ai/inference", api_key=os.environ["GITHUB_TOKEN"])
-    MODEL_NAME = os.getenv("GITHUB_MODEL", "openai/gpt-4o")
+def print_duplicate(duplicate):
+    print(
+        f"Se descartó {duplicate.chunk_id} antes de generar su embedding, casi idéntico a {duplicate.duplicate_of} "
+        f"(similitud {duplicate.similarity:.0%})"
+    )
 
-else:
-    client = openai.OpenAI(api_key=os.environ["OPENAI_KEY"])
-    MODEL_NAME = os.environ["OPENAI_MODEL"]
 
-data_dir = pathlib.Path(os.path.dirname(__file__)) / "data"
-filenames = ["Xylocopa_californica.pdf", "Centris_pallida.pdf", "Apis_mellifera.pdf", "Syrphidae.pdf"]
-all_chunks = []
-for filename in filenames:
-    # Extraemos texto del archivo PDF
-    md_text = pymupdf4llm.to_markdown(data_dir / filename)
-
-    # Dividimos el texto en fragmentos más pequeños
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        model_name="gpt-4o", chunk_size=500, chunk_overlap=125
+def main():
+    # Extraemos el texto de todos los PDF dentro de data/, lo dividimos en fragmentos más pequeños y generamos
+    # sus embeddings, solo para los PDF y fragmentos que cambiaron desde la última ejecución,
+    # y los guardamos en un archivo JSON
+    summary = ingest_pdfs(
+        client,
+        find_pdfs(data_dir),
+        "rag_ingested_chunks.json",
+        "text-embedding-3-small",
+        root=data_dir,
+        on_progress=print_progress,
+        on_duplicate=print_duplicate,
+    )
+    print(
+        f"Se extrajeron {len(summary.extracted_files)} PDF ({len(summary.unchanged_files)} sin cambios, "
+        f"{len(summary.resumed_files)} retomados de un punto de control, "
+        f"{len(summary.dropped_files)} eliminados), se generaron {summary.embedded_chunks} embeddings "
+        f"({summary.cached_chunks} más desde la caché de embeddings), "
+        f"se reutilizaron {summary.reused_chunks} y se descartaron {len(summary.duplicate_chunks)} casi idénticos"
     )
-    texts = text_splitter.create_documents([md_text])
-    file_chunks = [{"id": f"{filename}-{(i + 1)}", "text": text.page_content} for i, text in enumerate(texts)]
-
-    # Generamos embeddings utilizando el SDK de openAI para cada texto
-    for file_chunk in file_chunks:
-        file_chunk["embedding"] = (
-            client.embeddings.create(model="text-embedding-3-small", input=file_chunk["text"]).data[0].embedding
-        )
-    all_chunks.extend(file_chunks)
-
-# Guardamos los documentos con embeddings en un archivo JSON
-with open("rag_ingested_chunks.json", "w") as f:
-    json.dump(all_chunks, f, indent=4)
+    print(
+        f"Rendimiento: {summary.chunks_per_second:.1f} fragmentos/s y {summary.tokens_per_second:.0f} tokens/s "
+        f"en {summary.seconds:.1f} segundos"
+    )
+
+
+# Los procesos auxiliares también importan este script, así que solo el proceso principal ejecuta el pipeline
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import pathlib
+import sys
+
+from dotenv import load_dotenv
+
+# Permite importar los módulos compartidos de demo_utils desde la carpeta principal
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from demo_utils.clients import close_async_credentials, create_async_client, get_model_name  # noqa: E402
+from demo_utils.ingestion import find_pdfs, ingest_pdfs_async  # noqa: E402
+
+# Configura el cliente de OpenAI para usar la API de Azure, OpenAI.com u Ollama
+load_dotenv(override=True)
+API_HOST = os.getenv("API_HOST", "github")
+
+client = create_async_client(API_HOST)
+MODEL_NAME = get_model_name(API_HOST)
+
+
+data_dir = pathlib.Path(os.path.dirname(__file__)) / "data"
+
+
+def print_progress(progress):
+    eta = f"{progress.eta_seconds:.0f}s" if progress.eta_seconds is not None else "-"
+    print(
+        f"{progress.files_done}/{progress.files_total} PDF, {progress.chunks_written} fragmentos "
+        f"({progress.chunks_per_second:.1f}/s), tiempo restante {eta}"
+    )
+
+
+def print_duplicate(duplicate):
+    print(
+        f"Se descartó {duplicate.chunk_id} antes de generar su embedding, casi idéntico a {duplicate.duplicate_of} "
+        f"(similitud {duplicate.similarity:.0%})"
+    )
+
+
+async def close_clients() -> None:
+    """Cierra el cliente OpenAI y la credencial de Azure (si existe)."""
+    await client.close()
+    await close_async_credentials()
+
+
+async def main():
+    # Igual que rag_documents_ingestion.py, pero con hasta EMBEDDING_CONCURRENCY solicitudes de embeddings a la vez,
+    # manteniendo los fragmentos en el orden de los PDF
+    try:
+        summary = await ingest_pdfs_async(
+            client,
+            find_pdfs(data_dir),
+            "rag_ingested_chunks.json",
+            "text-embedding-3-small",
+            root=data_dir,
+            on_progress=print_progress,
+            on_duplicate=print_duplicate,
+        )
+    finally:
+        await close_clients()
+    print(
+        f"Se extrajeron {len(summary.extracted_files)} PDF ({len(summary.unchanged_files)} sin cambios, "
+        f"{len(summary.resumed_files)} retomados de un punto de control, "
+        f"{len(summary.dropped_files)} eliminados), se generaron {summary.embedded_chunks} embeddings "
+        f"({summary.cached_chunks} más desde la caché de embeddings), "
+        f"se reutilizaron {summary.reused_chunks} y se descartaron {len(summary.duplicate_chunks)} casi idénticos"
+    )
+    print(
+        f"Rendimiento: {summary.chunks_per_second:.1f} fragmentos/s y {summary.tokens_per_second:.0f} tokens/s "
+        f"en {summary.seconds:.1f} segundos"
+    )
+
+
+# Los procesos auxiliares también importan este script, así que solo el proceso principal ejecuta el pipeline
+if __name__ == "__main__":
+    asyncio.run(main())